@@ -1,35 +1,61 @@
-from flask import Flask, request, jsonify, send_file, make_response, render_template_string
+from flask import Flask, Response, request, jsonify, send_file, make_response, render_template_string, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import os
 from pathlib import Path
 from werkzeug.utils import secure_filename
-from watermarking import embed_watermark, phash
-from detection import add_fingerprint, find_matches, all_fingerprints
+from detection import add_fingerprint, find_matches, attach_store, fingerprint_count
 from blockchain import BlockchainRegistry
 import tempfile
+import io
+import json
 import paseto
 import datetime
 import base64
+import hashlib
+import hmac
 from functools import wraps
-import face_recognition
 import pytesseract
 from PIL import Image
 import signal
 import numpy as np
-import onnxruntime as ort
-import difflib
-import cv2
-import easyocr
-import re
-# Add resemblyzer for voice matching
-from resemblyzer import VoiceEncoder, preprocess_wav
+from model_registry import models
+from identity import (
+    LIVENESS_CHECKER, CascadeStats, EmbeddingCache, FaceIndex, ImageContext, LivenessSessions,
+)
+from identity.liveness import LIVENESS_FACE_MAX_SIDE, MAX_LIVENESS_FRAMES
+from jobs import JobQueue, QueueFull, tasks
+from storage import SocialDB, UsersDB
+from scan import PostFaceMatrix, Scanner
+import ingest
+from ingest import IngestError
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True, origins=["https://192.168.0.120:5173"])
+app.config['MAX_CONTENT_LENGTH'] = ingest.MAX_REQUEST_BYTES
+CORS(app, supports_credentials=True, origins=["https://192.168.0.120:5173"], expose_headers=["X-MyMark-Tx", "X-MyMark-Job"])
 
 DB_USERS = os.path.join(os.getcwd(), 'data', 'users_db', 'users.db')
 DB_SOCIAL = os.path.join(os.getcwd(), 'data', 'social_db', 'social.db')
+DB_CHAIN = os.path.join(os.getcwd(), 'data', 'chain_db', 'registry.db')
+FINGERPRINT_STORE = os.environ.get("MYMARK_FP_STORE", os.path.join(os.getcwd(), 'data', 'fingerprints'))
+
+# Detection index persists across restarts and is shared by all workers
+attach_store(FINGERPRINT_STORE)
+
+# Incremental crawl-and-match over social.db posts (POST /api/scan)
+social_db = SocialDB(DB_SOCIAL)
+social_db.init_schema()
+post_faces = PostFaceMatrix(os.path.join(os.path.dirname(DB_SOCIAL), 'post_faces'))
+scanner = Scanner(social_db, faces=post_faces)
+
+# Heavy endpoints run on a pool of model-holding worker processes; forked
+# here, before the blockchain client and mirror start their threads.  Each
+# worker warms its models itself, after the fork (MYMARK_WARMUP=1).
+job_queue = JobQueue(
+    workers=int(os.environ.get("MYMARK_JOB_WORKERS", "2")),
+    max_depth=int(os.environ.get("MYMARK_JOB_DEPTH", "32")),
+    warmup=["easyocr", "liveness"] if os.environ.get("MYMARK_WARMUP") == "1" else (),
+).start()
 
 # Blockchain registry instance
 try:
@@ -39,6 +65,12 @@ except Exception as e:
     # Fallback: create a dummy registry with blockchain disabled
     bc = BlockchainRegistry(connect=False)
 
+# Serve registry reads from the local event mirror (no node round trip)
+try:
+    bc.attach_mirror(DB_CHAIN)
+except Exception as e:
+    print(f"Registry mirror unavailable: {e}")
+
 PASETO_KEY = os.environ.get("PASETO_KEY", "supersecretkey1234567890123456")  # 32 bytes
 
 def generate_paseto(username):
@@ -76,25 +108,27 @@ def require_auth(f):
         return f(*args, **kwargs)
     return decorated
 
-def init_users_db():
-    db_path = DB_USERS
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            face_embedding BLOB,
-            catchphrase_embedding BLOB,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.commit()
-    conn.close()
+# Thread-local WAL connections; writes are group-committed by one writer thread
+users_db = UsersDB(DB_USERS)
+users_db.init_schema()
+
+# 1:N duplicate-face check over every registered user (cosine on dlib encodings)
+FACE_DUPLICATE_COSINE = 0.92
+face_index = FaceIndex.from_rows(users_db.face_embeddings())
+
+# Decoded, pre-normalised login embeddings; writers below invalidate their user
+user_embeddings = EmbeddingCache(users_db.embeddings)
+LOGIN_MAX_SIDE = 640    # login frames are downscaled to this before face detection
 
-# Call this at startup
-init_users_db()
+# Per-stage reject rates / latency of the ID-document cascade, fed from job results
+id_cascade_stats = CascadeStats()
+
+# Open webcam liveness sessions (frame-by-frame, early exit) and their counters
+liveness_sessions = LivenessSessions(LIVENESS_CHECKER)
+
+@app.errorhandler(IngestError)
+def ingest_error(e):
+    return jsonify({'status': 'fail', 'message': str(e)}), e.status
 
 @app.route('/', methods=['GET'])
 def index():
@@ -125,286 +159,208 @@ def upload():
     image = request.files['image']
     owner = request.form['owner']
     filename = secure_filename(image.filename)
-    with tempfile.TemporaryDirectory() as tmpdir:
-        orig_path = Path(tmpdir) / filename
-        wm_path = Path(tmpdir) / f"wm_{filename}"
-        image.save(orig_path)
-        # Embed watermark and get fingerprint
-        fingerprint_hex = embed_watermark(orig_path, wm_path, owner)
+    image_data = ingest.from_request(request, request.form, 'image')
+
+    def finish(job, value):
+        if not value['ok']:
+            return job_failed(job, value)
         # Register in detection index
         image_id = filename
-        add_fingerprint(image_id, phash(orig_path))
-        # Register on blockchain
-        try:
-            tx_hash = bc.register(image_id, fingerprint_hex)
-        except Exception as e:
-            tx_hash = str(e)
-        # Return watermarked image as download
-        return send_file(wm_path, as_attachment=True, download_name=f"watermarked_{filename}")
-
-def preprocess_for_ocr(img_path):
-    """Preprocess image for better OCR: grayscale, contrast, threshold."""
-    try:
-        img = cv2.imread(img_path)
-        if img is None:
-            print("[preprocess_for_ocr] Could not read image:", img_path)
-            return img_path
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-        # Adaptive thresholding for better text extraction
-        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
-                                       cv2.THRESH_BINARY, 21, 10)
-        temp_path = img_path + "_ocr_tmp.jpg"
-        cv2.imwrite(temp_path, thresh)
-        return temp_path
-    except Exception as e:
-        print("[preprocess_for_ocr] error:", e)
-        return img_path
-
-def fuzzy_keyword_match(text, keywords, threshold=0.7):
-    """Fuzzy match keywords in OCR text (lower threshold for more tolerance)."""
-    text_lower = text.lower()
-    for word in keywords:
-        for candidate in text_lower.split():
-            if difflib.SequenceMatcher(None, word, candidate).ratio() > threshold:
-                return True
-    return False
-
-easyocr_reader = easyocr.Reader(['en'], gpu=False)
-
-def extract_mrz(text):
-    """Extract MRZ lines from OCR text (for UK passports, etc)."""
-    lines = [line.strip() for line in text.splitlines() if line.strip()]
-    # MRZ lines are typically 2 lines of 44 chars (passports) or 3 lines of 30/36 chars (ID cards)
-    mrz_lines = [line for line in lines if len(line) in (44, 36, 30)]
-    if len(mrz_lines) >= 2:
-        return "\n".join(mrz_lines[-2:])
-    return None
-
-def parse_mrz(mrz_text):
-    """Basic MRZ validation using regex (fallback if python-mrz is unavailable)."""
-    if not mrz_text:
-        return None
-    # Simple check: two lines, each 44 chars, mostly uppercase/chevrons/digits
-    lines = mrz_text.splitlines()
-    if len(lines) == 2 and all(len(line) == 44 for line in lines):
-        if re.match(r'^[A-Z0-9<]{44}$', lines[0]) and re.match(r'^[A-Z0-9<]{44}$', lines[1]):
-            return {"raw": mrz_text}
-    return None
-
-def is_valid_id_document(img_path):
-    """Require MRZ (if present), at least one strong keyword, and a face in the ID region."""
+        add_fingerprint(image_id, value['phash'], value['hashes'])
+        # Register on blockchain in the background; the client polls /api/tx/<handle>
+        pending_tx = bc.submit(image_id, value['fingerprint'])
+        job.private.update(file=value['image'], download_name=f"watermarked_{filename}",
+                           tx=pending_tx.handle)
+        return {'status': 'success', 'image_id': image_id, 'tx': pending_tx.handle,
+                'download': f'/api/jobs/{job.id}/file'}
+
+    # Decode, hash, watermark and encode happen on a job worker
+    return enqueue('upload', tasks.watermark_upload, image_data, owner,
+                   Path(filename).suffix or ".jpg", finish=finish)
+
+@app.route('/api/registrations', methods=['GET'])
+@require_auth
+def registrations():
+    ids = [i for i in request.args.get('ids', '').split(',') if i]
+    if not ids:
+        return jsonify({'status': 'fail', 'message': 'Missing ids'}), 400
     try:
-        # Use EasyOCR for robust text extraction
-        result = easyocr_reader.readtext(img_path, detail=0, paragraph=True)
-        text = "\n".join(result)
-        print(f"[is_valid_id_document] EasyOCR text: {repr(text)}")
-        # Try to extract and parse MRZ
-        mrz_text = extract_mrz(text)
-        mrz_info = parse_mrz(mrz_text) if mrz_text else None
-        has_mrz = bool(mrz_info)
-        # Require at least one strong keyword
-        keywords = [
-            'passport', 'passpoort', 'passaporto', 'reisepass', 'passeport',
-            'united kingdom', 'britain', 'british', 'citizen', 'surname', 'given', 'name',
-            'date', 'birth', 'expiry', 'issue', 'authority', 'hmpo', 'number', 'code',
-            'type', 'nationality', 'sex', 'male', 'female', 'm', 'f', 'p', 'gbr', 'uk',
-            'driving', 'license', 'licence', 'id', 'identification', 'identity', 'card', 'dvla'
-        ]
-        found = [word for word in keywords if word in text.lower()]
-        fuzzy_found = sum(
-            difflib.SequenceMatcher(None, word, candidate).ratio() > 0.7
-            for word in keywords for candidate in text.lower().split()
-        )
-        has_keyword = len(found) >= 1 or fuzzy_found >= 2
-        # Require a face in the document
-        img_arr = face_recognition.load_image_file(img_path)
-        faces = face_recognition.face_locations(img_arr)
-        has_face = len(faces) > 0
-        print(f"[is_valid_id_document] has_mrz={has_mrz}, has_keyword={has_keyword}, has_face={has_face}")
-        # All must be true: if MRZ present, it must be valid; must have keyword; must have face
-        return (not mrz_text or has_mrz) and has_keyword and has_face
-    except Exception as e:
-        print("is_valid_id_document error:", e)
-        return False
+        return jsonify({'status': 'success', 'registrations': bc.registrations(ids)})
+    except RuntimeError as e:
+        return jsonify({'status': 'fail', 'message': str(e)}), 503
 
-def is_real_face(img_path):
-    """Check for a real, live face using ONNX anti-spoofing model (Silent-Face-Anti-Spoofing)."""
+@app.route('/api/tx/<handle>', methods=['GET'])
+@require_auth
+def tx_status(handle):
+    if not bc.enabled:
+        return jsonify({'status': 'fail', 'message': 'Blockchain disabled'}), 503
+    pending_tx = bc.pending(handle)
+    if pending_tx is None:
+        return jsonify({'status': 'fail', 'message': 'Unknown transaction handle'}), 404
+    return jsonify({'status': 'success', 'tx': pending_tx.as_dict()})
+
+# Job endpoints answer like inline ones unless the client opts into polling
+# with ?async=1 or "Prefer: respond-async"; ?wait=<seconds> bounds the wait
+JOB_SYNC_WAIT = float(os.environ.get("MYMARK_JOB_SYNC_WAIT", "120"))
+
+def enqueue(kind, fn, *args, finish=None):
+    """Queue a job and answer with its final response, or 202 with its id for async clients."""
     try:
-        img = cv2.imread(img_path)
-        if img is None:
-            print("[is_real_face] Could not read image.")
-            return False
-        # Load ONNX liveness model (Silent-Face-Anti-Spoofing)
-        model_path = os.path.join(os.getcwd(), "liveness_model", "onnx_models", "2.7_80x80_MiniFASNetV2.onnx")
-        if not os.path.exists(model_path):
-            print(f"[is_real_face] Liveness model not found at {model_path}")
-            return False
-        # Preprocess: crop center, resize to 80x80, BGR->RGB, normalize
-        h, w = img.shape[:2]
-        min_dim = min(h, w)
-        startx = w//2 - (min_dim//2)
-        starty = h//2 - (min_dim//2)
-        crop = img[starty:starty+min_dim, startx:startx+min_dim]
-        crop = cv2.resize(crop, (80, 80))
-        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-        crop = crop.astype(np.float32) / 255.0
-        crop = (crop - 0.5) / 0.5  # normalize to [-1, 1]
-        input_blob = np.transpose(crop, (2, 0, 1))[None, ...]
-        # Run ONNX model
-        ort_sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
-        outputs = ort_sess.run(None, {ort_sess.get_inputs()[0].name: input_blob})
-        liveness_score = float(outputs[1][0][0]) if len(outputs) > 1 else float(outputs[0][0][0])
-        print(f"[is_real_face] Liveness score: {liveness_score}")
-        # Threshold: >0.5 is live, <=0.5 is spoof
-        if liveness_score > 0.5:
-            # Also check for face presence
-            faces = face_recognition.face_locations(img)
-            if len(faces) == 0:
-                print("[is_real_face] No face detected.")
-                return False
-            return True
-        else:
-            print("[is_real_face] Liveness score below threshold.")
-            return False
-    except Exception as e:
-        print("is_real_face error:", e)
-        return False
+        job = job_queue.submit(kind, fn, *args, finish=finish)
+    except QueueFull as e:
+        resp = jsonify({'status': 'fail', 'message': f'Server busy, try again shortly ({e})'})
+        resp.headers['Retry-After'] = '1'
+        return resp, 503
+    asynchronous = (request.args.get('async') == '1'
+                    or 'respond-async' in request.headers.get('Prefer', ''))
+    wait = request.args.get('wait', type=float)
+    if wait is None:
+        wait = 0 if asynchronous else JOB_SYNC_WAIT
+    if wait:
+        job.wait(min(wait, JOB_SYNC_WAIT))
+    if job.done:
+        return job_response(job)
+    resp = make_response(jsonify({'status': 'queued', 'job_id': job.id,
+                                  'poll': f'/api/jobs/{job.id}'}), 202)
+    resp.headers['X-MyMark-Job'] = job.id
+    # Only the submitting client can poll the job (and collect its login cookie)
+    resp.set_cookie(f'job_{job.id}', job_signature(job.id), path=f'/api/jobs/{job.id}',
+                    max_age=3600, httponly=True, samesite='None', secure=True)
+    return resp
 
-def faces_match(face_path, id_path, tolerance=0.6):
-    try:
-        face_img = face_recognition.load_image_file(face_path)
-        id_img = face_recognition.load_image_file(id_path)
-        face_enc = face_recognition.face_encodings(face_img)
-        id_enc = face_recognition.face_encodings(id_img)
-        if not face_enc or not id_enc:
-            return False
-        return face_recognition.compare_faces([id_enc[0]], face_enc[0], tolerance=tolerance)[0]
-    except Exception as e:
-        print("faces_match error:", e)
-        return False
+def job_signature(job_id):
+    return hmac.new(PASETO_KEY.encode(), job_id.encode(), hashlib.sha256).hexdigest()
 
-def facenet_embedding(img_path):
-    # Return the 128-d FaceNet embedding as bytes
-    try:
-        img = face_recognition.load_image_file(img_path)
-        encodings = face_recognition.face_encodings(img)
-        if not encodings:
-            return None
-        arr = np.array(encodings[0], dtype=np.float32)
-        return arr.tobytes()
-    except Exception as e:
-        print("facenet_embedding error:", e)
+def submitted_job(job_id):
+    """The job if this request carries the cookie set when it was queued, else None."""
+    job = job_queue.get(job_id)
+    cookie = request.cookies.get(f'job_{job_id}', '')
+    if job is None or not hmac.compare_digest(cookie, job_signature(job_id)):
         return None
+    return job
+
+def job_failed(job, value):
+    job.http_status = value['http_status']
+    return {'status': 'fail', 'message': value['message']}
+
+def set_job_cookie(job, resp):
+    token = job.private.pop('token', None)
+    if token:
+        resp.set_cookie('token', token, httponly=True, samesite='None', secure=True)
+    return resp
+
+def job_response(job):
+    """What the endpoint would have answered had it run the job inline."""
+    if job.status == 'failed':
+        resp = make_response(jsonify({'status': 'fail', 'message': f'Job failed: {job.error}'}), 500)
+    elif 'file' in job.private:
+        resp = send_file(io.BytesIO(job.private['file']), as_attachment=True,
+                         download_name=job.private['download_name'])
+        resp.headers['X-MyMark-Tx'] = job.private['tx']
+    else:
+        resp = make_response(jsonify(job.result), job.http_status)
+    resp.headers['X-MyMark-Job'] = job.id
+    return set_job_cookie(job, resp)
+
+@app.route('/api/jobs', methods=['GET'])
+def jobs_stats():
+    return jsonify({'status': 'success', 'jobs': job_queue.stats()})
+
+@app.route('/api/id_cascade', methods=['GET'])
+def id_cascade():
+    return jsonify({'status': 'success', 'stages': id_cascade_stats.snapshot()})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = submitted_job(job_id)
+    if job is None:
+        return jsonify({'status': 'fail', 'message': 'Unknown job id'}), 404
+    return set_job_cookie(job, jsonify({'status': 'success', 'job': job.as_dict()}))
+
+@app.route('/api/jobs/<job_id>/file', methods=['GET'])
+@require_auth
+def job_file(job_id):
+    job = submitted_job(job_id)
+    if job is None or (job.done and 'file' not in job.private):
+        return jsonify({'status': 'fail', 'message': 'No file for this job'}), 404
+    if not job.done:
+        return jsonify({'status': 'queued', 'job': job.as_dict()}), 202
+    return job_response(job)
 
 @app.route('/api/register', methods=['POST'])
 def register():
-    data = request.json
-    # Required: username, id_image (base64), face_image (base64), optional: catchphrase_embedding (base64)
-    if not data or 'username' not in data or 'id_image' not in data or 'face_image' not in data:
+    data = ingest.request_data(request)
+    # Required: username, id_image, face_image (base64 fields or multipart files), optional: catchphrase_embedding (base64)
+    if 'username' not in data or not all(f in data or f in request.files for f in ('id_image', 'face_image')):
         return jsonify({'status': 'fail', 'message': 'Missing required fields (username, id_image, face_image)'}), 400
 
     username = data['username']
-    id_img_data = base64.b64decode(data['id_image'].split(',')[1] if ',' in data['id_image'] else data['id_image'])
-    face_img_data = base64.b64decode(data['face_image'].split(',')[1] if ',' in data['face_image'] else data['face_image'])
-
-    # Save temp files
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as id_file:
-        id_file.write(id_img_data)
-        id_path = id_file.name
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as face_file:
-        face_file.write(face_img_data)
-        face_path = face_file.name
-
-    # a. Validate ID document
-    if not is_valid_id_document(id_path):
-        os.remove(id_path)
-        os.remove(face_path)
-        return jsonify({'status': 'fail', 'message': 'ID document must be a valid passport, driver\'s license, or university ID containing a face.'}), 400
-
-    # b. Validate real face (not screen/printout)
-    if not is_real_face(face_path):
-        os.remove(id_path)
-        os.remove(face_path)
-        return jsonify({'status': 'fail', 'message': 'No real face detected in face image. Please use a live photo.'}), 400
-
-    # c. Check face matches ID document
-    if not faces_match(face_path, id_path):
-        os.remove(id_path)
-        os.remove(face_path)
-        return jsonify({'status': 'fail', 'message': 'Face does not match ID document.'}), 400
-
-    # d. Generate FaceNet embedding
-    embedding = facenet_embedding(face_path)
-    if embedding is None:
-        os.remove(id_path)
-        os.remove(face_path)
-        return jsonify({'status': 'fail', 'message': 'Could not generate FaceNet embedding.'}), 400
-
-    os.remove(id_path)
-    os.remove(face_path)
-
-    # e. Store in users DB
-    try:
-        # Accept optional catchphrase_embedding (base64)
-        catchphrase_embedding = None
-        if 'catchphrase_embedding' in data and data['catchphrase_embedding']:
-            try:
-                catchphrase_embedding = base64.b64decode(data['catchphrase_embedding'])
-            except Exception as e:
-                print("register: failed to decode catchphrase_embedding:", e)
-                catchphrase_embedding = None
+    id_img_data = ingest.from_request(request, data, 'id_image')
+    face_img_data = ingest.from_request(request, data, 'face_image')
 
-        conn = sqlite3.connect(DB_USERS)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO users (username, face_embedding, catchphrase_embedding)
-            VALUES (?, ?, ?)
-        """, (username, embedding, catchphrase_embedding))
-        conn.commit()
-        conn.close()
-        token = generate_paseto(username)
-        resp = jsonify({'status': 'success', 'message': 'User registered'})
-        resp.set_cookie('token', token, httponly=True, samesite='None', secure=True)
-        return resp
+    # Accept optional catchphrase_embedding (base64)
+    catchphrase_embedding = None
+    if 'catchphrase_embedding' in data and data['catchphrase_embedding']:
+        try:
+            catchphrase_embedding = base64.b64decode(data['catchphrase_embedding'])
+        except Exception as e:
+            print("register: failed to decode catchphrase_embedding:", e)
+            catchphrase_embedding = None
+
+    def finish(job, value):
+        # a-d run on the worker: ID document, liveness, face match, FaceNet embedding
+        id_cascade_stats.record(value.get('cascade'))
+        if not value['ok']:
+            return job_failed(job, value)
+        # e. Store in users DB
+        return create_user(job, username, value['embedding'], catchphrase_embedding, 'User registered')
+
+    return enqueue('register', tasks.verify_registration, id_img_data, face_img_data, finish=finish)
+
+def create_user(job, username, embedding, catchphrase_embedding, message):
+    duplicate = face_index.find_duplicate(embedding, FACE_DUPLICATE_COSINE, exclude=username)
+    if duplicate:
+        print(f"{job.kind}: face already registered as {duplicate[0]} (cosine {duplicate[1]:.3f})")
+        job.http_status = 409
+        return {'status': 'fail', 'message': 'This face is already registered under another username.'}
+    try:
+        users_db.create_user(username, embedding, catchphrase_embedding)
+        print(f"{job.kind}: user {username} created in DB.")
+        face_index.add(username, embedding)
+        user_embeddings.invalidate(username)
     except sqlite3.IntegrityError as e:
-        print("register: IntegrityError", e)
-        return jsonify({'status': 'fail', 'message': 'Username already exists'}), 400
+        print(f"{job.kind}: IntegrityError", e)
+        job.http_status = 400
+        return {'status': 'fail', 'message': 'Username already exists'}
     except Exception as e:
-        print("register: Exception", e)
+        print(f"{job.kind}: Exception", e)
         import traceback
         traceback.print_exc()
-        return jsonify({'status': 'fail', 'message': f'Registration failed: {str(e)}'}), 500
+        job.http_status = 500
+        return {'status': 'fail', 'message': f'Registration failed: {str(e)}'}
+    job.private['token'] = generate_paseto(username)
+    return {'status': 'success', 'message': message}
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    data = request.json
-    if not data or 'username' not in data or 'face_image' not in data:
+    data = ingest.request_data(request)
+    if 'username' not in data or ('face_image' not in data and 'face_image' not in request.files):
         return jsonify({'status': 'fail', 'message': 'Missing username or face_image'}), 400
     username = data['username']
-    face_img_data = base64.b64decode(data['face_image'].split(',')[1] if ',' in data['face_image'] else data['face_image'])
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as face_file:
-        face_file.write(face_img_data)
-        face_path = face_file.name
-    # Get stored embedding for username
-    conn = sqlite3.connect(DB_USERS)
-    c = conn.cursor()
-    c.execute("SELECT face_embedding FROM users WHERE username=?", (username,))
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        os.remove(face_path)
+    # Get stored (pre-normalised) embedding for username
+    stored = user_embeddings.get(username)
+    if stored is None:
         return jsonify({'status': 'fail', 'message': 'User not found'}), 401
-    stored_embedding = np.frombuffer(row[0], dtype=np.float32)
-    # Compute embedding for uploaded face
-    img = face_recognition.load_image_file(face_path)
-    encodings = face_recognition.face_encodings(img)
-    os.remove(face_path)
+    if stored.face is None:
+        return jsonify({'status': 'fail', 'message': 'No face registered for this user.'}), 401
+    # Compute embedding for uploaded face on a downscaled frame
+    img = ingest.decode(ingest.from_request(request, data, 'face_image'), check=False)
+    encodings = ImageContext.from_bgr(img, 'face_image', max_side=LOGIN_MAX_SIDE).encodings()
     if not encodings:
         return jsonify({'status': 'fail', 'message': 'No face detected'}), 401
-    uploaded_embedding = np.array(encodings[0], dtype=np.float32)
+    uploaded_embedding = np.asarray(encodings[0], dtype=np.float32)
     # Compare embeddings (cosine similarity)
-    sim = np.dot(stored_embedding, uploaded_embedding) / (np.linalg.norm(stored_embedding) * np.linalg.norm(uploaded_embedding))
+    sim = float(stored.face @ uploaded_embedding) / float(np.linalg.norm(uploaded_embedding))
     if sim > 0.88:  # threshold, tune as needed
         token = generate_paseto(username)
         resp = jsonify({'status': 'success', 'message': 'Login successful'})
@@ -432,179 +388,126 @@ def user_details():
     return jsonify({
         'status': 'success',
         'username': username,
-        'images': len(all_fingerprints()),
-        'matches': 0,
-        'last_scan': None
+        'images': fingerprint_count(),
+        'matches': social_db.match_count(),
+        'last_scan': social_db.scan_state()[2]
     })
 
 @app.route('/api/matches', methods=['GET'])
 @require_auth
 def matches():
-    # Return all fingerprints for demo
-    return jsonify({'matches': list(all_fingerprints().items())})
+    # Newest scan matches first, with the infringing post's context
+    if not social_db.table_exists('posts'):
+        return jsonify({'matches': []})
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify({'matches': social_db.matches(limit, offset)})
 
 @app.route('/api/stats', methods=['GET'])
 @require_auth
 def stats():
-    # Return simple stats
-    return jsonify({'images': len(all_fingerprints()), 'matches': 0, 'last_scan': None})
+    return jsonify({'images': fingerprint_count(), 'matches': social_db.match_count(),
+                    'last_scan': social_db.scan_state()[2]})
+
+# Posts showing a registered user's face (same cut-off as face login)
+POST_FACE_COSINE = 0.88
 
-@app.route('/api/scan', methods=['POST'])
+@app.route('/api/identity_matches', methods=['GET'])
+@require_auth
+def identity_matches():
+    username = verify_paseto(request.cookies.get('token'))
+    stored = user_embeddings.get(username)
+    if stored is None or stored.face is None:
+        return jsonify({'status': 'fail', 'message': 'No face registered for this user.'}), 404
+    hits = post_faces.search(stored.face, POST_FACE_COSINE)[0]
+    limit = min(request.args.get('limit', 100, type=int), 1000)
+    posts = social_db.posts([post_id for post_id, _ in hits[:limit]])
+    return jsonify({'status': 'success', 'total': len(hits), 'matches': [
+        {**posts.get(post_id, {'post_id': post_id}), 'similarity': score}
+        for post_id, score in hits[:limit]
+    ]})
+
+@app.route('/api/scan', methods=['GET', 'POST'])
 @require_auth
 def scan():
-    # For demo, just return a stub
-    return jsonify({'status': 'success', 'message': 'Scan triggered (stub)'})
+    # POST starts a background scan of posts newer than the last one; GET polls it
+    if request.method == 'GET':
+        return jsonify({'status': 'success', 'scan': scanner.status()})
+    if not social_db.table_exists('posts'):
+        return jsonify({'status': 'fail', 'message': 'Social database not initialised'}), 503
+    started = scanner.start()
+    return jsonify({'status': 'success',
+                    'message': 'Scan started' if started else 'Scan already running',
+                    'scan': scanner.status()}), 202
 
 # --- Face/Vocal registration/login endpoints (stubs) ---
-def decode_image(dataUrl):
-    # Strip data URL header, if present
-    if ',' in dataUrl:
-        _, encoded = dataUrl.split(',', 1)
-    else:
-        encoded = dataUrl
-    return base64.b64decode(encoded)
-
 @app.route('/api/validate_id', methods=['POST'])
 def validate_id():
-    data = request.json
-    print(f"[validate_id] Received data: {data if data else None}")
-    if not data or 'id_image' not in data:
+    data = ingest.request_data(request)
+    if 'id_image' not in data and 'id_image' not in request.files:
         print("[validate_id] Missing id_image in request.")
         return jsonify({'status': 'fail', 'message': 'Missing id_image'}), 400
-    id_image = data['id_image']
-    print(f"[validate_id] id_image type: {type(id_image)}")
-    print(f"[validate_id] id_image length: {len(id_image) if id_image else 0}")
-    print(f"[validate_id] id_image startswith: {id_image[:30] if id_image else 'None'}")
-    # Extra debug: dump first 100 chars to log for inspection
-    print(f"[validate_id] id_image preview: {id_image[:100] if id_image else 'None'}")
-    # Extra debug: check for empty or very short base64 string
-    if not id_image or len(id_image) < 100:
-        print("[validate_id] id_image is empty or too short for a valid image.")
-        return jsonify({'status': 'fail', 'message': 'Image data is empty or too short.'}), 400
-    try:
-        img_data = decode_image(id_image)
-        print(f"[validate_id] Decoded image bytes: {len(img_data)}")
-        # Save a copy for manual inspection if small
-        if len(img_data) < 1000:
-            print("[validate_id] Decoded image is too small to be valid. Saving for inspection as /tmp/validate_id_debug.jpg")
-            with open("/tmp/validate_id_debug.jpg", "wb") as f:
-                f.write(img_data)
-            return jsonify({'status': 'fail', 'message': 'Decoded image is too small.'}), 400
-    except Exception as e:
-        print(f"[validate_id] Error decoding image: {e}")
-        return jsonify({'status': 'fail', 'message': 'Could not decode image data.'}), 400
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as id_file:
-        id_file.write(img_data)
-        id_filepath = id_file.name
-    print(f"[validate_id] Saved temp file: {id_filepath}")
-    is_valid = validateIDDocument(id_filepath)
-    os.remove(id_filepath)
-    print(f"[validate_id] validateIDDocument result: {is_valid}")
-    if is_valid:
-        return jsonify({'status': 'success', 'message': 'ID card detected.'})
-    else:
-        return jsonify({'status': 'fail', 'message': 'No ID card detected. Please try again.'}), 400
+    img_data = ingest.from_request(request, data, 'id_image')
+    print(f"[validate_id] Decoded image bytes: {len(img_data)}")
+    if len(img_data) < 1000:
+        print("[validate_id] Decoded image is too small to be valid.")
+        return jsonify({'status': 'fail', 'message': 'Decoded image is too small.'}), 400
+
+    def finish(job, value):
+        id_cascade_stats.record(value.get('cascade'))
+        if not value['ok']:
+            return job_failed(job, value)
+        return {'status': 'success', 'message': 'ID card detected.'}
+
+    return enqueue('validate_id', tasks.validate_id, img_data, finish=finish)
 
 @app.route('/api/face_register', methods=['POST'])
 def face_register():
     import time
     start_time = time.time()
     try:
-        data = request.json
-        print("face_register: received data:", data)
-        if not data or 'username' not in data or 'id_image' not in data or 'face_image' not in data:
+        data = ingest.request_data(request)
+        print("face_register: received fields:", sorted(data), sorted(request.files))
+        if 'username' not in data or not all(f in data or f in request.files for f in ('id_image', 'face_image')):
             print("face_register: missing required fields")
             return jsonify({'status': 'fail', 'message': 'Missing required fields'}), 400
 
         # Defensive: check for empty or None images
-        if not data['id_image'] or not data['face_image']:
+        if not (data.get('id_image') or 'id_image' in request.files) or not (data.get('face_image') or 'face_image' in request.files):
             print("face_register: id_image or face_image is empty")
             return jsonify({'status': 'fail', 'message': 'ID image and face image are required.'}), 400
 
-        id_img_data = decode_image(data['id_image'])
-        face_img_data = decode_image(data['face_image'])
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as id_file:
-            id_file.write(id_img_data)
-            id_filepath = id_file.name
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as face_file:
-            face_file.write(face_img_data)
-            face_filepath = face_file.name
-
-        is_valid = validateIDDocument(id_filepath)
-        print("face_register: validateIDDocument result:", is_valid)
-        if not is_valid:
-            os.remove(id_filepath)
-            os.remove(face_filepath)
-            return jsonify({'status': 'fail', 'message': 'No ID card detected in first image.'}), 400
-        try:
-            match = compareFaces(face_filepath, id_filepath)
-            print("face_register: compareFaces result:", match)
-        except Exception as e:
-            os.remove(id_filepath)
-            os.remove(face_filepath)
-            print("compareFaces error:", e)
-            import traceback
-            traceback.print_exc()
-            return jsonify({'status': 'fail', 'message': f'Face comparison error: {str(e)}'}), 400
-
-        # --- NEW: Actually create the user in the users DB if match is True ---
-        if match:
-            # Generate FaceNet embedding for the face image
-            embedding = facenet_embedding(face_filepath)
-            if embedding is None:
-                os.remove(id_filepath)
-                os.remove(face_filepath)
-                return jsonify({'status': 'fail', 'message': 'Could not generate FaceNet embedding.'}), 400
-
-            # Accept optional catchphrase_embedding (base64)
-            catchphrase_embedding = None
-            if 'catchphrase_embedding' in data and data['catchphrase_embedding']:
-                try:
-                    catchphrase_embedding = base64.b64decode(data['catchphrase_embedding'])
-                except Exception as e:
-                    print("face_register: failed to decode catchphrase_embedding:", e)
-                    catchphrase_embedding = None
+        id_img_data = ingest.from_request(request, data, 'id_image')
+        face_img_data = ingest.from_request(request, data, 'face_image')
 
+        # Accept optional catchphrase_embedding (base64)
+        catchphrase_embedding = None
+        if 'catchphrase_embedding' in data and data['catchphrase_embedding']:
             try:
-                conn = sqlite3.connect(DB_USERS)
-                c = conn.cursor()
-                c.execute("""
-                    INSERT INTO users (username, face_embedding, catchphrase_embedding)
-                    VALUES (?, ?, ?)
-                """, (data['username'], embedding, catchphrase_embedding))
-                conn.commit()
-                conn.close()
-                print(f"face_register: user {data['username']} created in DB.")
-            except sqlite3.IntegrityError as e:
-                print("face_register: IntegrityError", e)
-                os.remove(id_filepath)
-                os.remove(face_filepath)
-                return jsonify({'status': 'fail', 'message': 'Username already exists'}), 400
+                catchphrase_embedding = base64.b64decode(data['catchphrase_embedding'])
             except Exception as e:
-                print("face_register: Exception", e)
-                import traceback
-                traceback.print_exc()
-                os.remove(id_filepath)
-                os.remove(face_filepath)
-                return jsonify({'status': 'fail', 'message': f'Registration failed: {str(e)}'}), 500
-
-            os.remove(id_filepath)
-            os.remove(face_filepath)
-            print(f"face_register: success in {time.time() - start_time:.2f}s")
-            return jsonify({'status': 'success', 'message': 'Face images match. User registered.'})
-        else:
-            os.remove(id_filepath)
-            os.remove(face_filepath)
-            print(f"face_register: no match in {time.time() - start_time:.2f}s")
-            return jsonify({'status': 'fail', 'message': 'Face images do not match.'}), 400
+                print("face_register: failed to decode catchphrase_embedding:", e)
+                catchphrase_embedding = None
+
+        def finish(job, value):
+            id_cascade_stats.record(value.get('cascade'))
+            if not value['ok']:
+                print(f"face_register: {value['message']} in {time.time() - start_time:.2f}s")
+                return job_failed(job, value)
+            result = create_user(job, data['username'], value['embedding'], catchphrase_embedding,
+                                 'Face images match. User registered.')
+            print(f"face_register: {result['status']} in {time.time() - start_time:.2f}s")
+            return result
+
+        return enqueue('face_register', tasks.verify_face_registration, id_img_data, face_img_data,
+                       finish=finish)
+    except IngestError as e:
+        return ingest_error(e)
     except Exception as e:
         print("face_register error:", e)
         import traceback
         traceback.print_exc()
         return jsonify({'status': 'fail', 'message': f'Internal error: {str(e)}'}), 500
-    finally:
-        pass
 
 @app.route('/api/face_login', methods=['POST'])
 def face_login():
@@ -635,6 +538,8 @@ def vocal_register():
             f1_path, f2_path = f1.name, f2.name
 
         # Preprocess and embed both
+        from resemblyzer import preprocess_wav
+        voice_encoder = models.get("voice_encoder")
         wav1 = preprocess_wav(f1_path)
         wav2 = preprocess_wav(f2_path)
         embed1 = voice_encoder.embed_utterance(wav1)
@@ -642,13 +547,8 @@ def vocal_register():
         # Store average embedding for user
         avg_embed = np.mean([embed1, embed2], axis=0)
         # Save to DB
-        conn = sqlite3.connect(DB_USERS)
-        c = conn.cursor()
-        c.execute("""
-            UPDATE users SET catchphrase_embedding=? WHERE username=?
-        """, (avg_embed.tobytes(), username))
-        conn.commit()
-        conn.close()
+        users_db.set_catchphrase(username, avg_embed.tobytes())
+        user_embeddings.invalidate(username)
         os.remove(f1_path)
         os.remove(f2_path)
         return jsonify({'status': 'success', 'message': 'Vocal registered'})
@@ -668,18 +568,15 @@ def vocal_login():
         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
             f.write(base64.b64decode(audio_b64))
             audio_path = f.name
+        from resemblyzer import preprocess_wav
         wav = preprocess_wav(audio_path)
-        embed_login = voice_encoder.embed_utterance(wav)
+        embed_login = models.get("voice_encoder").embed_utterance(wav)
         # Retrieve stored embedding
-        conn = sqlite3.connect(DB_USERS)
-        c = conn.cursor()
-        c.execute("SELECT catchphrase_embedding FROM users WHERE username=?", (username,))
-        row = c.fetchone()
-        conn.close()
+        stored = user_embeddings.get(username)
         os.remove(audio_path)
-        if not row or not row[0]:
+        if stored is None or stored.voice is None:
             return jsonify({'status': 'fail', 'message': 'No catchphrase registered for this user.'}), 401
-        embed_reg = np.frombuffer(row[0], dtype=np.float32)
+        embed_reg = stored.voice
         similarity = np.dot(embed_reg, embed_login)
         if similarity > 0.75:
             token = generate_paseto(username)
@@ -699,94 +596,139 @@ def nav_items():
         # ...other nav items...
     ])
 
-def compareFaces(uploaded_face_path, id_face_path, tolerance=0.6):
-    # Load images from file paths
-    uploaded_image = face_recognition.load_image_file(uploaded_face_path)
-    id_image = face_recognition.load_image_file(id_face_path)
-    # Get face encodings
-    uploaded_encodings = face_recognition.face_encodings(uploaded_image)
-    id_encodings = face_recognition.face_encodings(id_image)
-    if not uploaded_encodings or not id_encodings:
-        # Could not detect a face in one or both images
-        return False
-    # Compare the first detected face
-    results = face_recognition.compare_faces([id_encodings[0]], uploaded_encodings[0], tolerance=tolerance)
-    return results[0]
-
-def validateIDDocument(document_path):
-    try:
-        result = easyocr_reader.readtext(document_path, detail=0, paragraph=True)
-        text = "\n".join(result)
-        print(f"[validateIDDocument] EasyOCR text: {repr(text)}")
-        mrz_text = extract_mrz(text)
-        mrz_info = parse_mrz(mrz_text) if mrz_text else None
-        if mrz_info:
-            print(f"[validateIDDocument] MRZ info: {mrz_info}")
-            has_mrz = True
-        else:
-            has_mrz = False
-    except Exception as e:
-        print("[validateIDDocument] error:", e)
-        return False
-    keywords = [
-        'passport', 'passpoort', 'passaporto', 'reisepass', 'passeport',
-        'united kingdom', 'britain', 'british', 'citizen', 'surname', 'given', 'name',
-        'date', 'birth', 'expiry', 'issue', 'authority', 'hmpo', 'number', 'code',
-        'type', 'nationality', 'sex', 'male', 'female', 'm', 'f', 'p', 'gbr', 'uk',
-        'driving', 'license', 'licence', 'id', 'identification', 'identity', 'card', 'dvla'
-    ]
-    found = [word for word in keywords if word in text.lower()]
-    fuzzy_found = sum(
-        difflib.SequenceMatcher(None, word, candidate).ratio() > 0.7
-        for word in keywords for candidate in text.lower().split()
-    )
-    has_keyword = len(found) >= 1 or fuzzy_found >= 2
-    # --- NEW: Require a face in the document ---
-    try:
-        import face_recognition
-        img_arr = face_recognition.load_image_file(document_path)
-        faces = face_recognition.face_locations(img_arr)
-        has_face = len(faces) > 0
-    except Exception as e:
-        print("[validateIDDocument] face_recognition error:", e)
-        has_face = False
-    print(f"[validateIDDocument] has_mrz={has_mrz}, has_keyword={has_keyword}, has_face={has_face}")
-    return (has_mrz or has_keyword) and has_face
-
 @app.route('/api/check_db', methods=['GET'])
 def check_db():
     try:
-        conn = sqlite3.connect(DB_USERS)
-        c = conn.cursor()
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users';")
-        exists = c.fetchone() is not None
-        conn.close()
+        exists = users_db.table_exists('users')
         return jsonify({'status': 'success', 'users_table_exists': exists})
     except Exception as e:
         return jsonify({'status': 'fail', 'error': str(e)}), 500
 
-# Initialize voice encoder once
-voice_encoder = VoiceEncoder()
+# Models load lazily on first use; with MYMARK_WARMUP=1 each job worker
+# preloads them after it forks and reports the result here
+@app.route('/api/models/health', methods=['GET'])
+def models_health():
+    workers = job_queue.worker_health()
+    failed = workers['failed'] + sorted(models.failures())
+    return jsonify({'status': 'fail' if failed else 'success', 'failed': failed,
+                    'models': models.health(), 'jobs': workers['workers']}), 503 if failed else 200
+
+@app.route('/api/models/warmup', methods=['POST'])
+def models_warmup():
+    names = (request.get_json(silent=True) or {}).get('models')
+    health = models.warmup(names)
+    failed = sorted(n for n in models.failures() if not names or n in names)
+    return jsonify({'status': 'fail' if failed else 'success', 'failed': failed,
+                    'models': health}), 503 if failed else 200
 
 @app.route('/api/liveness_check', methods=['POST'])
 def liveness_check():
-    data = request.json
-    if not data or 'face_image' not in data:
+    """One `face_image`, or a short burst as `frames` (JSON list or repeated file parts)."""
+    data = ingest.request_data(request)
+    burst = 'frames' in data or 'frames' in request.files
+    if not burst and 'face_image' not in data and 'face_image' not in request.files:
         return jsonify({'status': 'fail', 'message': 'Missing face_image'}), 400
     try:
-        img_data = decode_image(data['face_image'])
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as face_file:
-            face_file.write(img_data)
-            face_path = face_file.name
-        is_live = is_real_face(face_path)
-        os.remove(face_path)
-        if is_live:
-            return jsonify({'status': 'success', 'message': 'Liveness confirmed.'})
+        if burst:
+            bufs = ingest.frames_from_request(request, data, 'frames', MAX_LIVENESS_FRAMES)
         else:
-            return jsonify({'status': 'fail', 'message': 'Liveness not confirmed.'}), 400
+            bufs = [ingest.from_request(request, data, 'face_image')]
+        frames = [ImageContext.from_bgr(ingest.decode(buf, check=False), 'face_image') for buf in bufs]
+        result = LIVENESS_CHECKER.check(frames)
+        if result.live:
+            return jsonify({'status': 'success', 'message': 'Liveness confirmed.',
+                            'liveness': result.as_dict()})
+        else:
+            return jsonify({'status': 'fail', 'message': 'Liveness not confirmed.',
+                            'liveness': result.as_dict()}), 400
+    except IngestError as e:
+        return ingest_error(e)
+    except Exception as e:
+        return jsonify({'status': 'fail', 'message': f'Liveness check error: {str(e)}'}), 500
+
+def liveness_frame(buf):
+    return ImageContext.from_bgr(ingest.decode(buf, check=False), 'frame', max_side=LIVENESS_FACE_MAX_SIDE)
+
+def liveness_reply(status):
+    """202 while pending, then 200 / 400 like /api/liveness_check."""
+    if status['decision'] == 'live':
+        return jsonify({'status': 'success', 'message': 'Liveness confirmed.', 'liveness': status})
+    if status['decision'] == 'not_live':
+        return jsonify({'status': 'fail', 'message': 'Liveness not confirmed.', 'liveness': status}), 400
+    return jsonify({'status': 'pending', 'liveness': status}), 202
+
+@app.route('/api/liveness/session', methods=['POST'])
+def liveness_session_open():
+    sid, session = liveness_sessions.open()
+    return jsonify({'status': 'success', 'session': sid, 'liveness': session.status()}), 201
+
+@app.route('/api/liveness/session/<sid>', methods=['GET', 'POST', 'DELETE'])
+def liveness_session(sid):
+    """POST one `frame` per call, paced by the returned `next_ms`, until decided."""
+    session = liveness_sessions.get(sid)
+    if session is None:
+        return jsonify({'status': 'fail', 'message': 'Unknown or expired liveness session'}), 404
+    if request.method == 'DELETE':
+        liveness_sessions.close(sid)
+        return jsonify({'status': 'success'})
+    if request.method == 'GET':
+        return liveness_reply(session.status())
+    data = ingest.request_data(request)
+    # Frames sent faster than the sampling interval are dropped before decoding
+    if not session.offer():
+        return liveness_reply(session.status())
+    try:
+        return liveness_reply(session.feed(liveness_frame(ingest.from_request(request, data, 'frame'))))
+    except IngestError as e:
+        return ingest_error(e)
     except Exception as e:
         return jsonify({'status': 'fail', 'message': f'Liveness check error: {str(e)}'}), 500
 
+@app.route('/api/liveness/stream', methods=['POST'])
+def liveness_stream():
+    """
+    Chunked NDJSON: one base64 frame per line in, as a JSON string or as
+    {"frame": ..., "t": capture ms}, and one status line out per scored
+    frame.  The response ends, and the rest of the upload is left unread,
+    as soon as a decision is made.
+    """
+    session = liveness_sessions.session()
+    max_line = ingest.MAX_IMAGE_BYTES * 4 // 3 + 1024
+    stream = request.stream
+
+    def events():
+        while session.decision is None:
+            line = stream.readline(max_line)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                value, at = json.loads(line), None
+                if isinstance(value, dict):
+                    value, at = value.get('frame'), value.get('t')
+                if not session.offer(at / 1e3 if isinstance(at, (int, float)) else None):
+                    continue
+                if not value or not isinstance(value, str):
+                    raise IngestError('Missing frame')
+                buf = ingest.b64_payload(value)
+                ingest.check_header(buf)
+                status = session.feed(liveness_frame(buf))
+            except (IngestError, ValueError) as e:
+                yield json.dumps({'status': 'fail', 'message': str(e)}) + '\n'
+                return
+            if status['decision'] == 'pending':
+                yield json.dumps({'status': 'pending', 'liveness': status}) + '\n'
+        status = session.settle()
+        yield json.dumps({'status': 'success' if status['decision'] == 'live' else 'fail',
+                          'liveness': status}) + '\n'
+
+    return Response(stream_with_context(events()), mimetype='application/x-ndjson')
+
+@app.route('/api/liveness/stats', methods=['GET'])
+def liveness_stats():
+    return jsonify({'status': 'success', 'sessions': liveness_sessions.snapshot()})
+
 if __name__ == '__main__':
     try:
         app.run(debug=True, host='0.0.0.0', port=5050, ssl_context=('server.crt', 'server.key'))
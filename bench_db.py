@@ -0,0 +1,107 @@
+"""
+Mixed login / register throughput against users.db.
+
+    python bench_db.py [--threads 1 4 16] [--ops 4000] [--write-ratio 0.2]
+
+"legacy" is what the handlers used to do: connect per call, default
+rollback journal, commit per insert.  "storage" is `storage.UsersDB`:
+thread-local WAL connections, cached statements, group-committed writes.
+Both run against a fresh temporary database seeded with --users rows.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from storage import USERS_SCHEMA, UsersDB
+
+
+class Legacy:
+    def __init__(self, path):
+        self.path = path
+        conn = sqlite3.connect(path)
+        conn.executescript(USERS_SCHEMA)
+        conn.close()
+
+    def embeddings(self, username):
+        conn = sqlite3.connect(self.path, timeout=30)
+        row = conn.execute(
+            "SELECT face_embedding, catchphrase_embedding FROM users WHERE username=?", (username,)
+        ).fetchone()
+        conn.close()
+        return row
+
+    def create_user(self, username, face, catchphrase=None):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "INSERT INTO users (username, face_embedding, catchphrase_embedding) VALUES (?, ?, ?)",
+            (username, face, catchphrase),
+        )
+        conn.commit()
+        conn.close()
+
+
+def _storage(path):
+    db = UsersDB(path)
+    db.init_schema()
+    return db
+
+
+def run(db, threads: int, ops: int, write_ratio: float, users: int) -> float:
+    per_thread = ops // threads
+    errors = []
+
+    def worker(tid):
+        rng = random.Random(tid)
+        try:
+            for i in range(per_thread):
+                if rng.random() < write_ratio:
+                    db.create_user(f"bench-{tid}-{i}", os.urandom(512))
+                else:
+                    db.embeddings(f"user{rng.randrange(users)}")
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    if errors:
+        print(f"  {len(errors)} worker errors, first: {errors[0]}")
+    return per_thread * threads / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--ops", type=int, default=4000)
+    ap.add_argument("--write-ratio", type=float, default=0.2)
+    ap.add_argument("--users", type=int, default=10_000)
+    args = ap.parse_args()
+
+    print(f"{'layer':>8} {'threads':>8} {'ops/s':>10}")
+    for name, make in (("legacy", Legacy), ("storage", _storage)):
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "users.db")
+                db = make(path)
+                seed = sqlite3.connect(path)
+                seed.executemany(
+                    "INSERT INTO users (username, face_embedding) VALUES (?, ?)",
+                    ((f"user{i}", os.urandom(512)) for i in range(args.users)),
+                )
+                seed.commit()
+                seed.close()
+                rate = run(db, threads, args.ops, args.write_ratio, args.users)
+                print(f"{name:>8} {threads:>8} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Query latency of the detection indexes versus corpus size.
+
+    python bench_detection.py [--sizes 1000 10000 100000] [--queries 200]
+
+Hashes are random 64-bit ints; each query is a stored hash with a few bits
+flipped so there is always at least one true neighbour.
+"""
+
+import argparse
+import random
+import time
+
+from detection import HAMMING_THRESHOLD, INDEX_TYPES
+
+
+def _noisy(value: int, rng: random.Random, flips: int) -> int:
+    for bit in rng.sample(range(64), flips):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--threshold", type=int, default=HAMMING_THRESHOLD)
+    ap.add_argument("--kinds", nargs="+", default=list(INDEX_TYPES))
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'index':>8} {'N':>9} {'build s':>9} {'query ms':>9} {'hits/q':>7}")
+    for n in args.sizes:
+        corpus = [rng.getrandbits(64) for _ in range(n)]
+        queries = [_noisy(rng.choice(corpus), rng, rng.randint(0, args.threshold))
+                   for _ in range(args.queries)]
+        for kind in args.kinds:
+            index = INDEX_TYPES[kind]()
+            t0 = time.perf_counter()
+            for i, value in enumerate(corpus):
+                index.add(str(i), value)
+            build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            hits = sum(len(index.query(q, args.threshold)) for q in queries)
+            per_query = (time.perf_counter() - t0) / len(queries) * 1e3
+            print(f"{kind:>8} {n:>9} {build:>9.2f} {per_query:>9.3f} {hits / len(queries):>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+FaceNet backends: embedding parity, startup time and memory.
+
+    python bench_facenet.py [--backends tf onnx] [--batch 32] [--iters 10]
+
+Each backend is loaded in a fresh process so startup (import + model load)
+and peak RSS are measured in isolation.  The parity check then embeds the
+same prewhitened crops through both and fails (exit 1) if any pair of
+embeddings has cosine below --min-cosine.  Export the ONNX model first:
+`python -m face_auth.export_onnx`.
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def _crops(n, seed=0):
+    from face_auth import _prewhiten
+    rng = np.random.default_rng(seed)
+    return np.stack([_prewhiten(rng.integers(0, 256, (160, 160, 3)).astype(np.float32))
+                     for _ in range(n)]).astype(np.float32)
+
+
+def child(backend, batch, iters):
+    t0 = time.perf_counter()
+    from face_auth import FACENET_LOADERS
+    embed = FACENET_LOADERS[backend]()
+    load = time.perf_counter() - t0
+    x = _crops(batch)
+    t0 = time.perf_counter()
+    embed(x[:1])
+    first = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        embed(x)
+    per_batch = (time.perf_counter() - t0) / iters
+    print(json.dumps({
+        "backend": backend,
+        "startup_s": load,
+        "first_ms": first * 1e3,
+        "batch_ms": per_batch * 1e3,
+        "faces_per_s": batch / per_batch,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def parity(backends, n, min_cosine):
+    from face_auth import FACENET_LOADERS
+    x = _crops(n, seed=1)
+    ref_name, *others = backends
+    ref = FACENET_LOADERS[ref_name]()(x)
+    ok = True
+    for name in others:
+        out = FACENET_LOADERS[name]()(x)
+        cos = np.sum(ref * out, axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(out, axis=1))
+        max_abs = float(np.abs(ref - out).max())
+        print(f"parity {ref_name} vs {name}: min cosine {cos.min():.6f}, max |diff| {max_abs:.2e}")
+        ok &= bool(cos.min() >= min_cosine)
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["tf", "onnx"])
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--iters", type=int, default=10)
+    ap.add_argument("--parity-n", type=int, default=64)
+    ap.add_argument("--min-cosine", type=float, default=0.9999)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.child, args.batch, args.iters)
+        return
+
+    print(f"{'backend':>8} {'startup s':>10} {'first ms':>9} {'batch ms':>9} {'faces/s':>8} {'RSS MB':>8}")
+    for backend in args.backends:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--batch", str(args.batch),
+             "--iters", str(args.iters)],
+            capture_output=True, text=True,
+        )
+        if out.returncode:
+            print(f"{backend:>8} failed: {out.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{backend:>8} {r['startup_s']:>10.2f} {r['first_ms']:>9.1f} {r['batch_ms']:>9.1f} "
+              f"{r['faces_per_s']:>8.0f} {r['max_rss_mb']:>8.0f}")
+
+    if len(args.backends) > 1 and not parity(args.backends, args.parity_n, args.min_cosine):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
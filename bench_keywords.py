@@ -0,0 +1,124 @@
+"""
+ID keyword matching: legacy difflib loop versus `identity.KeywordMatcher`.
+
+    python bench_keywords.py [--docs 100] [--tokens 150 600] [--repeat 3]
+
+Dumps imitate EasyOCR output from ID documents: field labels with OCR
+character confusions, names, dates, document numbers, MRZ lines and stray
+fragments.  "legacy" is the validators' old rule (exact substring test,
+then a SequenceMatcher ratio for every keyword x token pair); "matcher" is
+`has_keyword` with a cold memo, "warm" the same after one pass, "count" the
+full fuzzy pair count with a cold memo.  "ratios/token" is how many
+SequenceMatcher runs the character index leaves per distinct token (legacy
+runs one per keyword).  The full fuzzy pair count is also checked against
+the legacy count for every dump, and the script exits 1 on any
+disagreement.
+"""
+
+import argparse
+import difflib
+import random
+import sys
+import time
+
+from identity.keywords import KeywordMatcher
+from identity.validation import ID_KEYWORDS
+
+LABELS = ["PASSPORT", "Surname", "Given names", "Nationality", "Date of birth", "Sex",
+          "Place of birth", "Date of issue", "Date of expiry", "Authority", "Type", "Code",
+          "Passport No", "DRIVING LICENCE", "IDENTITY CARD", "Signature", "Holder's signature",
+          "UNITED KINGDOM OF GREAT BRITAIN", "BRITISH CITIZEN", "HMPO", "DVLA"]
+NAMES = ["SMITH", "JONES", "TAYLOR", "BROWN", "WILLIAMS", "ANNA", "JOHN", "MARIA", "OLIVER",
+         "GEORGE", "AMELIA", "MUHAMMAD", "NGUYEN", "KOWALSKI"]
+CONFUSIONS = {"o": "0", "i": "1", "l": "1", "s": "5", "e": "c", "a": "4", "b": "8", "g": "9"}
+
+
+def _noisy(word, rng, rate):
+    return "".join(CONFUSIONS.get(c.lower(), c) if rng.random() < rate else c for c in word)
+
+
+def _date(rng):
+    return f"{rng.randint(1, 28):02d} {rng.choice(['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN'])} {rng.randint(50, 99)}"
+
+
+def dump(rng, n_tokens, rate):
+    parts = []
+    while sum(len(p.split()) for p in parts) < n_tokens:
+        kind = rng.random()
+        if kind < 0.35:
+            parts.append(_noisy(rng.choice(LABELS), rng, rate))
+        elif kind < 0.55:
+            parts.append(rng.choice(NAMES))
+        elif kind < 0.7:
+            parts.append(_date(rng))
+        elif kind < 0.8:
+            parts.append(f"{rng.randint(10**8, 10**9 - 1)}")
+        elif kind < 0.9:
+            parts.append("P<GBR" + rng.choice(NAMES) + "<<" + rng.choice(NAMES) + "<" * rng.randint(10, 30))
+        else:
+            parts.append("".join(rng.choice("abcdefghijklmnopqrstuvwxyz|/.,-") for _ in range(rng.randint(1, 6))))
+    return "\n".join(parts)
+
+
+def legacy_count(text, keywords):
+    return sum(difflib.SequenceMatcher(None, word, candidate).ratio() > 0.7
+               for word in keywords for candidate in text.lower().split())
+
+
+def legacy_has_keyword(text, keywords):
+    # The validators scored every pair before looking at the exact hits
+    found = [word for word in keywords if word in text.lower()]
+    fuzzy_found = legacy_count(text, keywords)
+    return len(found) >= 1 or fuzzy_found >= 2
+
+
+def timed(fn, docs, repeat, reset=None):
+    best = float("inf")
+    for _ in range(repeat):
+        elapsed = 0.0
+        for d in docs:
+            if reset:
+                reset()
+            t0 = time.perf_counter()
+            fn(d)
+            elapsed += time.perf_counter() - t0
+        best = min(best, elapsed)
+    return best / len(docs) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=100)
+    ap.add_argument("--tokens", type=int, nargs="+", default=[150, 600])
+    ap.add_argument("--noise", type=float, default=0.15)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = random.Random(7)
+    ok = True
+    print(f"{'tokens':>7} {'legacy ms':>10} {'matcher ms':>11} {'warm ms':>8} {'count ms':>9} "
+          f"{'ratios/token':>13} {'speedup':>8}")
+    for n in args.tokens:
+        docs = [dump(rng, n, args.noise) for _ in range(args.docs)]
+        matcher = KeywordMatcher(ID_KEYWORDS)
+        for d in docs:
+            if matcher.fuzzy_count(d) != legacy_count(d, ID_KEYWORDS):
+                ok = False
+            if matcher.has_keyword(d) != legacy_has_keyword(d, ID_KEYWORDS):
+                ok = False
+        legacy = timed(lambda d: legacy_has_keyword(d, ID_KEYWORDS), docs, 1)
+        clear = matcher.fuzzy_hits.cache_clear
+        cold = timed(matcher.has_keyword, docs, args.repeat, reset=clear)
+        warm = timed(matcher.has_keyword, docs, args.repeat)
+        count = timed(matcher.fuzzy_count, docs, args.repeat, reset=clear)   # every pair
+        tokens = {t for d in docs for t in d.lower().split()}
+        ratios = sum(len(matcher.candidates(t)) for t in tokens) / len(tokens)
+        print(f"{n:>7} {legacy:>10.2f} {cold:>11.3f} {warm:>8.3f} {count:>9.2f} "
+              f"{ratios:>6.2f} / {len(ID_KEYWORDS):<4} {legacy / cold:>7.0f}x")
+    print("parity:", "ok" if ok else "MISMATCH")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
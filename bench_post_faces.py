@@ -0,0 +1,116 @@
+"""
+Identity-misuse search over post face embeddings.
+
+    python bench_post_faces.py [--faces 1000000] [--queries 1 16] [--migrate-posts 20000]
+
+"legacy" is what a search had to do before `scan.faces`: parse every
+post's JSON hex `face_embeds` and score it in Python (timed on a sample of
+--legacy-sample rows and extrapolated).  "matrix" is `PostFaceMatrix.search`
+over the memory-mapped float32 sidecar with --faces rows, a few of which are
+planted near copies of each query so recall can be checked.  Migration
+throughput is measured separately on a temporary social.db.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from scan.faces import EMBEDDING_DIM, PostFaceMatrix, migrate
+from storage import SocialDB
+
+THRESHOLD = 0.88
+
+
+def _unit(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _near(q, rng, n):
+    return _unit(q + rng.normal(0, 0.02, (n, EMBEDDING_DIM)).astype(np.float32))
+
+
+def build(root, faces, queries, rng, chunk=250_000):
+    matrix = PostFaceMatrix(root)
+    planted = {}
+    for start in range(0, faces, chunk):
+        n = min(chunk, faces - start)
+        vecs = _unit(rng.normal(size=(n, EMBEDDING_DIM)).astype(np.float32))
+        ids = np.arange(start + 1, start + n + 1)
+        for qi, q in enumerate(queries):
+            rows = rng.choice(n, size=3, replace=False)
+            vecs[rows] = _near(q[None, :], rng, 3)
+            planted.setdefault(qi, set()).update(ids[rows].tolist())
+        matrix.append(ids, vecs)
+    return matrix, planted
+
+
+def legacy(queries, rng, sample):
+    blobs = [json.dumps([_unit(rng.normal(size=(1, EMBEDDING_DIM)).astype(np.float32))[0].tobytes().hex()])
+             for _ in range(sample)]
+    t0 = time.perf_counter()
+    for q in queries:
+        for value in blobs:
+            for blob in json.loads(value):
+                vec = np.frombuffer(bytes.fromhex(blob), dtype=np.float32)
+                float(vec @ q) / float(np.linalg.norm(vec))
+    return (time.perf_counter() - t0) / sample
+
+
+def bench_migrate(posts, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "social.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, face_embeds TEXT)")
+        conn.executemany("INSERT INTO posts (face_embeds) VALUES (?)", (
+            (json.dumps([v.tobytes().hex() for v in rng.normal(size=(2, EMBEDDING_DIM)).astype(np.float32)]),)
+            for _ in range(posts)
+        ))
+        conn.commit()
+        conn.close()
+        matrix = PostFaceMatrix(os.path.join(tmp, "post_faces"))
+        t0 = time.perf_counter()
+        added = migrate(SocialDB(path), matrix)
+        elapsed = time.perf_counter() - t0
+        matrix.close()
+    print(f"migrate: {posts} posts, {added} faces in {elapsed:.2f}s ({posts / elapsed:.0f} posts/s)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--faces", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, nargs="+", default=[1, 16])
+    ap.add_argument("--iters", type=int, default=5)
+    ap.add_argument("--legacy-sample", type=int, default=20_000)
+    ap.add_argument("--migrate-posts", type=int, default=20_000)
+    args = ap.parse_args()
+    rng = np.random.default_rng(0)
+
+    bench_migrate(args.migrate_posts, rng)
+
+    queries = _unit(rng.normal(size=(max(args.queries), EMBEDDING_DIM)).astype(np.float32))
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        matrix, planted = build(tmp, args.faces, queries, rng)
+        print(f"built {len(matrix)} faces in {time.perf_counter() - t0:.1f}s")
+        per_face = legacy(queries[:1], rng, args.legacy_sample)
+        print(f"{'engine':>8} {'queries':>8} {'ms/batch':>10} {'recall':>7}")
+        print(f"{'legacy':>8} {1:>8} {per_face * args.faces * 1e3:>10.0f} {'-':>7}")
+        for nq in args.queries:
+            matrix.search(queries[:nq], THRESHOLD)     # page the mapping in
+            t0 = time.perf_counter()
+            for _ in range(args.iters):
+                hits = matrix.search(queries[:nq], THRESHOLD)
+            ms = (time.perf_counter() - t0) / args.iters * 1e3
+            recall = np.mean([len(planted[i] & {p for p, _ in hits[i]}) / len(planted[i])
+                              for i in range(nq)])
+            print(f"{'matrix':>8} {nq:>8} {ms:>10.1f} {recall:>7.3f}")
+        matrix.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Matching cost against the on-disk fingerprint store versus corpus size.
+
+    python bench_store.py [--images 10000 100000] [--queries 200] [--batch 32]
+
+Each image is stored as its full hash set (nine rows, one per variant of
+`detection.VARIANTS`), so N images are 9N rows.  Hashes are random 64-bit
+ints; half the queries are a stored set with a few bits flipped in every
+hash, half are unrelated.  Reports, per size: bulk load, open
+(`attach_store`), the first `variants()` and first `add_fingerprint` after
+opening, and `match_hash_sets` latency per query, one query at a time and
+in batches, for each store search kind.  1M images take about a minute to
+load.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+import detection
+from detection import HAMMING_THRESHOLD, VARIANTS, attach_store, match_hash_sets, use_index
+from detection.store import FingerprintStore, StoreIndex
+
+LOAD_CHUNK = 50_000     # images per put_many
+
+
+def _noisy(value: int, rng: random.Random, flips: int) -> int:
+    for bit in rng.sample(range(64), flips):
+        value ^= 1 << bit
+    return value
+
+
+def _hash_set(rng: random.Random) -> dict:
+    return {name: rng.getrandbits(64) for name in VARIANTS}
+
+
+def _load(root: str, n: int, rng: random.Random) -> list:
+    """Write n random hash sets; returns the phash/dhash/center of each."""
+    store, probes = FingerprintStore(root), []
+    for start in range(0, n, LOAD_CHUNK):
+        records = []
+        for i in range(start, min(n, start + LOAD_CHUNK)):
+            hashes = _hash_set(rng)
+            records.extend((f"img{i}", value, VARIANTS[name]) for name, value in hashes.items())
+            probes.append({name: hashes[name] for name in detection.PROBES})
+        store.put_many(records)
+    store.close()
+    return probes
+
+
+def _ms(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--threshold", type=int, default=HAMMING_THRESHOLD)
+    ap.add_argument("--kinds", nargs="+", default=list(StoreIndex.KINDS))
+    args = ap.parse_args()
+
+    rng = random.Random(42)
+    for n in args.images:
+        with tempfile.TemporaryDirectory() as root:
+            t0 = time.perf_counter()
+            stored = _load(root, n, rng)
+            load = time.perf_counter() - t0
+            queries = [{name: _noisy(value, rng, rng.randint(0, 4)) for name, value in q.items()}
+                       if k % 2 == 0 else {name: rng.getrandbits(64) for name in q}
+                       for k, q in enumerate(rng.sample(stored, min(args.queries, n)))]
+
+            holder = {}
+            open_ms = _ms(lambda: holder.setdefault("store", attach_store(root)))
+            store = holder["store"]
+            variants_ms = _ms(lambda: store.variants(f"img{n - 1}"))
+            add_ms = _ms(lambda: detection.add_fingerprint(
+                "img-new", "0" * 16, {k: v for k, v in _hash_set(rng).items() if k != "phash"}))
+            print(f"{n} images, {n * len(VARIANTS)} rows: load {load:.1f} s, open {open_ms:.1f} ms, "
+                  f"first variants {variants_ms:.2f} ms, first add {add_ms:.1f} ms")
+
+            print(f"{'kind':>8} {'single ms/q':>12} {'batch ms/q':>11} {'hits/q':>7}")
+            for kind in args.kinds:
+                use_index(kind)
+                t0 = time.perf_counter()
+                hits = sum(len(match_hash_sets([q], args.threshold)[0]) for q in queries)
+                single = (time.perf_counter() - t0) / len(queries) * 1e3
+                t0 = time.perf_counter()
+                for start in range(0, len(queries), args.batch):
+                    match_hash_sets(queries[start:start + args.batch], args.threshold)
+                batch = (time.perf_counter() - t0) / len(queries) * 1e3
+                print(f"{kind:>8} {single:>12.3f} {batch:>11.3f} {hits / len(queries):>7.2f}")
+            store.close()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Watermark bit placement: old random.sample + per-bit loop versus keyed
+NumPy coordinates + fancy indexing, on 4K and 12 MP frames (decode/encode
+excluded, both write the same 256 bits).
+
+    python bench_watermark.py [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from watermarking import _keyed_coords, _legacy_coords, _n_bits, _owner_key
+
+SIZES = {"4K": (2160, 3840), "12MP": (3000, 4000)}
+OWNER = "alice@example.com"
+DENSITY = 0.02
+
+
+def old_embed(img, bits):
+    h, w = img.shape[:2]
+    rng = random.Random(_owner_key(OWNER))
+    coords = rng.sample(range(h * w), int(h * w * DENSITY))
+    for idx, coord in enumerate(coords[:len(bits)]):
+        y, x = divmod(coord, w)
+        img[y, x, 0] = (int(img[y, x, 0]) & 0xFE) | int(bits[idx])
+
+
+def new_embed(img, bits):
+    h, w = img.shape[:2]
+    ys, xs = np.divmod(_keyed_coords(OWNER, h * w, len(bits)), w)
+    img[ys, xs, 0] = (img[ys, xs, 0] & 0xFE) | bits
+
+
+def legacy_read(img, n_bits):
+    h, w = img.shape[:2]
+    ys, xs = np.divmod(_legacy_coords(OWNER, h * w, int(h * w * DENSITY), n_bits), w)
+    return img[ys, xs, 0] & 1
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>5} {'old embed ms':>13} {'new embed ms':>13} {'legacy read ms':>15}")
+    for name, (h, w) in SIZES.items():
+        img = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        bits = rng.integers(0, 2, _n_bits(h, w, DENSITY), dtype=np.uint8)
+        old = _time(lambda: old_embed(img, bits), args.repeat)
+        new = _time(lambda: new_embed(img, bits), args.repeat)
+        read = _time(lambda: legacy_read(img, len(bits)), args.repeat)
+        print(f"{name:>5} {old:>13.1f} {new:>13.3f} {read:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,20 @@ Assumes a local Ganache node running at http://127.0.0.1:8545
 
 from __future__ import annotations
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import json
+import threading
+import time
 
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 from eth_account import Account
 
+from .cache import RegistryCache
+from .events import Registration, _b32, registered_logs
+from .mirror import RegistryMirror
+from .submitter import PendingTx, TxSubmitter, wait_all
+
 # ── local‑chain defaults — change if you redeploy ────────────────────────
 GANACHE_URL = "http://127.0.0.1:8545"
 CHAIN_DEFAULT_ADDRESS = "0x8Ff8f74f5e232f0E102529ef14Fdc4ea5938A8b2"
@@ -19,6 +26,11 @@ DEFAULT_PRIVATE_KEY = (
     "0x1c044346705be2a7c983898a63f95a6129c0eeddb078127e40c40249b8935b67"
 )
 
+GAS_PRICE_GWEI = "2"
+GAS_MARGIN = 1.10
+CACHE_POLL_SECONDS = 1.0      # how often get() checks for new blocks
+RPC_BATCH_SIZE = 500          # eth_calls per JSON‑RPC batch in get_many()
+
 ABI_PATH = (
     Path(__file__).parent / "contracts" / "build" / "MyMarkRegistry.abi"
 )
@@ -35,10 +47,7 @@ def _load_abi(path: Path) -> list[dict]:
         return json.load(f)
 
 
-def _b32(value: str) -> bytes:
-    """Pack a UTF‑8 string into 32 bytes (truncate or keccak‑256)."""
-    b = value.encode()
-    return b[:32].ljust(32, b"\0") if len(b) <= 32 else Web3.keccak(b)
+_FINGERPRINTS_SELECTOR = Web3.keccak(text="fingerprints(bytes32)")[:4]
 
 
 class BlockchainRegistry:
@@ -52,6 +61,15 @@ class BlockchainRegistry:
         priv_key: str = DEFAULT_PRIVATE_KEY,
         connect: bool = True,  # NEW: allow skipping connection for dev/test
     ):
+        # Per-process send state: local nonce counter, cached chain id
+        self._nonce_lock = threading.Lock()
+        self._next_nonce: Optional[int] = None
+        self._chain_id: Optional[int] = None
+        self._in_flight: set = set()    # keys sent from here, receipt not in yet
+        self._submitter: Optional[TxSubmitter] = None
+        self.cache = RegistryCache()
+        self.mirror: Optional[RegistryMirror] = None
+        self.contract_address = contract_address
         if connect:
             self.web3 = Web3(Web3.HTTPProvider(provider_url))
             if not self.web3.is_connected():
@@ -74,45 +92,255 @@ class BlockchainRegistry:
             self._enabled = False
 
     # ── write ────────────────────────────────────────────────────────────
-    def register(self, image_id: str, fingerprint_hex: str) -> str:
+    def _take_nonce(self) -> int:
+        with self._nonce_lock:
+            if self._next_nonce is None:
+                self._next_nonce = self.web3.eth.get_transaction_count(
+                    self.account.address, "pending"
+                )
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def _resync_nonce(self) -> None:
+        with self._nonce_lock:
+            self._next_nonce = None
+
+    @property
+    def chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = self.web3.eth.chain_id
+        return self._chain_id
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def _known_registered(self, image_id: str) -> bool:
+        """Registered according to the mirror or the cache (no round trip)."""
+        if self.mirror is not None:
+            return self.mirror.get(image_id) is not None
+        found, value = self.cache.lookup(_b32(image_id))
+        return found and value is not None
+
+    def _gas_limit(self, func) -> int:
         """
-        Store fingerprint on‑chain (only once per image_id).
-        Returns the tx hash. Raises ContractLogicError if already registered.
-        """
-        func = self.contract.functions.register(_b32(image_id), _b32(fingerprint_hex))
-        tx_dict = func.build_transaction(
-            {
-                "from": self.account.address,
-                "nonce": self.web3.eth.get_transaction_count(self.account.address),
-                "gas": int(func.estimate_gas({"from": self.account.address}) * 1.10),
-                "gasPrice": self.web3.to_wei("2", "gwei"),
-                "chainId": self.web3.eth.chain_id,
-            }
-        )
-        signed = self.account.sign_transaction(tx_dict)
-        raw_tx = getattr(signed, "rawTransaction", signed.raw_transaction)  # v5|v6
+        Estimated for every send: the estimate runs register() and reverts
+        for an id that is already registered, so a duplicate is refused here
+        instead of being mined as a reverted transaction.
+        """
+        return int(func.estimate_gas({"from": self.account.address}) * GAS_MARGIN)
+
+    def send_register(self, image_id: str, fingerprint_hex: str) -> str:
+        """
+        Sign and broadcast a register() call without waiting for it to be
+        mined.  Returns the tx hash; raises RuntimeError for a duplicate.
+        """
+        if self._known_registered(image_id):
+            raise RuntimeError("Image already registered")
+        key = _b32(image_id)
+        with self._nonce_lock:
+            # The estimate cannot see our own unmined sends
+            if key in self._in_flight:
+                raise RuntimeError("Image registration already pending")
+            self._in_flight.add(key)
+        try:
+            return self._send_register(key, fingerprint_hex)
+        except Exception:
+            self._settled(image_id)
+            raise
+
+    def _send_register(self, key: bytes, fingerprint_hex: str) -> str:
+        func = self.contract.functions.register(key, _b32(fingerprint_hex))
         try:
+            gas = self._gas_limit(func)
+        except ContractLogicError as e:
+            raise RuntimeError(e.args[0]) from None
+        try:
+            tx_dict = func.build_transaction(
+                {
+                    "from": self.account.address,
+                    "nonce": self._take_nonce(),
+                    "gas": gas,
+                    "gasPrice": self.web3.to_wei(GAS_PRICE_GWEI, "gwei"),
+                    "chainId": self.chain_id,
+                }
+            )
+            signed = self.account.sign_transaction(tx_dict)
+            raw_tx = getattr(signed, "raw_transaction", None) or signed.rawTransaction  # v7|v5
             tx_hash = self.web3.eth.send_raw_transaction(raw_tx)
         except ContractLogicError as e:
             # Re‑raise with cleaner message for the caller
+            self._resync_nonce()
             raise RuntimeError(e.args[0]) from None
+        except Exception:
+            # the nonce we took (if any) was not consumed; leaving a gap
+            # would stall every later transaction
+            self._resync_nonce()
+            raise
+        return self.web3.to_hex(tx_hash)
 
-        self.web3.eth.wait_for_transaction_receipt(tx_hash)
-        return tx_hash.hex()
+    def _settled(self, image_id: str) -> None:
+        """A send of `image_id` failed or its receipt came in."""
+        key = _b32(image_id)
+        with self._nonce_lock:
+            self._in_flight.discard(key)
+        self.cache.invalidate(key)
+
+    def register(self, image_id: str, fingerprint_hex: str) -> str:
+        """
+        Store fingerprint on‑chain (only once per image_id).
+        Returns the tx hash. Raises RuntimeError if already registered or
+        if the transaction reverts.
+        """
+        tx_hash = self.send_register(image_id, fingerprint_hex)
+        try:
+            receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+        finally:
+            self._settled(image_id)
+        if receipt["status"] != 1:
+            # Duplicates were refused by the gas estimate; this is out of
+            # gas or a race with another sender
+            raise RuntimeError("Transaction reverted")
+        return tx_hash
+
+    def register_many(self, items: Iterable[Tuple[str, str]],
+                      timeout: float = 120) -> List[PendingTx]:
+        """
+        Register many (image_id, fingerprint_hex) pairs: every transaction is
+        sent back to back, then all receipts are collected together.
+        """
+        txs = []
+        for image_id, fingerprint_hex in items:
+            tx = PendingTx(image_id, fingerprint_hex)
+            try:
+                tx._sent(self.send_register(image_id, fingerprint_hex))
+            except Exception as e:
+                tx._resolve("failed", error=str(e))
+            txs.append(tx)
+        return wait_all(txs, self, timeout)
+
+    def submit(self, image_id: str, fingerprint_hex: str) -> PendingTx:
+        """
+        Queue a registration on the background submitter and return at once.
+        Poll the handle (or `pending(handle)`) for the outcome.
+        """
+        if not self._enabled:
+            tx = PendingTx(image_id, fingerprint_hex)
+            tx._resolve("failed", error="Blockchain disabled")
+            return tx
+        if self._submitter is None:
+            with self._nonce_lock:
+                if self._submitter is None:
+                    self._submitter = TxSubmitter(self)
+        return self._submitter.submit(image_id, fingerprint_hex)
+
+    def pending(self, handle: str) -> Optional[PendingTx]:
+        return self._submitter.get(handle) if self._submitter else None
 
     # ── read ─────────────────────────────────────────────────────────────
-        # ─────────────────────────────── read ───────────────────────────────
+    def _sync_cache(self) -> None:
+        """
+        At most once per CACHE_POLL_SECONDS: if new blocks arrived, replay
+        their Registered logs into the cache so "absent" entries flip to hits.
+        """
+        cache = self.cache
+        now = time.monotonic()
+        if now - cache.last_poll < CACHE_POLL_SECONDS:
+            return
+        cache.last_poll = now
+        head = self.web3.eth.block_number
+        if cache.last_block is not None and head > cache.last_block:
+            cache.apply(registered_logs(self.web3, self.contract.address,
+                                        cache.last_block + 1, head))
+        cache.last_block = head
+
+    def _call_fingerprints(self, keys: List[bytes]) -> List[Optional[str]]:
+        """
+        fingerprints(key) for many keys.  Providers that batch (HTTP) get one
+        JSON‑RPC batch request per RPC_BATCH_SIZE keys, sent through the
+        provider so its middleware, headers and timeouts apply; others fall
+        back to one eth_call each.
+        """
+        call = {"to": self.contract.address}
+        if self.account is not None:
+            call["from"] = self.account.address
+        calls = [{**call, "data": _FINGERPRINTS_SELECTOR + k} for k in keys]
+        if hasattr(self.web3.provider, "make_batch_request"):
+            raw = []
+            for start in range(0, len(calls), RPC_BATCH_SIZE):
+                with self.web3.batch_requests() as batch:
+                    for c in calls[start:start + RPC_BATCH_SIZE]:
+                        batch.add(self.web3.eth.call(c))
+                    raw.extend(batch.execute())
+        else:
+            raw = [self.web3.eth.call(c) for c in calls]
+        out = []
+        for result in raw:
+            # "0x" means no contract code answered, not an unregistered id
+            if len(result) < 32:
+                raise RuntimeError(f"fingerprints() returned {len(result)} bytes from "
+                                   f"{self.contract.address}; is the contract deployed?")
+            fp = bytes(result[:32])
+            # mapping returns 32 zero bytes if the key isn't set
+            out.append(None if fp == b"\0" * 32 else fp.hex())
+        return out
+
     def get(self, image_id: str) -> Optional[str]:
         """
         Return fingerprint hex for image_id, or None if it hasn't been registered.
+        Served from the read‑through cache when possible.
         """
-        fp_bytes: bytes = self.contract.functions.fingerprints(_b32(image_id)).call()
+        return self.get_many([image_id])[image_id]
 
-        # mapping returns 32 zero bytes if the key isn't set
-        if fp_bytes == b"\0" * 32:
-            return None
+    def get_many(self, image_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        `get` for many ids.  With a mirror attached this is a local SQLite
+        read; otherwise cache misses are resolved in one batched round trip.
+        """
+        if self.mirror is not None:
+            return {i: (rec["fingerprint"] if rec else None)
+                    for i, rec in self.mirror.lookup_many(image_ids).items()}
+        self._sync_cache()
+        out: Dict[str, Optional[str]] = {}
+        missing: List[str] = []
+        for image_id in image_ids:
+            found, value = self.cache.lookup(_b32(image_id))
+            if found:
+                out[image_id] = value
+            else:
+                missing.append(image_id)
+        if missing:
+            keys = [_b32(i) for i in missing]
+            for image_id, key, value in zip(missing, keys, self._call_fingerprints(keys)):
+                self.cache.store(key, value)
+                out[image_id] = value
+        return out
+
+    def registrations(self, image_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Which of these ids are registered, and when (needs a mirror)."""
+        if self.mirror is None:
+            raise RuntimeError("No registry mirror attached")
+        return self.mirror.lookup_many(image_ids)
 
-        return fp_bytes.hex()
+    # ── mirror ───────────────────────────────────────────────────────────
+    def attach_mirror(self, db_path: str | Path, follow: bool = True,
+                      interval: float = 2.0) -> RegistryMirror:
+        """
+        Serve reads from a local event-indexed SQLite mirror.  When a node is
+        reachable the mirror catches up now and then keeps following it.
+        """
+        mirror = RegistryMirror(db_path, self.contract_address,
+                                self.web3 if self._enabled else None)
+        if self._enabled:
+            try:
+                mirror.sync()
+            except Exception as e:
+                print(f"RegistryMirror initial sync failed: {e}")
+            if follow:
+                mirror.follow(interval)
+        self.mirror = mirror
+        return mirror
 
     # ── misc ─────────────────────────────────────────────────────────────
     @property
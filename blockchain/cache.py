@@ -0,0 +1,79 @@
+"""
+Read-through cache for `BlockchainRegistry.get`.
+
+Entries are keyed by the on-chain bytes32 image key and hold either the
+fingerprint hex or "registered-absent".  Registrations are write-once, so a
+cached hit can never go stale; an absent entry can, and is overwritten as
+soon as a `Registered` log for its key shows up in a newer block.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+import threading
+import time
+
+from .events import Registration
+
+_ABSENT = object()
+
+
+class RegistryCache:
+    """LRU with per-entry TTL (shorter for absent results)."""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600.0,
+                 absent_ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.absent_ttl = absent_ttl
+        self.last_block: Optional[int] = None
+        self.last_poll = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[object, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: bytes) -> Tuple[bool, Optional[str]]:
+        """(found, fingerprint_hex or None)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[0]
+            return True, None if value is _ABSENT else value
+
+    def store(self, key: bytes, value: Optional[str]) -> None:
+        ttl = self.absent_ttl if value is None else self.ttl
+        with self._lock:
+            self._entries[key] = (_ABSENT if value is None else value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: bytes) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def apply(self, registrations: Iterable[Registration]) -> None:
+        """Turn cached "absent" entries into hits for newly registered keys."""
+        for reg in registrations:
+            with self._lock:
+                held = reg.image_key in self._entries
+            if held:
+                self.store(reg.image_key, reg.fingerprint.hex())
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "last_block": self.last_block,
+        }
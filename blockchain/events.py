@@ -0,0 +1,51 @@
+"""
+Raw `Registered(bytes32 indexed imageId, bytes32 fingerprint)` log reader.
+
+Decodes topics/data by hand rather than through the contract event API so
+it behaves the same across web3.py major versions.
+"""
+
+from __future__ import annotations
+from typing import List, NamedTuple
+
+from web3 import Web3
+
+REGISTERED_TOPIC = Web3.keccak(text="Registered(bytes32,bytes32)")
+
+
+def _b32(value: str) -> bytes:
+    """Pack a UTF‑8 string into 32 bytes (truncate or keccak‑256)."""
+    b = value.encode()
+    return b[:32].ljust(32, b"\0") if len(b) <= 32 else Web3.keccak(b)
+
+
+class Registration(NamedTuple):
+    image_key: bytes        # the bytes32 imageId as stored on-chain
+    fingerprint: bytes      # bytes32
+    block_number: int
+    tx_hash: str
+    log_index: int
+
+
+def _raw(value) -> bytes:
+    return bytes(value) if not isinstance(value, str) else bytes.fromhex(value.removeprefix("0x"))
+
+
+def registered_logs(web3: Web3, address: str,
+                    from_block: int, to_block: int) -> List[Registration]:
+    logs = web3.eth.get_logs({
+        "address": address,
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "topics": [web3.to_hex(REGISTERED_TOPIC)],
+    })
+    return [
+        Registration(
+            image_key=_raw(log["topics"][1]),
+            fingerprint=_raw(log["data"])[:32],
+            block_number=log["blockNumber"],
+            tx_hash=web3.to_hex(log["transactionHash"]),
+            log_index=log["logIndex"],
+        )
+        for log in logs
+    ]
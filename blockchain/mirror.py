@@ -0,0 +1,152 @@
+"""
+Local SQLite mirror of the MyMarkRegistry `Registered` event log.
+
+`sync()` follows the contract's logs from the last stored block checkpoint
+and upserts them into `registrations`, so a restart resumes where it left
+off.  Reads (`get`, `lookup_many`, `by_fingerprint`) never touch the node.
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import sqlite3
+import threading
+import time
+
+from web3 import Web3
+
+from .events import _b32, registered_logs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registrations (
+    image_key     BLOB PRIMARY KEY,          -- bytes32 imageId as on-chain
+    fingerprint   BLOB NOT NULL,             -- bytes32
+    block_number  INTEGER NOT NULL,
+    registered_at INTEGER,                   -- block timestamp (unix seconds)
+    tx_hash       TEXT,
+    log_index     INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_registrations_fingerprint ON registrations(fingerprint);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    contract   TEXT PRIMARY KEY,
+    last_block INTEGER NOT NULL
+);
+"""
+
+
+class RegistryMirror:
+    """Event-indexed copy of one deployed registry contract."""
+
+    def __init__(self, db_path: str | Path, contract_address: str,
+                 web3: Optional[Web3] = None, start_block: int = 0,
+                 chunk_size: int = 2000, confirmations: int = 0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.contract_address = Web3.to_checksum_address(contract_address)
+        self.web3 = web3
+        self.start_block = start_block
+        self.chunk_size = chunk_size
+        self.confirmations = confirmations
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._follower: Optional[threading.Thread] = None
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ── follow the chain ─────────────────────────────────────────────────
+    @property
+    def checkpoint(self) -> int:
+        row = self._conn().execute(
+            "SELECT last_block FROM checkpoints WHERE contract=?", (self.contract_address,)
+        ).fetchone()
+        return row[0] if row else self.start_block - 1
+
+    def sync(self) -> int:
+        """Index every block since the checkpoint; returns rows written."""
+        if self.web3 is None:
+            raise RuntimeError("RegistryMirror has no node to sync from")
+        with self._sync_lock:
+            head = self.web3.eth.block_number - self.confirmations
+            written = 0
+            start = self.checkpoint + 1
+            while start <= head:
+                end = min(start + self.chunk_size - 1, head)
+                regs = registered_logs(self.web3, self.contract_address, start, end)
+                stamps = {n: self.web3.eth.get_block(n)["timestamp"]
+                          for n in {r.block_number for r in regs}}
+                conn = self._conn()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO registrations VALUES (?, ?, ?, ?, ?, ?)",
+                        [(r.image_key, r.fingerprint, r.block_number, stamps[r.block_number],
+                          r.tx_hash, r.log_index) for r in regs],
+                    )
+                    conn.execute(
+                        "INSERT INTO checkpoints VALUES (?, ?) "
+                        "ON CONFLICT(contract) DO UPDATE SET last_block=excluded.last_block",
+                        (self.contract_address, end),
+                    )
+                written += len(regs)
+                start = end + 1
+            return written
+
+    def follow(self, interval: float = 2.0) -> None:
+        """Keep syncing on a daemon thread."""
+        if self._follower is not None:
+            return
+
+        def _loop():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"RegistryMirror sync failed: {e}")
+                time.sleep(interval)
+
+        self._follower = threading.Thread(target=_loop, name="registry-mirror", daemon=True)
+        self._follower.start()
+
+    # ── read ─────────────────────────────────────────────────────────────
+    def get(self, image_id: str) -> Optional[str]:
+        """Fingerprint hex for image_id (as `BlockchainRegistry.get`), or None."""
+        row = self._conn().execute(
+            "SELECT fingerprint FROM registrations WHERE image_key=?", (_b32(image_id),)
+        ).fetchone()
+        return row[0].hex() if row else None
+
+    def lookup_many(self, image_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """{image_id: {fingerprint, block_number, registered_at, tx_hash} or None}."""
+        ids = list(image_ids)
+        keys = {_b32(i): i for i in ids}
+        out: Dict[str, Optional[dict]] = dict.fromkeys(ids)
+        conn = self._conn()
+        key_list = list(keys)
+        for start in range(0, len(key_list), 500):
+            chunk = key_list[start:start + 500]
+            rows = conn.execute(
+                "SELECT image_key, fingerprint, block_number, registered_at, tx_hash "
+                f"FROM registrations WHERE image_key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for key, fp, block, ts, tx in rows:
+                out[keys[key]] = {"fingerprint": fp.hex(), "block_number": block,
+                                  "registered_at": ts, "tx_hash": tx}
+        return out
+
+    def by_fingerprint(self, fingerprint_hex: str) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT image_key, block_number, registered_at, tx_hash "
+            "FROM registrations WHERE fingerprint=?", (_b32(fingerprint_hex),)
+        )
+        return [{"image_key": k.hex(), "block_number": b, "registered_at": ts, "tx_hash": tx}
+                for k, b, ts, tx in rows]
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
@@ -0,0 +1,158 @@
+"""
+Background transaction pipeline for BlockchainRegistry.
+
+`TxSubmitter` drains a queue of (image_id, fingerprint) pairs, sends each
+as soon as it is signed (nonces are tracked locally by the registry, so
+there is no round trip between sends) and polls receipts for everything in
+flight.  Callers get a `PendingTx` handle straight away.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Optional
+import queue
+import threading
+import time
+import uuid
+
+from web3.exceptions import TransactionNotFound
+
+if TYPE_CHECKING:
+    from . import BlockchainRegistry
+
+
+class PendingTx:
+    """Handle for one registration; resolves to mined or failed."""
+
+    def __init__(self, image_id: str, fingerprint_hex: str):
+        self.handle = uuid.uuid4().hex
+        self.image_id = image_id
+        self.fingerprint_hex = fingerprint_hex
+        self.tx_hash: Optional[str] = None
+        self.status = "queued"           # queued → pending → mined | failed
+        self.block_number: Optional[int] = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+
+    def _sent(self, tx_hash: str) -> None:
+        self.tx_hash = tx_hash
+        self.status = "pending"
+
+    def _resolve(self, status: str, block_number: int | None = None,
+                 error: str | None = None) -> None:
+        self.status, self.block_number, self.error = status, block_number, error
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> "PendingTx":
+        self._done.wait(timeout)
+        return self
+
+    def as_dict(self) -> dict:
+        return {
+            "handle": self.handle,
+            "image_id": self.image_id,
+            "tx_hash": self.tx_hash,
+            "status": self.status,
+            "block_number": self.block_number,
+            "error": self.error,
+        }
+
+
+def _check_receipt(registry: "BlockchainRegistry", tx: PendingTx) -> bool:
+    """Resolve `tx` if its receipt is available; True once it is done."""
+    try:
+        receipt = registry.web3.eth.get_transaction_receipt(tx.tx_hash)
+    except TransactionNotFound:
+        return False
+    except Exception as e:
+        # A timeout or dropped connection says nothing about the tx; poll again
+        print(f"[tx] receipt lookup for {tx.tx_hash} failed: {e}")
+        return False
+    registry._settled(tx.image_id)
+    if receipt["status"] == 1:
+        tx._resolve("mined", receipt["blockNumber"])
+    else:
+        tx._resolve("failed", receipt["blockNumber"], "Transaction reverted")
+    return True
+
+
+class TxSubmitter:
+    """One daemon thread: send queued registrations, then poll their receipts."""
+
+    def __init__(self, registry: "BlockchainRegistry", poll_interval: float = 0.5,
+                 max_batch: int = 64, keep: int = 10_000):
+        self.registry = registry
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self.keep = keep
+        self._queue: "queue.Queue[PendingTx]" = queue.Queue()
+        self._in_flight: List[PendingTx] = []
+        self._handles: "OrderedDict[str, PendingTx]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="tx-submitter", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_id: str, fingerprint_hex: str) -> PendingTx:
+        tx = PendingTx(image_id, fingerprint_hex)
+        with self._lock:
+            self._handles[tx.handle] = tx
+            while len(self._handles) > self.keep:
+                self._handles.popitem(last=False)
+        self._queue.put(tx)
+        return tx
+
+    def get(self, handle: str) -> Optional[PendingTx]:
+        with self._lock:
+            return self._handles.get(handle)
+
+    # ── worker ───────────────────────────────────────────────────────────
+    def _drain(self, block: bool) -> List[PendingTx]:
+        batch: List[PendingTx] = []
+        try:
+            batch.append(self._queue.get(timeout=self.poll_interval) if block
+                         else self._queue.get_nowait())
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _send(self, batch: List[PendingTx]) -> None:
+        for tx in batch:
+            try:
+                tx._sent(self.registry.send_register(tx.image_id, tx.fingerprint_hex))
+                self._in_flight.append(tx)
+            except Exception as e:
+                tx._resolve("failed", error=str(e))
+
+    def _poll(self) -> None:
+        self._in_flight = [tx for tx in self._in_flight if not _check_receipt(self.registry, tx)]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._drain(block=not self._in_flight)
+            if batch:
+                self._send(batch)
+            if self._in_flight:
+                self._poll()
+                if not batch:
+                    time.sleep(self.poll_interval)
+
+
+def wait_all(txs: List[PendingTx], registry: "BlockchainRegistry",
+             timeout: float = 120, poll_interval: float = 0.1) -> List[PendingTx]:
+    """Collect receipts for already-sent transactions without a thread."""
+    deadline = time.monotonic() + timeout
+    pending = [tx for tx in txs if not tx.done]
+    while pending and time.monotonic() < deadline:
+        pending = [tx for tx in pending if not _check_receipt(registry, tx)]
+        if pending:
+            time.sleep(poll_interval)
+    for tx in pending:
+        registry._settled(tx.image_id)
+        tx._resolve("failed", error="Timed out waiting for receipt")
+    return txs
@@ -11,4 +11,11 @@ try:
 except RuntimeError as err:         # already registered
     print("Register skipped:", err)
 
-print("Stored fp:", registry.get(image_id))
\ No newline at end of file
+print("Stored fp:", registry.get(image_id))
+
+# Batch path: every tx is sent back to back, receipts collected together
+batch = registry.register_many(
+    [(f"demo_batch_{i:02d}", f"{i:02x}" * 32) for i in range(5)]
+)
+for tx in batch:
+    print(tx.image_id, tx.status, tx.tx_hash, tx.error or "")
@@ -1,53 +1,257 @@
 """
 Lightweight matching utilities for MyMark.
 Currently uses perceptual‑hash Hamming distance; ready for CLIP upgrade later.
+
+Each image is stored as a small set of 64‑bit hashes (see
+`watermarking.hash_set`): pHash, dHash, aHash, a mirrored pHash, a
+centre‑crop pHash and one pHash per quadrant.  Every variant goes into the
+same radius index, so a query probes it with a fixed three hashes (its
+pHash, dHash and centre pHash) whatever the number of stored variants, then
+verifies each candidate id against its full hash set.
 """
 
 from __future__ import annotations
 from pathlib import Path
-from typing import Dict, List, Tuple
-import imagehash
-from PIL import Image
+from typing import Dict, List, Optional, Set, Tuple
+
+from .index import BKTreeIndex, LinearIndex, MultiIndexHash, hamming, hex_to_int
+from .vector import PackedHashIndex, popcount64
+from .store import FingerprintStore, StoreIndex
 
 HAMMING_THRESHOLD = 10  # tweak for sensitivity (0 = exact)
 
+# Candidate pass radius is the threshold plus this; verification then needs
+# one pHash pairing within the threshold, or two pairings within the radius
+CANDIDATE_SLACK = 2
+
+# Store variant code of each `watermarking.hash_set` entry (0 = primary)
+VARIANTS = {
+    "phash": 0, "dhash": 1, "ahash": 2, "flip": 3, "center": 4,
+    "tile0": 5, "tile1": 6, "tile2": 7, "tile3": 8,
+}
+PHASH = VARIANTS["phash"]
+
+# Query hashes probed against the combined index in the candidate pass
+PROBES = ("phash", "dhash", "center")
+
+# Verification pairings: (query hash, stored hash, decisive on its own)
+PAIRINGS = (
+    ("phash", "phash", True),
+    ("phash", "flip", True),        # mirrored copy
+    ("phash", "center", True),      # the stored image with a border added
+    ("center", "phash", True),      # a border / frame around the stored image
+    ("center", "center", True),
+    ("phash", "tile0", True),       # a crop to one quadrant
+    ("phash", "tile1", True),
+    ("phash", "tile2", True),
+    ("phash", "tile3", True),
+    ("dhash", "dhash", False),
+    ("ahash", "ahash", False),
+)
+
+# Stored variants each probe can pair with; an attached store is searched
+# for those rows only
+PROBE_VARIANTS = {
+    probe: sorted({VARIANTS[s] for q, s, _ in PAIRINGS if q == probe}) for probe in PROBES
+}
+
+INDEX_TYPES = {
+    "linear": LinearIndex,
+    "bktree": BKTreeIndex,
+    "mih": MultiIndexHash,
+    "numpy": PackedHashIndex,
+}
+
 # In‑memory index  {image_id: hash_hex}
 _fingerprint_db: Dict[str, str] = {}
 
+# Every stored hash per image  {image_id: {variant: value}}
+_hash_sets: Dict[str, Dict[int, int]] = {}
+
+# Radius-search structure over all of those hashes (see detection/index.py)
+_index = MultiIndexHash()
+
+# Optional on-disk store; once attached it replaces both of the above
+_store: FingerprintStore | None = None
+
 
 # ---------------------------------------------------------------------------#
 # 1.  Index maintenance helpers
 # ---------------------------------------------------------------------------#
-def add_fingerprint(image_id: str, phash_hex: str) -> None:
+def attach_store(root: str | Path) -> FingerprintStore:
+    """
+    Keep fingerprints in the memory‑mapped store under `root` (created if
+    missing) instead of process memory.  Fingerprints added before the call
+    are written to the store, and queries probe the store's own on‑disk
+    multi‑index tables (`use_index("numpy")` scans the mapped column instead).
+    """
+    global _index, _store
+    store = FingerprintStore(root)
+    if _hash_sets:
+        store.put_many([(i, value, variant) for i, hashes in _hash_sets.items()
+                        for variant, value in hashes.items()], replace_id=True)
+        _fingerprint_db.clear()
+        _hash_sets.clear()
+    _store, _index = store, StoreIndex(store, variant=None, kind="mih")
+    return store
+
+
+def use_index(kind: str = "mih") -> None:
+    """
+    Swap the search structure ("linear", "bktree", "mih" or "numpy") and re‑index
+    every stored fingerprint into it.  With a store attached only "mih" and
+    "numpy" apply, and both search the store in place.
+    """
+    global _index
+    if _store is not None:
+        _index = StoreIndex(_store, variant=None, kind=kind)
+        return
+    try:
+        index = INDEX_TYPES[kind]()
+    except KeyError:
+        raise ValueError(f"Unknown index type {kind!r}; pick one of {sorted(INDEX_TYPES)}") from None
+    for image_id, hashes in _hash_sets.items():
+        for value in set(hashes.values()):
+            index.add(image_id, value)
+    _index = index
+
+
+def add_fingerprint(image_id: str, phash_hex: str,
+                    hashes: Dict[str, int] | None = None) -> None:
+    """
+    Store `image_id` under `phash_hex`, plus the other variants in `hashes`
+    (a `watermarking.hash_set` result) when given.  Replaces every hash
+    previously stored for the id.
+    """
+    stored = {VARIANTS[name]: value for name, value in (hashes or {}).items()}
+    stored[PHASH] = hex_to_int(phash_hex)
+    if _store is not None:
+        _store.put_many([(image_id, value, variant) for variant, value in stored.items()],
+                        replace_id=True)
+        return
+    remove_fingerprint(image_id)
     _fingerprint_db[image_id] = phash_hex
+    _hash_sets[image_id] = stored
+    for value in set(stored.values()):
+        _index.add(image_id, value)
 
 
 def remove_fingerprint(image_id: str) -> None:
+    if _store is not None:
+        _store.delete(image_id)
+        return
     _fingerprint_db.pop(image_id, None)
+    for value in set(_hash_sets.pop(image_id, {}).values()):
+        _index.remove(image_id, value)
 
 
 def all_fingerprints() -> Dict[str, str]:
+    if _store is not None:
+        return {image_id: f"{value:016x}" for image_id, value in _store.items()}
     return _fingerprint_db.copy()
 
 
+def fingerprint_count() -> int:
+    return len(_store) if _store is not None else len(_fingerprint_db)
+
+
 # ---------------------------------------------------------------------------#
-# 2.  Matching
+# 2.  Matching: candidate pass over the combined index, then verification
 # ---------------------------------------------------------------------------#
-def _phash(img_path: Path) -> imagehash.ImageHash:
-    from watermarking import phash as compute_phash
-    return imagehash.hex_to_hash(compute_phash(img_path))
+def _query_hashes(img_path: Path) -> Dict[str, int]:
+    from watermarking import query_hash_set
+    return query_hash_set(img_path)
+
+
+def _stored_hashes(image_ids: Set[str]) -> Dict[str, Dict[int, int]]:
+    if _store is not None:
+        return _store.variants_many(sorted(image_ids))
+    return {image_id: _hash_sets.get(image_id, {}) for image_id in image_ids}
+
+
+def _candidates(queries: List[Dict[str, int]], radius: int) -> List[Set[str]]:
+    """Ids with any stored variant within `radius` of any probe hash, per query."""
+    out: List[Set[str]] = [set() for _ in queries]
+    if isinstance(_index, StoreIndex):
+        # One pass per probe kind, over the variants it can pair with
+        for name in PROBES:
+            which = [k for k, q in enumerate(queries) if name in q]
+            hits = _index.query_many([queries[k][name] for k in which], radius,
+                                     variants=PROBE_VARIANTS[name])
+            for k, hit in zip(which, hits):
+                out[k].update(image_id for image_id, _ in hit)
+        return out
+    probes = [[q[name] for name in PROBES if name in q] for q in queries]
+    flat = [value for p in probes for value in p]
+    query_many = getattr(_index, "query_many", None)
+    if query_many is not None:
+        hits = query_many(flat, radius)
+    else:
+        hits = [_index.query(value, radius) for value in flat]
+    start = 0
+    for k, p in enumerate(probes):
+        out[k].update(image_id for hit in hits[start:start + len(p)] for image_id, _ in hit)
+        start += len(p)
+    return out
+
+
+def _verify(query: Dict[str, int], stored: Dict[int, int], threshold: int) -> Optional[int]:
+    """Best pairing distance if the hash sets agree, else None."""
+    radius = threshold + CANDIDATE_SLACK
+    best, votes, decided = None, 0, False
+    for q_name, s_name, decisive in PAIRINGS:
+        q, s = query.get(q_name), stored.get(VARIANTS[s_name])
+        if q is None or s is None:
+            continue
+        dist = hamming(q, s)
+        if dist > radius:
+            continue
+        votes += 1
+        decided |= decisive and dist <= threshold
+        best = dist if best is None else min(best, dist)
+    return best if decided or votes >= 2 else None
+
+
+def match_hash_sets(queries: List[Dict[str, int]],
+                    threshold: int = HAMMING_THRESHOLD) -> List[List[Tuple[str, int]]]:
+    """
+    Bulk matching for precomputed query hashes: `watermarking.query_hash_set`
+    dicts, or just {"phash": value} when that is all there is.  The probes
+    of the whole batch go through the index in one `query_many` call.
+    """
+    candidates = _candidates(queries, threshold + CANDIDATE_SLACK)
+    stored = _stored_hashes(set().union(*candidates))
+    results = []
+    for query, ids in zip(queries, candidates):
+        matches = []
+        for image_id in ids:
+            dist = _verify(query, stored[image_id], threshold)
+            if dist is not None:
+                matches.append((image_id, dist))
+        results.append(sorted(matches, key=lambda t: t[1]))
+    return results
+
+
+def match_hash(phash_hex: str,
+               threshold: int = HAMMING_THRESHOLD) -> List[Tuple[str, int]]:
+    """Like `find_matches`, for a pHash that has already been computed."""
+    return match_hash_sets([{"phash": hex_to_int(phash_hex)}], threshold)[0]
 
 
 def find_matches(img_path: str | Path,
                  threshold: int = HAMMING_THRESHOLD) -> List[Tuple[str, int]]:
     """
-    Compare `img_path` against every stored fingerprint.
+    Compare `img_path` against every stored fingerprint set.
     Returns a list of (image_id, distance) sorted from closest to farthest.
     """
-    query_hash = _phash(Path(img_path))
-    results = []
-    for image_id, fp_hex in _fingerprint_db.items():
-        dist = query_hash - imagehash.hex_to_hash(fp_hex)
-        if dist <= threshold:
-            results.append((image_id, dist))
-    return sorted(results, key=lambda t: t[1])
\ No newline at end of file
+    return match_hash_sets([_query_hashes(Path(img_path))], threshold)[0]
+
+
+def find_matches_batch(img_paths: List[str | Path],
+                       threshold: int = HAMMING_THRESHOLD) -> List[List[Tuple[str, int]]]:
+    """
+    `find_matches` for many images at once.  With the "numpy" engine (or an
+    attached store) the whole batch of probes is scored against the corpus
+    as one distance matrix.
+    """
+    return match_hash_sets([_query_hashes(Path(p)) for p in img_paths], threshold)
@@ -0,0 +1,209 @@
+"""
+Hamming-distance indexes over 64-bit perceptual hashes.
+
+Every index keeps {phash_int: {image_id, ...}} and answers radius queries
+("every id whose hash is within `threshold` bits of `query`").  They are
+interchangeable behind `detection.add_fingerprint` / `find_matches`.
+"""
+
+from __future__ import annotations
+from itertools import combinations
+from typing import Dict, Iterable, List, Set, Tuple
+
+HASH_BITS = 64
+
+
+def hex_to_int(phash_hex: str) -> int:
+    """imagehash hex string ➜ unsigned 64-bit int."""
+    return int(phash_hex, 16)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# ---------------------------------------------------------------------------#
+# 1.  Linear scan (reference implementation, O(N) per query)
+# ---------------------------------------------------------------------------#
+class LinearIndex:
+    """Brute force over every stored hash – fine for a few thousand images."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    def add(self, image_id: str, value: int) -> None:
+        self._ids.setdefault(value, set()).add(image_id)
+
+    def remove(self, image_id: str, value: int) -> None:
+        ids = self._ids.get(value)
+        if ids is not None:
+            ids.discard(image_id)
+            if not ids:
+                del self._ids[value]
+
+    def query(self, value: int, threshold: int) -> List[Tuple[str, int]]:
+        results = []
+        for stored, ids in self._ids.items():
+            dist = hamming(value, stored)
+            if dist <= threshold:
+                results.extend((image_id, dist) for image_id in ids)
+        return results
+
+
+# ---------------------------------------------------------------------------#
+# 2.  BK-tree (metric tree, prunes with the triangle inequality)
+# ---------------------------------------------------------------------------#
+class _BKNode:
+    __slots__ = ("value", "ids", "children")
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+        self.ids: Set[str] = set()
+        self.children: Dict[int, _BKNode] = {}
+
+
+class BKTreeIndex:
+    """
+    Burkhard-Keller tree keyed on Hamming distance.
+    Removing the last id of a node leaves it in place as a routing node.
+    """
+
+    def __init__(self) -> None:
+        self._root: _BKNode | None = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _find_or_insert(self, value: int) -> _BKNode:
+        if self._root is None:
+            self._root = _BKNode(value)
+            return self._root
+        node = self._root
+        while True:
+            dist = hamming(value, node.value)
+            if dist == 0:
+                return node
+            child = node.children.get(dist)
+            if child is None:
+                child = node.children[dist] = _BKNode(value)
+                return child
+            node = child
+
+    def add(self, image_id: str, value: int) -> None:
+        node = self._find_or_insert(value)
+        if image_id not in node.ids:
+            node.ids.add(image_id)
+            self._size += 1
+
+    def remove(self, image_id: str, value: int) -> None:
+        node = self._root
+        while node is not None:
+            dist = hamming(value, node.value)
+            if dist == 0:
+                if image_id in node.ids:
+                    node.ids.discard(image_id)
+                    self._size -= 1
+                return
+            node = node.children.get(dist)
+
+    def query(self, value: int, threshold: int) -> List[Tuple[str, int]]:
+        results: List[Tuple[str, int]] = []
+        if self._root is None:
+            return results
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            dist = hamming(value, node.value)
+            if dist <= threshold:
+                results.extend((image_id, dist) for image_id in node.ids)
+            lo, hi = dist - threshold, dist + threshold
+            stack.extend(child for d, child in node.children.items() if lo <= d <= hi)
+        return results
+
+
+# ---------------------------------------------------------------------------#
+# 3.  Multi-index hashing (Norouzi et al.) over 16-bit substrings
+# ---------------------------------------------------------------------------#
+class MultiIndexHash:
+    """
+    Split each hash into `n_bands` equal substrings and keep one exact-match
+    table per band.  By the pigeonhole principle any hash within distance r
+    differs from the query by at most r // n_bands bits in at least one band,
+    so probing every band value within that radius yields a superset of the
+    true neighbours, which is then verified with the full distance.
+    """
+
+    def __init__(self, n_bands: int = 4) -> None:
+        if HASH_BITS % n_bands:
+            raise ValueError(f"n_bands must divide {HASH_BITS}")
+        self.n_bands = n_bands
+        self.band_bits = HASH_BITS // n_bands
+        self._band_mask = (1 << self.band_bits) - 1
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in range(n_bands)]
+        self._ids: Dict[int, Set[str]] = {}
+        self._flip_masks: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids.values())
+
+    def _bands(self, value: int) -> Iterable[Tuple[int, int]]:
+        for i in range(self.n_bands):
+            yield i, (value >> (i * self.band_bits)) & self._band_mask
+
+    def _masks(self, radius: int) -> List[int]:
+        """Every band-width bit mask with at most `radius` bits set."""
+        masks = self._flip_masks.get(radius)
+        if masks is None:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for bits in combinations(range(self.band_bits), r):
+                    m = 0
+                    for b in bits:
+                        m |= 1 << b
+                    masks.append(m)
+            self._flip_masks[radius] = masks
+        return masks
+
+    def add(self, image_id: str, value: int) -> None:
+        ids = self._ids.get(value)
+        if ids is None:
+            ids = self._ids[value] = set()
+            for i, band in self._bands(value):
+                self._tables[i].setdefault(band, set()).add(value)
+        ids.add(image_id)
+
+    def remove(self, image_id: str, value: int) -> None:
+        ids = self._ids.get(value)
+        if ids is None:
+            return
+        ids.discard(image_id)
+        if ids:
+            return
+        del self._ids[value]
+        for i, band in self._bands(value):
+            bucket = self._tables[i].get(band)
+            if bucket is not None:
+                bucket.discard(value)
+                if not bucket:
+                    del self._tables[i][band]
+
+    def query(self, value: int, threshold: int) -> List[Tuple[str, int]]:
+        masks = self._masks(threshold // self.n_bands)
+        candidates: Set[int] = set()
+        for i, band in self._bands(value):
+            table = self._tables[i]
+            for m in masks:
+                bucket = table.get(band ^ m)
+                if bucket:
+                    candidates.update(bucket)
+        results = []
+        for stored in candidates:
+            dist = hamming(value, stored)
+            if dist <= threshold:
+                results.extend((image_id, dist) for image_id in self._ids[stored])
+        return results
+
@@ -0,0 +1,550 @@
+"""
+On-disk fingerprint store shared by every worker process.
+
+Four fixed-width column files live in one directory, one row per record:
+
+    phash.u64   uint64 little-endian perceptual hash
+    meta.u8     flags (bit 0 = live), variant code
+    ids.bin     image id, UTF-8, NUL-padded to MAX_ID_BYTES
+    idkey.u64   64-bit FNV-1a hash of the image id
+
+Appends go to the end of each file under an flock and are fsync'd before
+returning; removals clear the live flag in place.  Readers memory-map the
+columns, so the hash column is directly the contiguous uint64 array the
+NumPy engine scans.  Other processes pick up new rows the next time they
+query.
+
+Next to the columns sits a sorted run over rows [0, covered), rebuilt once
+enough rows have been appended past it (directory `idx-<rows>/`, named by
+`index.cur`, swapped in with an atomic rename):
+
+    keys.npy / key_rows.npy     id hash ➜ row, sorted by hash
+    bandI.npy / bandI_off.npy   multi-index hashing table per band of the
+                                phash: rows grouped by band value + offsets
+
+An id lookup bisects `keys` and compares the few `idkey` values appended
+since; a radius query probes the band tables (as `index.MultiIndexHash`
+does in memory) and scans only the tail.  The run is memory-mapped too, so
+opening a store of any size is a handful of mmap() calls.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import fcntl
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from .vector import popcount64, radius_pairs
+
+MAX_ID_BYTES = 128
+LIVE = 1
+
+META = np.dtype([("flags", "u1"), ("variant", "u1")])
+IDS = np.dtype(f"S{MAX_ID_BYTES}")
+HASHES = np.dtype("<u8")
+
+_COLUMNS = (("phash.u64", HASHES), ("meta.u8", META), ("ids.bin", IDS), ("idkey.u64", HASHES))
+
+# Band widths of the multi-index tables.  Each band's buckets should hold a
+# handful of rows, so large runs switch to fewer, wider bands.
+SMALL_BANDS = (16, 16, 16, 16)
+LARGE_BANDS = (21, 21, 22)
+LARGE_RUN_ROWS = 1 << 21
+
+# Rows appended past the sorted run before it is rebuilt: 1/16 of the run,
+# at least COMPACT_MIN_ROWS and at most COMPACT_MAX_ROWS (the tail is
+# scanned by every query, a rebuild at 9M rows takes about a second)
+COMPACT_MIN_ROWS = 16_384
+COMPACT_MAX_ROWS = 65_536
+COMPACT_FRACTION = 16
+
+# Few keys are compared against the tail directly, more are bisected
+_DIRECT_KEYS = 16
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_HASH_BLOCK = 65_536        # id rows hashed per step (keeps the block in cache)
+
+
+def _map(path: Path, dtype: np.dtype, rows: int) -> np.ndarray:
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=(rows,))
+
+
+def key_hashes(ids: np.ndarray) -> np.ndarray:
+    """64-bit FNV-1a of each NUL-padded id (the padding is not hashed)."""
+    out = np.empty(len(ids), dtype=np.uint64)
+    for start in range(0, len(ids), _HASH_BLOCK):
+        block = np.ascontiguousarray(ids[start:start + _HASH_BLOCK], dtype=IDS)
+        b = block.view(np.uint8).reshape(len(block), MAX_ID_BYTES)
+        h = np.full(len(block), _FNV_OFFSET, dtype=np.uint64)
+        used = np.flatnonzero(b.any(axis=0))
+        for i in range(int(used[-1]) + 1 if len(used) else 0):
+            col = b[:, i]
+            h = np.where(col != 0, (h ^ col) * _FNV_PRIME, h)
+        out[start:start + len(block)] = h
+    return out
+
+
+def band_widths(rows: int) -> Tuple[int, ...]:
+    return LARGE_BANDS if rows >= LARGE_RUN_ROWS else SMALL_BANDS
+
+
+@lru_cache(maxsize=None)
+def _band_masks(bits: int, radius: int) -> np.ndarray:
+    """Every `bits`-wide mask with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for flipped in combinations(range(bits), r):
+            masks.append(sum(1 << b for b in flipped))
+    return np.array(masks, dtype=np.int64)
+
+
+def _variant_table(variant: int | Sequence[int]) -> np.ndarray:
+    """Lookup table over the uint8 variant codes: True for those in `variant`."""
+    table = np.zeros(256, dtype=bool)
+    table[np.atleast_1d(np.asarray(variant, dtype=np.intp))] = True
+    return table
+
+
+def _bands(hashes: np.ndarray, widths: Sequence[int]) -> List[np.ndarray]:
+    out, shift = [], 0
+    for bits in widths:
+        out.append(((hashes >> np.uint64(shift)) & np.uint64((1 << bits) - 1)).astype(np.int64))
+        shift += bits
+    return out
+
+
+def _gather(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of the index ranges [starts[k], ends[k])."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(total, dtype=np.int64)
+
+
+class _SortedRun:
+    """Id table and band tables over rows [0, rows), memory-mapped read-only."""
+
+    def __init__(self, path: Path):
+        load = lambda name: np.asarray(np.load(path / f"{name}.npy", mmap_mode="r"))
+        self.path = path
+        self.keys = load("keys")
+        self.key_rows = load("key_rows")
+        self.bands = []
+        while (path / f"band{len(self.bands)}.npy").exists():
+            i = len(self.bands)
+            self.bands.append((load(f"band{i}"), load(f"band{i}_off")))
+        # A band of b bits has 2**b + 1 offsets
+        self.widths = tuple((len(off) - 1).bit_length() - 1 for _, off in self.bands)
+
+    @property
+    def rows(self) -> int:
+        return len(self.keys)
+
+    def rows_for(self, key_hash: np.uint64) -> np.ndarray:
+        lo = np.searchsorted(self.keys, key_hash, "left")
+        hi = np.searchsorted(self.keys, key_hash, "right")
+        return np.asarray(self.key_rows[lo:hi], dtype=np.int64)
+
+    def candidates(self, value: int, radius: int) -> np.ndarray:
+        """
+        A superset of the rows within `radius` of `value`.  With m bands and
+        radius = m * q + a, a row that is more than q bits off in each of the
+        first a + 1 bands and more than q - 1 in the others is at least
+        radius + 1 away, so those bands are probed at q and the rest at q - 1.
+        """
+        out = []
+        q, a = divmod(radius, len(self.widths))
+        query = _bands(np.array([value], dtype=np.uint64), self.widths)
+        for i, ((rows, offsets), bits, band) in enumerate(zip(self.bands, self.widths, query)):
+            band_radius = q if i <= a else q - 1
+            if band_radius < 0:
+                continue
+            probe = band[0] ^ _band_masks(bits, band_radius)
+            out.append(rows[_gather(offsets[probe].astype(np.int64),
+                                    offsets[probe + 1].astype(np.int64))])
+        return np.concatenate(out)
+
+
+def _merge(run: Optional[_SortedRun], hashes: np.ndarray,
+           keys: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Arrays of a run over every row of `hashes` / `keys` (the full columns):
+    `run` plus the rows past it, or the band tables built afresh when the
+    run's band widths no longer suit its size.
+    """
+    start, total = run.rows if run is not None else 0, len(hashes)
+    rows = np.arange(start, total, dtype=np.uint32)
+    tail = np.asarray(keys[start:])
+    order = np.argsort(tail, kind="stable")
+    if run is None:
+        out = {"keys": tail[order], "key_rows": rows[order]}
+    else:
+        pos = np.searchsorted(run.keys, tail[order], side="right")
+        out = {"keys": np.insert(run.keys, pos, tail[order]),
+               "key_rows": np.insert(run.key_rows, pos, rows[order])}
+    widths = band_widths(total)
+    if run is None or run.widths != widths:
+        start, run = 0, None
+        rows = np.arange(total, dtype=np.uint32)
+    for i, (bits, band) in enumerate(zip(widths, _bands(np.asarray(hashes[start:]), widths))):
+        order = np.argsort(band, kind="stable")
+        counts = np.bincount(band, minlength=1 << bits)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.uint32)
+        if run is None:
+            out[f"band{i}"], out[f"band{i}_off"] = rows[order], offsets
+        else:
+            old_rows, old_off = run.bands[i]
+            # New rows go to the end of their band value's bucket
+            pos = np.asarray(old_off[band[order] + 1], dtype=np.int64)
+            out[f"band{i}"] = np.insert(old_rows, pos, rows[order])
+            out[f"band{i}_off"] = old_off + offsets
+    return out
+
+
+class FingerprintStore:
+    """Append-only, memory-mapped {image_id: phash} table."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._paths = [self.root / name for name, _ in _COLUMNS]
+        for path in self._paths:
+            path.touch(exist_ok=True)
+        self._lock_fd = os.open(self.root / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        # flock does not exclude threads sharing the fd, and must not nest
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._rows = -1
+        self._run: Optional[_SortedRun] = None
+        self._run_stamp: Optional[Tuple[int, int]] = None
+        with self._locked():
+            self._backfill_keys()
+            self._repair()
+            self.refresh()
+            # A store written before the sorted run existed is indexed once, here
+            if self._tail_due():
+                self._compact()
+
+    # ── locking / mapping ────────────────────────────────────────────────
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if not self._depth:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _disk_rows(self) -> int:
+        return min(p.stat().st_size // dt.itemsize for p, (_, dt) in zip(self._paths, _COLUMNS))
+
+    def _backfill_keys(self) -> None:
+        """Add the id-hash column to a store written before it existed."""
+        rows = min(p.stat().st_size // dt.itemsize
+                   for p, (_, dt) in zip(self._paths[:3], _COLUMNS[:3]))
+        path = self._paths[3]
+        have = path.stat().st_size // HASHES.itemsize
+        if have >= rows:
+            return
+        ids = _map(self._paths[2], IDS, rows)
+        with path.open("r+b") as f:
+            f.truncate(have * HASHES.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(key_hashes(ids[have:rows]).astype(HASHES).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _repair(self) -> None:
+        """Drop a torn tail left by a crash between column writes."""
+        rows = self._disk_rows()
+        for path, (_, dt) in zip(self._paths, _COLUMNS):
+            if path.stat().st_size != rows * dt.itemsize:
+                os.truncate(path, rows * dt.itemsize)
+
+    def refresh(self) -> bool:
+        """Remap if another process (or we) appended rows or rebuilt the run; True if it grew."""
+        self._refresh_run()
+        rows = self._disk_rows()
+        if rows == self._rows:
+            return False
+        self._maps = [_map(p, dt, rows) for p, (_, dt) in zip(self._paths, _COLUMNS)]
+        # Plain views of the maps: indexing a np.memmap costs tens of µs
+        self.hashes, self.meta, self.ids, self.idkeys = (np.asarray(m) for m in self._maps)
+        self._rows = rows
+        return True
+
+    def __len__(self) -> int:
+        """Live images (rows of the primary, variant 0, hash)."""
+        self.refresh()
+        return int(np.count_nonzero(self.live_mask()))
+
+    # ── sorted run ───────────────────────────────────────────────────────
+    @property
+    def covered(self) -> int:
+        """Rows indexed by the sorted run; later rows are scanned."""
+        return self._run.rows if self._run is not None else 0
+
+    def _refresh_run(self) -> None:
+        current = self.root / "index.cur"
+        try:
+            st = current.stat()
+        except FileNotFoundError:
+            return
+        stamp = (st.st_ino, st.st_mtime_ns)
+        if stamp == self._run_stamp:
+            return
+        # Under the lock so the writer cannot retire the generation mid-load
+        with self._locked():
+            self._run = _SortedRun(self.root / current.read_text().strip())
+            self._run_stamp = stamp
+
+    def _tail_due(self) -> bool:
+        covered = self.covered
+        due = min(max(COMPACT_MIN_ROWS, covered // COMPACT_FRACTION), COMPACT_MAX_ROWS)
+        return self._rows - covered >= due
+
+    def _compact(self) -> None:
+        """Fold the tail into a new generation of the run (caller holds the lock)."""
+        arrays = _merge(self._run, self.hashes, self.idkeys)
+        name = f"idx-{self._rows:012d}"
+        tmp = self.root / f"{name}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(self.root / name, ignore_errors=True)     # left by a crash
+        tmp.mkdir()
+        for key, array in arrays.items():
+            with (tmp / f"{key}.npy").open("wb") as f:
+                np.save(f, array)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.root / name)
+        current = self.root / "index.cur.tmp"
+        with current.open("w") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current, self.root / "index.cur")
+        # Processes still mapping an older generation keep its (unlinked) pages
+        for old in self.root.glob("idx-*"):
+            if old.name != name:
+                shutil.rmtree(old, ignore_errors=True)
+        self._refresh_run()
+
+    # ── id lookup ────────────────────────────────────────────────────────
+    def _rows_for_many(self, keys: Sequence[bytes]) -> Dict[bytes, List[int]]:
+        """Rows ever written for each key, oldest first."""
+        keys = list(dict.fromkeys(keys))
+        hashes = key_hashes(np.array(keys, dtype=IDS))
+        start = self.covered
+        tail = np.asarray(self.idkeys[start:])
+        bisect = len(keys) > _DIRECT_KEYS
+        if bisect:
+            order = np.argsort(tail, kind="stable")
+            lo = np.searchsorted(tail[order], hashes, "left")
+            hi = np.searchsorted(tail[order], hashes, "right")
+            seen = hi > lo
+        else:
+            direct = [np.flatnonzero(tail == h) for h in hashes]
+            seen = np.array([len(rows) > 0 for rows in direct], dtype=bool)
+        if self._run is not None:
+            seen |= (np.searchsorted(self._run.keys, hashes, "right")
+                     > np.searchsorted(self._run.keys, hashes, "left"))
+        out = {}
+        for k, (key, h) in enumerate(zip(keys, hashes)):
+            if not seen[k]:
+                out[key] = []       # a new id: the common case of a bulk import
+                continue
+            rows = (order[lo[k]:hi[k]] if bisect else direct[k]) + start
+            if self._run is not None:
+                rows = np.concatenate([self._run.rows_for(h), rows])
+            # Different ids can share a 64-bit hash
+            out[key] = [int(r) for r in np.sort(rows) if self.ids[r] == key]
+        return out
+
+    def _rows_for(self, key: bytes) -> List[int]:
+        return self._rows_for_many([key])[key]
+
+    @staticmethod
+    def _key(image_id: str) -> bytes:
+        key = image_id.encode("utf-8")
+        if len(key) > MAX_ID_BYTES:
+            raise ValueError(f"image_id longer than {MAX_ID_BYTES} bytes: {image_id!r}")
+        if not key or b"\0" in key:
+            raise ValueError(f"Invalid image_id: {image_id!r}")
+        return key
+
+    def _kill(self, rows: Sequence[int], variant: int | None) -> None:
+        flags = self.meta["flags"]
+        for row in rows:
+            if flags[row] & LIVE and (variant is None or self.meta["variant"][row] == variant):
+                flags[row] &= ~np.uint8(LIVE)
+        if rows:
+            self._maps[1].flush()
+
+    # ── write ────────────────────────────────────────────────────────────
+    def put(self, image_id: str, value: int, variant: int = 0) -> None:
+        """Append (image_id, value), replacing any live row with the same id/variant."""
+        self.put_many([(image_id, value, variant)])
+
+    def put_many(self, records: Sequence[Tuple[str, int, int]],
+                 replace_id: bool = False) -> None:
+        """
+        Durable batch append: one lock, one fsync per column.  With
+        `replace_id` every live row of each id is retired first, not just the
+        rows of the variants being written.
+        """
+        keys = [self._key(image_id) for image_id, _, _ in records]
+        hashes = np.array([value for _, value, _ in records], dtype=HASHES)
+        meta = np.array([(LIVE, variant) for _, _, variant in records], dtype=META)
+        ids = np.array(keys, dtype=IDS)
+        with self._locked():
+            self._repair()
+            self.refresh()
+            existing = self._rows_for_many(keys)
+            if replace_id:
+                for rows in existing.values():
+                    self._kill(rows, None)
+            else:
+                for key, (_, _, variant) in zip(keys, records):
+                    self._kill(existing[key], variant)
+            for path, column in zip(self._paths, (hashes, meta, ids, key_hashes(ids))):
+                with path.open("ab") as f:
+                    f.write(column.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.refresh()
+            if self._tail_due():
+                self._compact()
+
+    def delete(self, image_id: str) -> None:
+        key = self._key(image_id)
+        with self._locked():
+            self.refresh()
+            self._kill(self._rows_for(key), None)
+
+    # ── read ─────────────────────────────────────────────────────────────
+    def live_mask(self, variant: int | Sequence[int] | None = 0, start: int = 0) -> np.ndarray:
+        """Live rows of `variant` among rows [start, len)."""
+        meta = self.meta[start:]
+        mask = (meta["flags"] & LIVE).astype(bool)
+        if variant is not None:
+            mask &= _variant_table(variant)[meta["variant"]]
+        return mask
+
+    def get(self, image_id: str, variant: int = 0) -> int | None:
+        self.refresh()
+        for row in reversed(self._rows_for(self._key(image_id))):
+            if self.meta["flags"][row] & LIVE and self.meta["variant"][row] == variant:
+                return int(self.hashes[row])
+        return None
+
+    def variants(self, image_id: str) -> Dict[int, int]:
+        """{variant: value} over the live rows of `image_id`."""
+        return self.variants_many([image_id])[image_id]
+
+    def variants_many(self, image_ids: Sequence[str]) -> Dict[str, Dict[int, int]]:
+        """`variants` for many ids with one batched id lookup."""
+        self.refresh()
+        found = self._rows_for_many([self._key(image_id) for image_id in image_ids])
+        flags, kinds = self.meta["flags"], self.meta["variant"]
+        out: Dict[str, Dict[int, int]] = {}
+        for image_id in image_ids:
+            out[image_id] = {}
+            for row in found[self._key(image_id)]:
+                if flags[row] & LIVE:
+                    out[image_id][int(kinds[row])] = int(self.hashes[row])
+        return out
+
+    def items(self, variant: int = 0) -> List[Tuple[str, int]]:
+        self.refresh()
+        rows = np.flatnonzero(self.live_mask(variant))
+        return [(self.ids[r].decode("utf-8"), int(self.hashes[r])) for r in rows]
+
+    def radius_pairs(self, values: Sequence[int], threshold: int,
+                     variant: int | Sequence[int] | None = 0,
+                     indexed: bool = True) -> List[List[Tuple[int, int]]]:
+        """
+        (row, distance) of every live row of `variant` (one code, several,
+        or None for all) within `threshold` of each value.  `indexed` probes
+        the band tables for the rows they cover and scans only the tail;
+        otherwise the whole hash column is scanned.
+        """
+        self.refresh()
+        queries = np.asarray(values, dtype=np.uint64)
+        results: List[List[Tuple[int, int]]] = [[] for _ in range(len(queries))]
+        start = self.covered if indexed else 0
+        if start:
+            flags, kinds = self.meta["flags"], self.meta["variant"]
+            for q, value in enumerate(queries):
+                rows = self._run.candidates(int(value), threshold)
+                dist = popcount64(self.hashes[rows] ^ value)
+                keep = dist <= threshold
+                rows, dist = rows[keep], dist[keep]
+                keep = (flags[rows] & LIVE).astype(bool)
+                if variant is not None:
+                    keep &= _variant_table(variant)[kinds[rows]]
+                # A row can share more than one band with the query
+                rows, first = np.unique(rows[keep], return_index=True)
+                results[q].extend(zip(rows.tolist(), dist[keep][first].tolist()))
+        if start < self._rows:
+            live = self.live_mask(variant, start)
+            for q, r, dist in radius_pairs(queries, self.hashes[start:], threshold, live):
+                results[q].append((start + r, dist))
+        return results
+
+    def close(self) -> None:
+        os.close(self._lock_fd)
+
+
+class StoreIndex:
+    """
+    detection-index adapter over a FingerprintStore.  "mih" queries probe the
+    store's band tables; "numpy" runs the XOR + popcount pass straight over
+    the whole mapped hash column.
+    """
+
+    KINDS = ("mih", "numpy")
+
+    def __init__(self, store: FingerprintStore, variant: int | None = 0, kind: str = "mih"):
+        """`variant=None` searches the rows of every variant."""
+        if kind not in self.KINDS:
+            raise ValueError(f"A store is searched with one of {self.KINDS}, not {kind!r}")
+        self.store = store
+        self.variant = variant
+        self.kind = kind
+
+    def __len__(self) -> int:
+        self.store.refresh()
+        return int(np.count_nonzero(self.store.live_mask(self.variant)))
+
+    def add(self, image_id: str, value: int) -> None:
+        self.store.put(image_id, value, self.variant)
+
+    def remove(self, image_id: str, value: int) -> None:
+        self.store.delete(image_id)
+
+    def query(self, value: int, threshold: int) -> List[Tuple[str, int]]:
+        return self.query_many([value], threshold)[0]
+
+    def query_many(self, values: Sequence[int], threshold: int,
+                   variants: Sequence[int] | None = None) -> List[List[Tuple[str, int]]]:
+        """`variants` narrows this call to rows of those variant codes."""
+        ids = self.store.ids
+        variant = self.variant if variants is None else variants
+        pairs = self.store.radius_pairs(values, threshold, variant, self.kind == "mih")
+        return [[(ids[r].decode("utf-8"), dist) for r, dist in hits] for hits in pairs]
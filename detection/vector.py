@@ -0,0 +1,115 @@
+"""
+NumPy matching engine: hashes live in one contiguous uint64 array next to a
+parallel image-id array, and a query is a single XOR + popcount pass over
+the whole corpus (or a (queries × corpus) matrix for batches).
+"""
+
+from __future__ import annotations
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+# Popcount: NumPy ≥ 2.0 has a ufunc, older versions fall back to a byte table
+_bitwise_count = getattr(np, "bitwise_count", None)
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# Upper bound on the (queries × corpus) distance matrix built in one step
+_MAX_BLOCK = 1 << 24
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    """Bit count of every element of a uint64 array, as uint8."""
+    if _bitwise_count is not None:
+        return _bitwise_count(x)
+    x = np.ascontiguousarray(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(*x.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def radius_pairs(queries: np.ndarray, hashes: np.ndarray, threshold: int,
+                 mask: np.ndarray | None = None) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yield (query_row, corpus_row, distance) for every pair within `threshold`,
+    building the distance matrix a block of queries at a time.
+    """
+    if not len(hashes) or not len(queries):
+        return
+    step = max(1, _MAX_BLOCK // len(hashes))
+    for start in range(0, len(queries), step):
+        block = queries[start:start + step]
+        dist = popcount64(block[:, None] ^ hashes[None, :])
+        hit = dist <= threshold
+        if mask is not None:
+            hit &= mask[None, :]
+        for q, r in zip(*np.nonzero(hit)):
+            yield start + int(q), int(r), int(dist[q, r])
+
+
+class PackedHashIndex:
+    """Vectorised brute force; same add/remove/query interface as detection.index."""
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._hashes = np.zeros(capacity, dtype=np.uint64)
+        self._ids = np.empty(capacity, dtype=object)
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def hashes(self) -> np.ndarray:
+        return self._hashes[:self._n]
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._n]
+
+    def _grow(self, need: int) -> None:
+        cap = len(self._hashes)
+        if need <= cap:
+            return
+        cap = max(need, cap * 2)
+        hashes = np.zeros(cap, dtype=np.uint64)
+        hashes[:self._n] = self._hashes[:self._n]
+        ids = np.empty(cap, dtype=object)
+        ids[:self._n] = self._ids[:self._n]
+        self._hashes, self._ids = hashes, ids
+
+    def add(self, image_id: str, value: int) -> None:
+        self._grow(self._n + 1)
+        self._hashes[self._n] = value
+        self._ids[self._n] = image_id
+        self._n += 1
+
+    def extend(self, hashes: np.ndarray, ids: Sequence[str]) -> None:
+        """Bulk append, e.g. when loading a corpus."""
+        k = len(hashes)
+        self._grow(self._n + k)
+        self._hashes[self._n:self._n + k] = hashes
+        self._ids[self._n:self._n + k] = ids
+        self._n += k
+
+    def remove(self, image_id: str, value: int) -> None:
+        rows = np.flatnonzero(self.hashes == np.uint64(value))
+        for row in rows[::-1]:
+            if self._ids[row] == image_id:
+                # swap-remove keeps the arrays dense
+                last = self._n - 1
+                self._hashes[row] = self._hashes[last]
+                self._ids[row] = self._ids[last]
+                self._ids[last] = None
+                self._n = last
+                return
+
+    def query(self, value: int, threshold: int) -> List[Tuple[str, int]]:
+        dist = popcount64(self.hashes ^ np.uint64(value))
+        rows = np.flatnonzero(dist <= threshold)
+        return [(self._ids[r], int(dist[r])) for r in rows]
+
+    def query_many(self, values: Sequence[int],
+                   threshold: int) -> List[List[Tuple[str, int]]]:
+        """Score every query against the corpus as one distance matrix per block."""
+        queries = np.asarray(values, dtype=np.uint64)
+        results: List[List[Tuple[str, int]]] = [[] for _ in range(len(queries))]
+        for q, r, dist in radius_pairs(queries, self.hashes, threshold):
+            results[q].append((self._ids[r], dist))
+        return results
@@ -1,39 +1,107 @@
+import os
 import numpy as np
 import cv2
 from pathlib import Path
-from mtcnn import MTCNN
-import tensorflow as tf
+
+from model_registry import models
 
 MODEL_PATH = Path(__file__).parent / "20180408-102900.pb"
+ONNX_MODEL_PATH = Path(__file__).parent / "20180408-102900.onnx"   # see export_onnx.py
+
+# "tf" (frozen graph, default) or "onnx" (same weights through onnxruntime)
+FACENET_BACKEND = os.environ.get("MYMARK_FACENET_BACKEND", "tf")
+
+
+def _load_facenet_tf():
+    """Frozen FaceNet graph ➜ embed(batch NHWC float32) -> (n, 128)."""
+    import tensorflow as tf
+    tf.compat.v1.disable_eager_execution()
+    graph = tf.Graph()
+    with graph.as_default():
+        graph_def = tf.compat.v1.GraphDef()
+        graph_def.ParseFromString(MODEL_PATH.read_bytes())
+        tf.import_graph_def(graph_def, name="")
+    sess = tf.compat.v1.Session(graph=graph)
+    images = graph.get_tensor_by_name("input:0")
+    embeddings = graph.get_tensor_by_name("embeddings:0")
+    phase_train = graph.get_tensor_by_name("phase_train:0")
+
+    def embed(batch):
+        return sess.run(embeddings, feed_dict={images: batch, phase_train: False})
+    return embed
+
+
+def _load_facenet_onnx():
+    """ONNX export of the same graph (phase_train folded to False) ➜ embed(batch)."""
+    import onnxruntime as ort
+    if not ONNX_MODEL_PATH.exists():
+        raise FileNotFoundError(
+            f"FaceNet ONNX model not found at {ONNX_MODEL_PATH}; run python -m face_auth.export_onnx"
+        )
+    sess = ort.InferenceSession(str(ONNX_MODEL_PATH), providers=["CPUExecutionProvider"])
+    input_name = sess.get_inputs()[0].name
 
-tf.compat.v1.disable_eager_execution()
-graph = tf.Graph()
-with graph.as_default():
-    graph_def = tf.compat.v1.GraphDef()
-    graph_def.ParseFromString(MODEL_PATH.read_bytes())
-    tf.import_graph_def(graph_def, name="")
-sess = tf.compat.v1.Session(graph=graph)
+    def embed(batch):
+        return sess.run(None, {input_name: np.asarray(batch, dtype=np.float32)})[0]
+    return embed
 
-images_placeholder = graph.get_tensor_by_name("input:0")
-embeddings = graph.get_tensor_by_name("embeddings:0")
-phase_train = graph.get_tensor_by_name("phase_train:0")
 
-detector = MTCNN()
+def _load_mtcnn():
+    from mtcnn import MTCNN
+    return MTCNN()
+
+
+FACENET_LOADERS = {"tf": _load_facenet_tf, "onnx": _load_facenet_onnx}
+if FACENET_BACKEND not in FACENET_LOADERS:
+    raise ValueError(f"MYMARK_FACENET_BACKEND must be one of {sorted(FACENET_LOADERS)}")
+
+models.register("facenet", FACENET_LOADERS[FACENET_BACKEND])
+models.register("mtcnn", _load_mtcnn)
+
 
 def _prewhiten(img):
     mean, std = img.mean(), img.std()
     std_adj = np.maximum(std, 1.0/np.sqrt(img.size))
     return (img - mean) / std_adj
 
+def _face_crops(rgb, all_faces):
+    """Prewhitened 160×160 crops of the detected faces, in MTCNN order."""
+    faces = models.get("mtcnn").detect_faces(rgb)
+    crops = []
+    for face in faces if all_faces else faces[:1]:
+        x, y, w, h = face["box"]
+        x, y = max(x, 0), max(y, 0)     # MTCNN boxes can start off‑frame
+        crop = rgb[y:y+h, x:x+w]
+        if crop.size:
+            crops.append(_prewhiten(cv2.resize(crop, (160, 160))))
+    return crops
+
+def face_embeddings(bgr_imgs, all_faces=False, batch_size=64):
+    """
+    Embed faces across a list of BGR images with one `sess.run` per
+    `batch_size` crops.  Returns, per image, a (128,) embedding or None
+    (`all_faces=False`, first face only) or an (n_faces, 128) array.
+    """
+    crops, owners = [], []
+    for i, bgr_img in enumerate(bgr_imgs):
+        for crop in _face_crops(cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB), all_faces):
+            crops.append(crop)
+            owners.append(i)
+    embeds = np.zeros((0, 128), dtype=np.float32)
+    if crops:
+        embed = models.get("facenet")
+        embeds = np.concatenate([
+            embed(np.stack(crops[s:s + batch_size]).astype(np.float32))
+            for s in range(0, len(crops), batch_size)
+        ])
+    owners = np.asarray(owners, dtype=np.intp)
+    if all_faces:
+        return [embeds[owners == i] for i in range(len(bgr_imgs))]
+    out = [None] * len(bgr_imgs)
+    for row, i in enumerate(owners):
+        out[i] = embeds[row]
+    return out
+
 def face_embedding(bgr_img) -> np.ndarray | None:
     """Return 128-D embedding or None if no face found."""
-    rgb = cv2.cvtColor(bgr_img, cv2.COLOR_BGR2RGB)
-    faces = detector.detect_faces(rgb)
-    if not faces:
-        return None
-    x, y, w, h = faces[0]["box"]
-    face = rgb[y:y+h, x:x+w]
-    face = cv2.resize(face, (160, 160))
-    face = _prewhiten(face)
-    feed_dict = {images_placeholder: [face], phase_train: False}
-    return sess.run(embeddings, feed_dict=feed_dict)[0]  # shape (128,)
+    return face_embeddings([bgr_img])[0]
@@ -0,0 +1,47 @@
+"""
+Export the frozen FaceNet graph to ONNX for MYMARK_FACENET_BACKEND=onnx.
+
+    python -m face_auth.export_onnx [--opset 13] [--output face_auth/20180408-102900.onnx]
+
+`phase_train` is folded to a constant False (inference batch‑norm) so the
+exported model has one input, `input` (N×160×160×3 float32, prewhitened,
+dynamic batch), and one output, `embeddings` (N×128).  Needs tensorflow and
+tf2onnx (`pip install tf2onnx`); neither is needed at serving time.
+"""
+
+import argparse
+
+from face_auth import MODEL_PATH, ONNX_MODEL_PATH
+
+
+def export(output=ONNX_MODEL_PATH, opset=13):
+    import tensorflow as tf
+    import tf2onnx
+
+    graph_def = tf.compat.v1.GraphDef()
+    graph_def.ParseFromString(MODEL_PATH.read_bytes())
+    graph = tf.Graph()
+    with graph.as_default():
+        phase_train = tf.constant(False, name="phase_train_const")
+        tf.import_graph_def(graph_def, input_map={"phase_train:0": phase_train}, name="")
+    folded = graph.as_graph_def()
+    tf2onnx.convert.from_graph_def(
+        folded,
+        input_names=["input:0"],
+        output_names=["embeddings:0"],
+        opset=opset,
+        output_path=str(output),
+    )
+    print(f"Wrote {output}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--output", default=str(ONNX_MODEL_PATH))
+    ap.add_argument("--opset", type=int, default=13)
+    args = ap.parse_args()
+    export(args.output, args.opset)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import sqlite3
 import json
 import datetime
 import hashlib
+import shutil
 
 def generate_dummy_user():
     # Create dummy user data.
@@ -24,6 +25,7 @@ def init_users_db():
     db_path = os.path.join(os.getcwd(), "data", "users_db", "users.db")
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL;")  # persistent: readers never block the writer
     c = conn.cursor()
     c.execute("DROP TABLE IF EXISTS users;")
     c.execute("""
@@ -48,10 +50,15 @@ def init_social_db():
     db_path = os.path.join(os.getcwd(), "data", "social_db", "social.db")
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL;")
     c = conn.cursor()
     c.execute("DROP TABLE IF EXISTS platforms;")
     c.execute("DROP TABLE IF EXISTS accounts;")
     c.execute("DROP TABLE IF EXISTS posts;")
+    # Scan results and the high-water mark refer to the old post ids
+    c.execute("DROP TABLE IF EXISTS matches;")
+    c.execute("DROP TABLE IF EXISTS scan_state;")
+    shutil.rmtree(os.path.join(os.path.dirname(db_path), "post_faces"), ignore_errors=True)
     c.execute("""
         CREATE TABLE platforms (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,6 +86,11 @@ def init_social_db():
             FOREIGN KEY (account_id) REFERENCES accounts(id)
         );
     """)
+    # Lookups by account, scans in time order, and exact perceptual-hash hits
+    c.execute("CREATE INDEX idx_accounts_platform ON accounts(platform_id);")
+    c.execute("CREATE INDEX idx_posts_account_ts ON posts(account_id, ts);")
+    c.execute("CREATE INDEX idx_posts_ts ON posts(ts);")
+    c.execute("CREATE INDEX idx_posts_phash64 ON posts(phash64);")
     platform, account, post = generate_dummy_social_data()
     c.execute("INSERT INTO platforms (name) VALUES (?);", platform)
     platform_id = c.lastrowid
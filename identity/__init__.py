@@ -0,0 +1,17 @@
+"""
+Identity verification helpers for MyMark registration and login.
+"""
+
+from .context import ImageContext, as_context
+from .embedding_cache import EmbeddingCache, UserEmbeddings
+from .face_index import FaceIndex
+from .id_cascade import CascadeStats, CascadeTrace
+from .keywords import KeywordMatcher
+from .liveness import LivenessChecker, LivenessResult
+from .liveness_stream import LivenessSession, LivenessSessions
+from .mrz import MRZ, check_digit, read_mrz
+from .validation import (
+    LIVENESS_CHECKER, compareFaces, extract_mrz, facenet_embedding, faces_match,
+    fuzzy_keyword_match, is_real_face, is_valid_id_document, parse_mrz, preprocess_for_ocr,
+    validateIDDocument,
+)
@@ -0,0 +1,103 @@
+"""
+Per‑request image analysis context.
+
+A registration touches the same two images in several validation stages;
+`ImageContext` decodes an image once and memoises the grayscale copy and
+the dlib results (face locations, landmarks, encodings) so every stage
+reuses them.
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+Box = Tuple[int, int, int, int]     # (top, right, bottom, left) as face_recognition
+
+
+def downscale(img: np.ndarray, max_side: int | None) -> Tuple[np.ndarray, float]:
+    """`img` shrunk (INTER_AREA) so its longer side is at most `max_side`, and the scale used."""
+    h, w = img.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return img, 1.0
+    scale = max_side / max(h, w)
+    return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA), scale
+
+
+class ImageContext:
+    """One decoded image plus lazily computed, cached face analysis."""
+
+    def __init__(self, rgb: np.ndarray, source: str | None = None):
+        self.rgb = rgb
+        self.source = source
+        self._bgr: np.ndarray | None = None
+        self._gray: np.ndarray | None = None
+        self._locations: Dict[Tuple[str, int], List[Box]] = {}
+        self._landmarks: List[dict] | None = None
+        self._encodings: List[np.ndarray] | None = None
+
+    @classmethod
+    def from_path(cls, path: str | Path) -> "ImageContext":
+        return cls(face_recognition.load_image_file(str(path)), str(path))
+
+    @classmethod
+    def from_bgr(cls, bgr: np.ndarray, source: str | None = None,
+                 max_side: int | None = None) -> "ImageContext":
+        """`max_side` downscales large frames first (dlib's HOG cost grows with pixels)."""
+        bgr, _ = downscale(bgr, max_side)
+        ctx = cls(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), source)
+        ctx._bgr = bgr
+        return ctx
+
+    @property
+    def bgr(self) -> np.ndarray:
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
+        return self._bgr
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def face_locations(self, model: str = "hog", upsample: int = 1,
+                       max_side: int | None = None) -> List[Box]:
+        """
+        `max_side` runs the detector on a downscaled copy; the boxes are
+        scaled back to this image, so later calls (and encodings) reuse them.
+        """
+        key = (model, upsample)
+        if key not in self._locations:
+            rgb, scale = downscale(self.rgb, max_side)
+            boxes = face_recognition.face_locations(
+                rgb, number_of_times_to_upsample=upsample, model=model
+            )
+            if scale != 1.0:
+                h, w = self.rgb.shape[:2]
+                boxes = [(round(t / scale), min(w, round(r / scale)),
+                          min(h, round(b / scale)), round(l / scale)) for t, r, b, l in boxes]
+            self._locations[key] = boxes
+        return self._locations[key]
+
+    def landmarks(self) -> List[dict]:
+        if self._landmarks is None:
+            self._landmarks = face_recognition.face_landmarks(
+                self.rgb, face_locations=self.face_locations()
+            )
+        return self._landmarks
+
+    def encodings(self) -> List[np.ndarray]:
+        if self._encodings is None:
+            self._encodings = face_recognition.face_encodings(
+                self.rgb, known_face_locations=self.face_locations()
+            )
+        return self._encodings
+
+
+def as_context(image: "ImageContext | str | Path") -> ImageContext:
+    """Accept a context or (for older callers) an image path."""
+    return image if isinstance(image, ImageContext) else ImageContext.from_path(image)
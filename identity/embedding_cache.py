@@ -0,0 +1,76 @@
+"""
+Read-through cache of decoded user embeddings for the login endpoints.
+
+Each entry holds a user's face embedding, already L2-normalised so a login
+is one dot product against a normalised probe, and the stored catchphrase
+embedding as-is (vocal login compares it with a raw dot product).
+Endpoints that write either column call `invalidate(username)`; the TTL
+bounds staleness from writers in other processes.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional, Tuple
+import threading
+import time
+
+import numpy as np
+
+
+class UserEmbeddings(NamedTuple):
+    face: Optional[np.ndarray]      # unit-norm float32
+    voice: Optional[np.ndarray]     # float32 as stored
+
+
+def _unit(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    if not blob:
+        return None
+    vec = np.frombuffer(blob, dtype=np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else None
+
+
+class EmbeddingCache:
+    """LRU of username ➜ UserEmbeddings with a per-entry TTL."""
+
+    def __init__(self, fetch: Callable[[str], Optional[Tuple[bytes | None, bytes | None]]],
+                 maxsize: int = 10_000, ttl: float = 300.0):
+        """`fetch(username)` ➜ (face blob, catchphrase blob), or None for an unknown user."""
+        self.fetch = fetch
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[UserEmbeddings, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, username: str) -> Optional[UserEmbeddings]:
+        """Cached embeddings, fetched on a miss; None for unknown users."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[1] >= time.monotonic():
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        row = self.fetch(username)
+        if row is None:
+            return None             # not cached: the user may register any moment
+        value = UserEmbeddings(_unit(row[0]),
+                               np.frombuffer(row[1], dtype=np.float32) if row[1] else None)
+        with self._lock:
+            self._entries[username] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
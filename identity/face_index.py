@@ -0,0 +1,189 @@
+"""
+1:N face de‑duplication index.
+
+Embeddings are L2‑normalised once on insert and kept as rows of one
+contiguous float32 matrix, so a batch of queries is a single
+(queries × users) matrix product followed by a top‑k partition.  For very
+large user bases `train()` adds an IVF coarse quantiser (spherical k‑means)
+and queries only scan the `nprobe` closest cells.
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import sqlite3
+import threading
+
+import numpy as np
+
+EMBEDDING_DIM = 128
+IVF_MIN_ROWS = 200_000      # `from_rows` trains an IVF layer above this size
+
+Hit = Tuple[str, float]     # (label, cosine similarity)
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k best scores in each row, best first."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+class FaceIndex:
+    """label ➜ normalised embedding, with batched top‑k cosine search."""
+
+    def __init__(self, dim: int = EMBEDDING_DIM, capacity: int = 1024, nprobe: int = 8):
+        self.dim = dim
+        self.nprobe = nprobe
+        self._vecs = np.zeros((capacity, dim), dtype=np.float32)
+        self._labels: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._cells: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._rows
+
+    # ── build ────────────────────────────────────────────────────────────
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, bytes]], dim: int = EMBEDDING_DIM) -> "FaceIndex":
+        """Build from (label, float32 embedding bytes) rows; blobs of the wrong size are skipped."""
+        labels, blobs = [], []
+        for label, blob in rows:
+            if blob and len(blob) == dim * 4:
+                labels.append(str(label))
+                blobs.append(blob)
+        index = cls(dim, capacity=max(1024, len(labels)))
+        if labels:
+            index.add_many(labels, np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(-1, dim))
+        if len(index) >= IVF_MIN_ROWS:
+            index.train()
+        return index
+
+    @classmethod
+    def from_sqlite(cls, db_path: str, dim: int = EMBEDDING_DIM) -> "FaceIndex":
+        """Index `users.face_embedding` of the users DB, keyed by username."""
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT username, face_embedding FROM users WHERE face_embedding IS NOT NULL"
+            ).fetchall()
+        finally:
+            conn.close()
+        return cls.from_rows(rows, dim)
+
+    def _grow(self, need: int) -> None:
+        if need <= len(self._vecs):
+            return
+        cap = max(need, 2 * len(self._vecs))
+        vecs = np.zeros((cap, self.dim), dtype=np.float32)
+        vecs[:len(self._labels)] = self._vecs[:len(self._labels)]
+        self._vecs = vecs
+
+    def add(self, label: str, embedding: np.ndarray | bytes) -> None:
+        if isinstance(embedding, (bytes, bytearray, memoryview)):
+            embedding = np.frombuffer(embedding, dtype=np.float32)
+        self.add_many([label], np.asarray(embedding).reshape(1, -1))
+
+    def add_many(self, labels: Sequence[str], embeddings: np.ndarray) -> None:
+        """Insert or replace; a replaced label keeps its row (and IVF cell)."""
+        vecs = _normalise(embeddings)
+        with self._lock:
+            new = [i for i, label in enumerate(labels) if label not in self._rows]
+            self._grow(len(self._labels) + len(new))
+            for i, label in enumerate(labels):
+                row = self._rows.get(label)
+                if row is None:
+                    row = self._rows[label] = len(self._labels)
+                    self._labels.append(label)
+                    if self._centroids is not None:
+                        cell = int(np.argmax(self._centroids @ vecs[i]))
+                        self._cells[cell] = np.append(self._cells[cell], row)
+                self._vecs[row] = vecs[i]
+
+    def remove(self, label: str) -> None:
+        """Tombstone the row: zero vector, no label (it never scores as a match)."""
+        with self._lock:
+            row = self._rows.pop(label, None)
+            if row is not None:
+                self._vecs[row] = 0
+                self._labels[row] = None
+
+    # ── IVF ──────────────────────────────────────────────────────────────
+    def train(self, nlist: int | None = None, iters: int = 10, sample: int = 65_536,
+              seed: int = 0) -> None:
+        """Spherical k‑means over a sample, then assign every row to its nearest cell."""
+        with self._lock:
+            n = len(self._labels)
+            if n == 0:
+                return
+            nlist = nlist or max(1, int(np.sqrt(n)))
+            rng = np.random.default_rng(seed)
+            data = self._vecs[:n]
+            pts = data[rng.choice(n, size=min(n, sample), replace=False)]
+            centroids = pts[rng.choice(len(pts), size=min(nlist, len(pts)), replace=False)].copy()
+            for _ in range(iters):
+                assign = np.argmax(pts @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = pts[assign == c]
+                    if len(members):
+                        centroids[c] = members.sum(axis=0)
+                centroids = _normalise(centroids)
+            assign = np.concatenate([
+                np.argmax(data[s:s + 65_536] @ centroids.T, axis=1) for s in range(0, n, 65_536)
+            ])
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+            self._cells = [order[bounds[c]:bounds[c + 1]] for c in range(len(centroids))]
+            self._centroids = centroids
+
+    # ── search ───────────────────────────────────────────────────────────
+    def search(self, queries: np.ndarray, k: int = 5) -> List[List[Hit]]:
+        """Top‑k (label, cosine) per query row, best first."""
+        q = _normalise(queries)
+        with self._lock:
+            n = len(self._labels)
+            if n == 0:
+                return [[] for _ in range(len(q))]
+            vecs, labels = self._vecs[:n], self._labels     # rows < n never move
+            centroids, cells = self._centroids, list(self._cells)
+        if centroids is None:
+            scores = q @ vecs.T
+            top = _top_k(scores, k)
+            return [
+                [(labels[j], float(scores[i, j])) for j in top[i] if labels[j] is not None]
+                for i in range(len(q))
+            ]
+        results = []
+        probes = _top_k(q @ centroids.T, self.nprobe)
+        for i in range(len(q)):
+            rows = np.concatenate([cells[c] for c in probes[i]])
+            rows = rows[rows < n]
+            if not len(rows):
+                results.append([])
+                continue
+            scores = vecs[rows] @ q[i]
+            top = _top_k(scores[None, :], k)[0]
+            results.append([(labels[rows[j]], float(scores[j])) for j in top
+                            if labels[rows[j]] is not None])
+        return results
+
+    def find_duplicate(self, embedding: np.ndarray | bytes, threshold: float,
+                       exclude: str | None = None) -> Optional[Hit]:
+        """Best match at or above `threshold` other than `exclude`, or None."""
+        if isinstance(embedding, (bytes, bytearray, memoryview)):
+            embedding = np.frombuffer(embedding, dtype=np.float32)
+        for label, score in self.search(np.asarray(embedding).reshape(1, -1), k=2)[0]:
+            if label != exclude and score >= threshold:
+                return label, score
+        return None
@@ -0,0 +1,169 @@
+"""
+Staged, fast‑reject cascade in front of ID‑document OCR.
+
+Full‑page EasyOCR dominates ID validation, yet most bad uploads (selfies,
+blank or blurred frames) fail a far cheaper test.  The stages run in cost
+order and stop at the first reject:
+
+    face           dlib HOG face presence on a downscaled copy; the boxes are
+                   memoised on the caller's context for a later face match
+    text_regions   morphological text‑line detector (no model)
+    mrz            MRZ band located by morphology, its lines OCR'd with the
+                   MRZ character set and check digits verified (identity/mrz.py);
+                   a valid MRZ accepts without any further OCR
+    ocr            EasyOCR recognition of the other detected lines only
+                   (its CRAFT detector is skipped), plus the caller's text
+                   checks
+
+Each call fills a `CascadeTrace` (per‑stage seconds, rejecting stage) that
+callers feed into a `CascadeStats` to expose reject rates and latency.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from model_registry import models
+from .context import ImageContext, downscale
+from .mrz import read_mrz
+
+STAGES = ("face", "text_regions", "mrz", "ocr")
+
+ID_FACE_MAX_SIDE = 960      # face presence is checked on a copy no larger than this
+TEXT_MAX_SIDE = 1024        # text lines are detected on a copy no larger than this
+MIN_TEXT_REGIONS = 3        # fewer text‑like lines than this is not a document
+MAX_OCR_REGIONS = 64        # largest lines kept for recognition
+
+Region = Tuple[int, int, int, int]  # (x_min, x_max, y_min, y_max), EasyOCR's horizontal_list
+
+
+class CascadeTrace:
+    """Per‑call record: seconds spent in each stage run and the stage that rejected."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.rejected: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def decide(self, name: str, ok: bool) -> bool:
+        if not ok and self.rejected is None:
+            self.rejected = name
+        return ok
+
+    def as_dict(self) -> dict:
+        return {"timings": {k: round(v, 4) for k, v in self.timings.items()},
+                "rejected": self.rejected}
+
+
+class CascadeStats:
+    """Running per‑stage counters: runs, rejects, total seconds."""
+
+    def __init__(self):
+        self._counts = {name: {"runs": 0, "rejects": 0, "seconds": 0.0} for name in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, trace: CascadeTrace | dict | None) -> None:
+        """Add one call; accepts a trace or its `as_dict()` (as returned by job workers)."""
+        if trace is None:
+            return
+        if isinstance(trace, CascadeTrace):
+            trace = trace.as_dict()
+        with self._lock:
+            for name, seconds in trace["timings"].items():
+                counts = self._counts.setdefault(name, {"runs": 0, "rejects": 0, "seconds": 0.0})
+                counts["runs"] += 1
+                counts["seconds"] += seconds
+                counts["rejects"] += trace["rejected"] == name
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "runs": c["runs"],
+                    "rejects": c["rejects"],
+                    "reject_rate": round(c["rejects"] / c["runs"], 4) if c["runs"] else 0.0,
+                    "avg_ms": round(c["seconds"] / c["runs"] * 1e3, 2) if c["runs"] else 0.0,
+                }
+                for name, c in self._counts.items()
+            }
+
+
+def text_regions(gray: np.ndarray, max_side: int = TEXT_MAX_SIDE) -> List[Region]:
+    """
+    Text‑line boxes in full‑resolution coordinates, top to bottom: gradient
+    + Otsu picks up glyph edges, a wide closing kernel joins the glyphs of a
+    line, and components are kept if they are line‑shaped and dense.
+    """
+    small, scale = downscale(gray, max_side)
+    h, w = small.shape
+    grad = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    lines = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    regions = []
+    for contour in contours:
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if not (6 <= ch <= h // 8 and cw >= 2 * ch):
+            continue
+        if cv2.countNonZero(bw[y:y + ch, x:x + cw]) < 0.3 * cw * ch:
+            continue
+        pad = max(2, ch // 5)
+        regions.append((
+            int(max(0, x - pad) / scale), int(min(w, x + cw + pad) / scale),
+            int(max(0, y - pad) / scale), int(min(h, y + ch + pad) / scale),
+        ))
+    if len(regions) > MAX_OCR_REGIONS:
+        regions = sorted(regions, key=lambda r: (r[1] - r[0]) * (r[3] - r[2]))[-MAX_OCR_REGIONS:]
+    return sorted(regions, key=lambda r: (r[2], r[0]))
+
+
+def ocr_regions(gray: np.ndarray, regions: List[Region]) -> str:
+    """Recognise only `regions` (one text line each), top to bottom."""
+    if not regions:
+        return ""
+    return "\n".join(models.get("easyocr").recognize(gray, horizontal_list=regions,
+                                                      free_list=[], detail=0))
+
+
+def cascade_text(ctx: ImageContext, trace: CascadeTrace,
+                 reject_bad_mrz: bool = False) -> Optional[str]:
+    """
+    Run the face, text‑region and MRZ stages, then OCR the remaining lines.
+    Returns the document text (just the MRZ lines when they verify), or
+    None once a stage rejects (see `trace.rejected`).  `reject_bad_mrz`
+    rejects at the MRZ stage when an MRZ is read but fails its check digits.
+    The caller finishes the "ocr" stage with `trace.decide("ocr", ok)`.
+    """
+    with trace.stage("face"):
+        has_face = len(ctx.face_locations(max_side=ID_FACE_MAX_SIDE)) > 0
+    if not trace.decide("face", has_face):
+        return None
+    with trace.stage("text_regions"):
+        gray = ctx.gray
+        regions = text_regions(gray)
+    if not trace.decide("text_regions", len(regions) >= MIN_TEXT_REGIONS):
+        return None
+    with trace.stage("mrz"):
+        band, mrz = read_mrz(gray)
+    if mrz is not None and mrz.valid:
+        return mrz.raw
+    if mrz is not None and not trace.decide("mrz", not reject_bad_mrz):
+        return None
+    if band is not None:
+        # The band's lines were already read with the MRZ character set
+        regions = [r for r in regions if not band[2] <= (r[2] + r[3]) // 2 <= band[3]]
+    with trace.stage("ocr"):
+        text = ocr_regions(gray, regions)
+    return text + "\n" + mrz.raw if mrz is not None else text
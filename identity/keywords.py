@@ -0,0 +1,104 @@
+"""
+Keyword matching over OCR text for the ID‑document checks.
+
+The validators used to score `difflib.SequenceMatcher(word, token).ratio()`
+for every keyword against every OCR token, even after an exact keyword hit.
+`KeywordMatcher` is built once per keyword list and gives the same answers
+while skipping almost all of that work:
+
+  * exact hits are one pass of a compiled alternation, and fuzzy scoring
+    is skipped whenever there is one;
+  * fuzzy candidates come from a character index over all keywords
+    (character ➜ its count in every keyword).  One pass over a token's
+    characters gives each keyword's shared‑character count, which bounds
+    the ratio from above (`quick_ratio`): ratio = 2M / (|a| + |b|) and M
+    can be no larger.  A SequenceMatcher runs only for the keywords whose
+    bound still exceeds the threshold;
+  * per‑token results are memoised, so the "<<<<" runs, dates and field
+    labels that recur across documents are scored once.
+
+Characters, not trigrams: q‑gram counting keeps a match only if the shared
+q‑grams reach (|a| − q + 1) − q·(deletions) − (q − 1)·(insertions), and at
+ratio 0.7 that is ≤ 0 for q = 3 at every keyword/token length, so a trigram
+index could not reject anything without dropping true matches.
+"""
+
+from __future__ import annotations
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple
+import difflib
+import re
+
+import numpy as np
+
+
+class KeywordMatcher:
+    """Exact and fuzzy (SequenceMatcher ratio > threshold) keyword hits in OCR text."""
+
+    def __init__(self, keywords: Iterable[str], threshold: float = 0.7, memo_size: int = 65_536):
+        self.keywords: Tuple[str, ...] = tuple(keywords)
+        self.threshold = threshold
+        # Longest first so the alternation reports the longest keyword at a position
+        self._exact = re.compile("|".join(
+            re.escape(k) for k in sorted(self.keywords, key=len, reverse=True)
+        ))
+        # Character index: row of `_counts` = that character's count in every keyword
+        self._rows = {c: i for i, c in enumerate(sorted(set("".join(self.keywords))))}
+        self._counts = np.zeros((len(self._rows), len(self.keywords)), np.int32)
+        for j, k in enumerate(self.keywords):
+            for c, m in Counter(k).items():
+                self._counts[self._rows[c], j] = m
+        self._lengths = np.array([len(k) for k in self.keywords], np.float64)
+        self.fuzzy_hits = lru_cache(maxsize=memo_size)(self._fuzzy_hits)
+
+    # ── exact ────────────────────────────────────────────────────────────
+    def exact(self, text: str) -> List[str]:
+        """Keywords occurring anywhere in `text` as substrings (as `word in text`)."""
+        text = text.lower()
+        if not self._exact.search(text):
+            return []
+        return [k for k in self.keywords if k in text]
+
+    # ── fuzzy ────────────────────────────────────────────────────────────
+    def candidates(self, token: str) -> np.ndarray:
+        """Indices of the keywords whose shared characters with `token` can still reach the threshold."""
+        shared = np.zeros(len(self.keywords), np.int32)
+        for c, m in Counter(token).items():
+            row = self._rows.get(c)
+            if row is not None:
+                shared += np.minimum(self._counts[row], m)
+        # ratio = 2M / (|a| + |b|) and M <= shared character count
+        return np.flatnonzero(2.0 * shared / (self._lengths + len(token)) > self.threshold)
+
+    def _fuzzy_hits(self, token: str) -> int:
+        """How many keywords score ratio > threshold against `token`."""
+        candidates = self.candidates(token)
+        if not len(candidates):
+            return 0
+        matcher = difflib.SequenceMatcher(None)
+        matcher.set_seq2(token)       # seq2 is the one SequenceMatcher caches
+        hits = 0
+        for j in candidates:
+            matcher.set_seq1(self.keywords[j])
+            hits += matcher.ratio() > self.threshold
+        return hits
+
+    def fuzzy_count(self, text: str, limit: int | None = None) -> int:
+        """(keyword, token) pairs with ratio > threshold, counting stops at `limit`."""
+        count = 0
+        for token in text.lower().split():
+            count += self.fuzzy_hits(token)
+            if limit is not None and count >= limit:
+                return count
+        return count
+
+    def has_keyword(self, text: str, min_fuzzy: int = 2) -> bool:
+        """An exact keyword, or at least `min_fuzzy` fuzzy pairs (the validators' rule)."""
+        return bool(self.exact(text)) or self.fuzzy_count(text, limit=min_fuzzy) >= min_fuzzy
+
+
+@lru_cache(maxsize=64)
+def matcher_for(keywords: Sequence[str], threshold: float = 0.7) -> KeywordMatcher:
+    """Shared matcher per (keyword tuple, threshold)."""
+    return KeywordMatcher(keywords, threshold)
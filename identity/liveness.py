@@ -0,0 +1,158 @@
+"""
+Face‑aligned, batched liveness scoring (Silent‑Face‑Anti‑Spoofing MiniFASNetV2).
+
+`is_real_face` used to centre‑crop the whole frame to 80x80, so the model
+mostly saw background, ran one ONNX call per image, and then ran dlib on
+the full frame anyway.  `LivenessChecker` detects the face once per frame
+(on a downscaled copy), cuts the model's 2.7x face box around it exactly
+as the MiniFASNet training crops were made, and scores every frame of a
+burst in one batched session run.  The per‑frame scores are aggregated
+over time: the median is robust to a single lucky (or blurred) frame,
+and a burst where too few frames show a face is rejected outright.
+"""
+
+from __future__ import annotations
+from typing import List, NamedTuple, Optional, Sequence
+import math
+import os
+
+import cv2
+import numpy as np
+
+from model_registry import models
+from .context import Box, ImageContext
+
+LIVENESS_SCALE = 2.7            # MiniFASNetV2 "2.7_80x80": crop 2.7x the face box
+LIVENESS_INPUT = 80             # model input side
+LIVENESS_THRESHOLD = 0.5        # aggregated score above this is live
+LIVENESS_FACE_MAX_SIDE = 640    # faces are detected on a copy no larger than this
+MIN_FACE_FRACTION = 0.5         # share of a burst's frames that must show a face
+MAX_LIVENESS_FRAMES = int(os.environ.get("MYMARK_LIVENESS_MAX_FRAMES", "8"))
+
+
+class LivenessResult(NamedTuple):
+    live: bool
+    score: float                    # median over frames with a face (0.0 if none)
+    scores: List[Optional[float]]   # per frame, None where no face was found
+
+    @property
+    def faces(self) -> int:
+        return sum(s is not None for s in self.scores)
+
+    def as_dict(self) -> dict:
+        return {"live": self.live, "score": round(self.score, 4), "faces": self.faces,
+                "scores": [None if s is None else round(s, 4) for s in self.scores]}
+
+
+def face_crop(bgr: np.ndarray, box: Box, scale: float = LIVENESS_SCALE,
+              size: int = LIVENESS_INPUT) -> np.ndarray:
+    """
+    `scale` times the face box, same centre, shifted (not clipped) to stay
+    inside the frame and shrunk only if the frame is too small, resized to
+    size x size; the crop the anti‑spoofing models were trained on.
+    """
+    src_h, src_w = bgr.shape[:2]
+    top, right, bottom, left = box
+    w, h = max(right - left, 1), max(bottom - top, 1)
+    scale = min((src_h - 1) / h, (src_w - 1) / w, scale)
+    new_w, new_h = w * scale, h * scale
+    cx, cy = left + w / 2, top + h / 2
+    x0, y0 = cx - new_w / 2, cy - new_h / 2
+    x1, y1 = cx + new_w / 2, cy + new_h / 2
+    if x0 < 0:
+        x1 -= x0
+        x0 = 0
+    if y0 < 0:
+        y1 -= y0
+        y0 = 0
+    if x1 > src_w - 1:
+        x0 -= x1 - src_w + 1
+        x1 = src_w - 1
+    if y1 > src_h - 1:
+        y0 -= y1 - src_h + 1
+        y1 = src_h - 1
+    crop = bgr[int(y0):int(y1) + 1, int(x0):int(x1) + 1]
+    return cv2.resize(crop, (size, size))
+
+
+def to_blob(crops: Sequence[np.ndarray]) -> np.ndarray:
+    """BGR crops ➜ NCHW float32 RGB in [-1, 1]."""
+    batch = np.stack(crops)[..., ::-1].astype(np.float32)
+    batch = batch / 127.5 - 1.0
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+
+class LivenessChecker:
+    """Scores frames (one selfie or a short webcam burst) with one batched model run."""
+
+    def __init__(self, model: str = "liveness", threshold: float = LIVENESS_THRESHOLD,
+                 scale: float = LIVENESS_SCALE, face_max_side: int = LIVENESS_FACE_MAX_SIDE,
+                 min_face_fraction: float = MIN_FACE_FRACTION):
+        self.model = model
+        self.threshold = threshold
+        self.scale = scale
+        self.face_max_side = face_max_side
+        self.min_face_fraction = min_face_fraction
+        self._batched: Optional[bool] = None     # learnt from the session's input shape
+
+    # ── detection ────────────────────────────────────────────────────────
+    def face_box(self, ctx: ImageContext) -> Optional[Box]:
+        """Largest face in full‑resolution coordinates, or None."""
+        h, w = ctx.rgb.shape[:2]
+        if max(h, w) <= self.face_max_side:
+            # Small frames use the context's own memo, later stages reuse it
+            boxes, factor = ctx.face_locations(), 1.0
+        else:
+            small = ImageContext.from_bgr(ctx.bgr, ctx.source, max_side=self.face_max_side)
+            boxes, factor = small.face_locations(), max(h, w) / max(small.rgb.shape[:2])
+        if not boxes:
+            return None
+        t, r, b, l = max(boxes, key=lambda f: (f[2] - f[0]) * (f[1] - f[3]))
+        return (round(t * factor), round(r * factor), round(b * factor), round(l * factor))
+
+    # ── model ────────────────────────────────────────────────────────────
+    def score(self, crops: Sequence[np.ndarray]) -> np.ndarray:
+        """Liveness score per crop; one session run unless the model's batch dim is fixed."""
+        if not len(crops):
+            return np.zeros(0, np.float32)
+        sess = models.get(self.model)
+        name = sess.get_inputs()[0].name
+        blob = to_blob(crops)
+        if self._batched is None:
+            dim = sess.get_inputs()[0].shape[0]
+            self._batched = not (isinstance(dim, int) and dim == 1)
+        if self._batched and len(crops) > 1:
+            try:
+                return self._scores(sess.run(None, {name: blob}), len(crops))
+            except Exception as e:
+                # Exported with a static batch of 1 but not declared as such
+                print(f"[liveness] Batched run failed, scoring per frame: {e}")
+                self._batched = False
+        return np.concatenate([self._scores(sess.run(None, {name: blob[i:i + 1]}), 1)
+                               for i in range(len(crops))])
+
+    @staticmethod
+    def _scores(outputs: list, n: int) -> np.ndarray:
+        out = outputs[1] if len(outputs) > 1 else outputs[0]
+        return np.asarray(out, dtype=np.float32).reshape(n, -1)[:, 0]
+
+    # ── decision ─────────────────────────────────────────────────────────
+    def aggregate(self, scores: Sequence[Optional[float]]) -> LivenessResult:
+        """Median of the face frames' scores; too few face frames is not live."""
+        found = [s for s in scores if s is not None]
+        if not found:
+            return LivenessResult(False, 0.0, list(scores))
+        score = float(np.median(found))
+        enough = len(found) >= math.ceil(self.min_face_fraction * len(scores))
+        return LivenessResult(enough and score > self.threshold, score, list(scores))
+
+    def check(self, frames: Sequence[ImageContext]) -> LivenessResult:
+        """Detect, crop and score every frame, then aggregate."""
+        frames = list(frames)[:MAX_LIVENESS_FRAMES]
+        boxes = [self.face_box(ctx) for ctx in frames]
+        with_face = [i for i, box in enumerate(boxes) if box is not None]
+        crops = [face_crop(frames[i].bgr, boxes[i], self.scale) for i in with_face]
+        scores: List[Optional[float]] = [None] * len(frames)
+        for i, s in zip(with_face, self.score(crops)):
+            scores[i] = float(s)
+        return self.aggregate(scores)
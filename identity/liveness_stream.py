@@ -0,0 +1,273 @@
+"""
+Frame‑by‑frame liveness with early exit, for a live webcam feed.
+
+A `LivenessSession` takes frames one at a time and answers after each one,
+so the client can stop as soon as the decision is made instead of posting
+fixed bursts:
+
+  * sampling: frames that arrive sooner than half the current interval are
+    skipped before they are decoded; the interval backs off while no face
+    is in view and is reported back as `next_ms` for the client to pace by;
+  * tracking: the face box found in one frame is followed into the next by
+    template matching in a window around it, and dlib only runs again when
+    the match is weak or every REDETECT_EVERY frames;
+  * early exit: after MIN_FRAMES scores the session decides as soon as the
+    mean score's confidence interval clears the threshold on either side;
+  * caps: at most MAX_SCORED model runs and MAX_WASTED decoded frames that
+    could not be scored (no face, or a repeat of the previous frame) before
+    the session settles on the median of what it has.
+
+`LivenessSessions` keeps the open sessions (LRU with a TTL) and running
+decision counters.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict, deque
+from typing import Callable, Deque, List, Optional, Tuple
+import math
+import secrets
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from .context import Box, ImageContext
+from .liveness import LivenessChecker, face_crop
+
+SAMPLE_MS = 120             # frame interval asked for while a face is in view
+MAX_SAMPLE_MS = 800         # backed‑off interval while no face is in view
+MIN_FRAMES = 2              # scores needed before an early decision
+MAX_SCORED = 12             # model runs per session
+MAX_WASTED = 10             # decoded frames that could not be scored
+MAX_RECEIVED = 120          # frames accepted per session, skipped ones included
+Z_SCORE = 1.64              # one‑sided 95 % interval on the mean score
+MIN_SE = 0.05               # floor on the standard error (two frames agree too easily)
+TRACK_MIN_CORR = 0.6        # weaker template matches fall back to detection
+TRACK_SEARCH = 0.5          # search window margin, as a fraction of the box
+REDETECT_EVERY = 5          # detect at least every this many scored frames
+REPEAT_CORR = 0.998         # a match this close at the same place is a repeated frame
+SESSION_TTL = 60.0
+MAX_SESSIONS = 256
+
+
+class LivenessSession:
+    """One webcam check: feed frames until `decision` is not None."""
+
+    def __init__(self, checker: LivenessChecker,
+                 on_decide: Callable[["LivenessSession"], None] | None = None):
+        self.checker = checker
+        self.on_decide = on_decide
+        self.started = time.perf_counter()
+        self.touched = self.started
+        self.decision: Optional[bool] = None
+        self.seconds: Optional[float] = None     # time to decision
+        self.scores: List[float] = []
+        self.received = 0
+        self.skipped = 0
+        self.wasted = 0
+        self.detections = 0
+        self.interval = SAMPLE_MS / 1e3
+        self._last_at: Optional[float] = None
+        self._box: Optional[Box] = None
+        self._template: Optional[np.ndarray] = None
+        self._since_detect = 0
+        self._lock = threading.Lock()
+
+    # ── sampling ─────────────────────────────────────────────────────────
+    def offer(self, at: float | None = None) -> bool:
+        """
+        Call before decoding a frame: False if it should be skipped.  `at` is
+        the frame's capture time in seconds (any clock, used consistently),
+        for frames that were buffered on the way; default: now.
+        """
+        with self._lock:
+            now = time.perf_counter() if at is None else at
+            if self.decision is not None:
+                return False
+            self.received += 1
+            if self.received > MAX_RECEIVED:
+                self._settle()
+                return False
+            if self._last_at is not None and now - self._last_at < self.interval / 2:
+                self.skipped += 1
+                return False
+            self._last_at = now
+            return True
+
+    # ── tracking ─────────────────────────────────────────────────────────
+    def _track(self, gray: np.ndarray) -> Tuple[Optional[Box], float]:
+        """Previous box followed into `gray` by template matching, and the match score."""
+        top, right, bottom, left = self._box
+        h, w = bottom - top, right - left
+        y0, x0 = max(0, top - int(h * TRACK_SEARCH)), max(0, left - int(w * TRACK_SEARCH))
+        y1 = min(gray.shape[0], bottom + int(h * TRACK_SEARCH))
+        x1 = min(gray.shape[1], right + int(w * TRACK_SEARCH))
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None, 0.0
+        res = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, corr, _, (mx, my) = cv2.minMaxLoc(res)
+        return (y0 + my, x0 + mx + w, y0 + my + h, x0 + mx), float(corr)
+
+    def _locate(self, ctx: ImageContext) -> Tuple[Optional[Box], bool]:
+        """(face box, repeated frame) — tracked when possible, detected otherwise."""
+        gray = cv2.cvtColor(ctx.bgr, cv2.COLOR_BGR2GRAY)
+        box, repeat = None, False
+        if self._box is not None and self._since_detect < REDETECT_EVERY:
+            box, corr = self._track(gray)
+            if corr < TRACK_MIN_CORR:
+                box = None
+            repeat = box == self._box and corr >= REPEAT_CORR
+        if box is None:
+            self.detections += 1
+            self._since_detect = 0
+            box = self.checker.face_box(ctx)
+            if box is not None:
+                # dlib boxes may overhang the frame; the template must not
+                top, right, bottom, left = box
+                box = (max(top, 0), min(right, gray.shape[1]),
+                       min(bottom, gray.shape[0]), max(left, 0))
+                if box[2] - box[0] < 2 or box[1] - box[3] < 2:
+                    box = None
+        else:
+            self._since_detect += 1
+        self._box = box
+        if box is not None:
+            top, right, bottom, left = box
+            self._template = gray[top:bottom, left:right].copy()
+        return box, repeat
+
+    # ── scoring and decision ─────────────────────────────────────────────
+    def feed(self, ctx: ImageContext) -> dict:
+        """Score one (offered) frame and update the decision; returns `status()`."""
+        with self._lock:
+            if self.decision is not None:
+                return self._status()
+            box, repeat = self._locate(ctx)
+            if box is None or repeat:
+                self.wasted += 1
+                if box is None:
+                    self.interval = min(self.interval * 2, MAX_SAMPLE_MS / 1e3)
+            else:
+                self.interval = SAMPLE_MS / 1e3
+                crop = face_crop(ctx.bgr, box, self.checker.scale)
+                self.scores.append(float(self.checker.score([crop])[0]))
+            self._decide()
+            return self._status()
+
+    def _decide(self) -> None:
+        n, threshold = len(self.scores), self.checker.threshold
+        if n >= MIN_FRAMES:
+            mean = float(np.mean(self.scores))
+            se = max(float(np.std(self.scores, ddof=1)) / math.sqrt(n), MIN_SE)
+            if mean - Z_SCORE * se > threshold:
+                return self._finish(True)
+            if mean + Z_SCORE * se < threshold:
+                return self._finish(False)
+        if n >= MAX_SCORED or self.wasted >= MAX_WASTED:
+            self._settle()
+
+    def settle(self) -> dict:
+        """No more frames are coming: decide now if still pending."""
+        with self._lock:
+            if self.decision is None:
+                self._settle()
+            return self._status()
+
+    def _settle(self) -> None:
+        """Out of budget: the burst rule (median, enough face frames) decides."""
+        self._finish(self.checker.aggregate(
+            self.scores + [None] * self.wasted).live if self.scores else False)
+
+    def _finish(self, live: bool) -> None:
+        self.decision = live
+        self.seconds = time.perf_counter() - self.started
+        if self.on_decide is not None:
+            self.on_decide(self)
+
+    def _status(self) -> dict:
+        return {
+            "decision": "pending" if self.decision is None else ("live" if self.decision else "not_live"),
+            "score": round(float(np.mean(self.scores)), 4) if self.scores else None,
+            "frames": self.received,
+            "scored": len(self.scores),
+            "skipped": self.skipped,
+            "wasted": self.wasted,
+            "detections": self.detections,
+            "next_ms": round(self.interval * 1e3),
+        }
+
+    def status(self) -> dict:
+        with self._lock:
+            return self._status()
+
+
+class LivenessSessions:
+    """Open sessions by id (LRU, expiring `ttl` seconds after last use) and decision counters."""
+
+    def __init__(self, checker: LivenessChecker, ttl: float = SESSION_TTL,
+                 max_sessions: int = MAX_SESSIONS, window: int = 1000):
+        self.checker = checker
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, LivenessSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"live": 0, "not_live": 0, "expired": 0}
+        self._seconds: Deque[float] = deque(maxlen=window)
+        self._frames: Deque[int] = deque(maxlen=window)
+        self._wasted = 0
+
+    def session(self) -> LivenessSession:
+        """A session that is not kept (the streaming endpoint holds its own)."""
+        return LivenessSession(self.checker, on_decide=self._record)
+
+    def open(self) -> Tuple[str, LivenessSession]:
+        sid = secrets.token_urlsafe(16)
+        session = self.session()
+        with self._lock:
+            self._expire()
+            self._sessions[sid] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._counts["expired"] += 1
+        return sid, session
+
+    def get(self, sid: str) -> Optional[LivenessSession]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(sid)
+            if session is not None:
+                session.touched = time.perf_counter()
+                self._sessions.move_to_end(sid)
+            return session
+
+    def close(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def _expire(self) -> None:
+        cutoff = time.perf_counter() - self.ttl
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if session.touched >= cutoff:
+                break
+            del self._sessions[sid]
+            self._counts["expired"] += session.decision is None
+
+    def _record(self, session: LivenessSession) -> None:
+        with self._lock:
+            self._counts["live" if session.decision else "not_live"] += 1
+            self._seconds.append(session.seconds)
+            self._frames.append(session.received)
+            self._wasted += session.wasted
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "open": len(self._sessions),
+                **self._counts,
+                "median_ms": round(float(np.median(self._seconds)) * 1e3, 1) if self._seconds else None,
+                "median_frames": float(np.median(self._frames)) if self._frames else None,
+                "wasted_frames": self._wasted,
+            }
@@ -0,0 +1,203 @@
+"""
+Machine‑readable zone (ICAO 9303) location, reading and validation.
+
+Instead of OCRing a whole document and hunting for 44‑character lines,
+`read_mrz` finds the MRZ band with morphology on a downscaled copy (black‑hat
+brings out dark glyphs on a light ground, a horizontal gradient plus
+closing fuses each line into a long bar, and the band is the wide bar
+complex in the lower part of the page), splits it into its two or three
+lines by row projection, and OCRs only those strips with the MRZ
+character set.  Every check digit of the TD1 / TD2 / TD3 layout is then
+verified, so random text that happens to be 44 characters long no longer
+passes as an MRZ.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from model_registry import models
+from .context import downscale
+
+MRZ_MAX_SIDE = 800          # the band is located on a copy no larger than this
+MRZ_ALLOWLIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+
+# Layout: line length and count
+FORMATS = {"TD1": (30, 3), "TD2": (36, 2), "TD3": (44, 2)}
+
+# OCR confusions undone in fields that can only hold digits
+_TO_DIGIT = str.maketrans("OQDIJLZSBG", "0001112586")
+_WEIGHTS = (7, 3, 1)
+
+Region = Tuple[int, int, int, int]  # (x_min, x_max, y_min, y_max), EasyOCR's horizontal_list
+
+
+class MRZ(NamedTuple):
+    format: str                 # "TD1", "TD2" or "TD3"
+    lines: List[str]
+    fields: Dict[str, str]
+    checks: Dict[str, bool]     # check digit name ➜ verified
+
+    @property
+    def valid(self) -> bool:
+        return all(self.checks.values())
+
+    @property
+    def raw(self) -> str:
+        return "\n".join(self.lines)
+
+
+# ---------------------------------------------------------------------------#
+# 1.  Check digits and parsing
+# ---------------------------------------------------------------------------#
+def _value(c: str) -> int:
+    if c.isdigit():
+        return ord(c) - 48
+    if "A" <= c <= "Z":
+        return ord(c) - 55
+    return 0                    # '<' (and anything unreadable)
+
+
+def check_digit(data: str) -> str:
+    """ICAO 9303 check digit: weights 7, 3, 1 repeating, sum mod 10."""
+    return str(sum(_value(c) * _WEIGHTS[i % 3] for i, c in enumerate(data)) % 10)
+
+
+def _digits(s: str) -> str:
+    return s.translate(_TO_DIGIT)
+
+
+def _fit(line: str, length: int) -> str:
+    """Pad trailing filler OCR dropped, or cut what it added, to the layout length."""
+    return line[:length].ljust(length, "<")
+
+
+def _td3_like(l1: str, l2: str, length: int) -> MRZ:
+    """TD3 (passport) and TD2 share the second‑line layout up to the optional data."""
+    doc, birth, expiry = l2[0:9], _digits(l2[13:19]), _digits(l2[21:27])
+    cd = _digits(l2[9] + l2[19] + l2[27] + l2[length - 1])
+    fields = {
+        "document_type": l1[0:2].rstrip("<"), "issuer": l1[2:5],
+        "names": l1[5:length].rstrip("<"),
+        "document_number": doc.rstrip("<"), "nationality": l2[10:13],
+        "birth_date": birth, "sex": l2[20], "expiry_date": expiry,
+    }
+    checks = {
+        "document_number": check_digit(doc) == cd[0],
+        "birth_date": check_digit(birth) == cd[1],
+        "expiry_date": check_digit(expiry) == cd[2],
+    }
+    composite = l2[0:9] + cd[0] + birth + cd[1] + expiry + cd[2] + l2[28:length - 1]
+    if length == 44:
+        optional, optional_cd = l2[28:42], _digits(l2[42])
+        fields["optional"] = optional.rstrip("<")
+        # An all-filler optional field may carry '<' or '0' as its check digit
+        checks["optional"] = (check_digit(optional) == optional_cd
+                              or (optional.strip("<") == "" and l2[42] in "<0"))
+        composite = l2[0:9] + cd[0] + birth + cd[1] + expiry + cd[2] + optional + l2[42]
+    checks["composite"] = check_digit(composite) == cd[3]
+    return MRZ("TD3" if length == 44 else "TD2", [l1, l2], fields, checks)
+
+
+def _td1(l1: str, l2: str, l3: str) -> MRZ:
+    doc, birth, expiry = l1[5:14], _digits(l2[0:6]), _digits(l2[8:14])
+    cd = _digits(l1[14] + l2[6] + l2[14] + l2[29])
+    fields = {
+        "document_type": l1[0:2].rstrip("<"), "issuer": l1[2:5],
+        "document_number": doc.rstrip("<"), "birth_date": birth, "sex": l2[7],
+        "expiry_date": expiry, "nationality": l2[15:18], "names": l3.rstrip("<"),
+    }
+    composite = l1[5:14] + cd[0] + l1[15:30] + birth + cd[1] + expiry + cd[2] + l2[18:29]
+    checks = {
+        "document_number": check_digit(doc) == cd[0],
+        "birth_date": check_digit(birth) == cd[1],
+        "expiry_date": check_digit(expiry) == cd[2],
+        "composite": check_digit(composite) == cd[3],
+    }
+    return MRZ("TD1", [l1, l2, l3], fields, checks)
+
+
+def parse(lines: List[str]) -> Optional[MRZ]:
+    """
+    Parse two (TD2 / TD3) or three (TD1) MRZ lines, tolerating a few
+    dropped or extra trailing characters; None if the shape is wrong.
+    """
+    lines = [line.replace(" ", "").upper() for line in lines if line.strip()]
+    if len(lines) == 3 and all(abs(len(line) - 30) <= 3 for line in lines):
+        return _td1(*(_fit(line, 30) for line in lines))
+    if len(lines) == 2:
+        longest = max(len(line) for line in lines)
+        for length in (44, 36):
+            if abs(longest - length) <= 3:
+                l1, l2 = (_fit(line, length) for line in lines)
+                return _td3_like(l1, l2, length)
+    return None
+
+
+# ---------------------------------------------------------------------------#
+# 2.  Locating and reading the band
+# ---------------------------------------------------------------------------#
+def locate_band(gray: np.ndarray, max_side: int = MRZ_MAX_SIDE) -> Optional[Region]:
+    """Bounding box of the MRZ band in full‑resolution coordinates, or None."""
+    small, scale = downscale(gray, max_side)
+    h, w = small.shape
+    rect = cv2.getStructuringElement(cv2.MORPH_RECT, (max(13, w // 45), 5))
+    square = cv2.getStructuringElement(cv2.MORPH_RECT, (max(21, w // 28),) * 2)
+    small = cv2.GaussianBlur(small, (3, 3), 0)
+    blackhat = cv2.morphologyEx(small, cv2.MORPH_BLACKHAT, rect)
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad = (255 * (grad - grad.min()) / max(float(grad.max() - grad.min()), 1e-6)).astype(np.uint8)
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, rect)
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    bw = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, square)
+    bw = cv2.erode(bw, None, iterations=2)
+    margin = int(w * 0.05)
+    bw[:, :margin] = 0
+    bw[:, w - margin:] = 0
+    contours, _ = cv2.findContours(bw, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if cw / max(ch, 1) > 4 and cw > 0.6 * w and y > 0.4 * h:
+            pad_x, pad_y = int(0.03 * w), int(0.15 * ch)
+            return (int(max(0, x - pad_x) / scale), int(min(w, x + cw + pad_x) / scale),
+                    int(max(0, y - pad_y) / scale), int(min(h, y + ch + pad_y) / scale))
+    return None
+
+
+def band_lines(gray: np.ndarray, band: Region) -> List[Region]:
+    """Split the band into its text lines by dark‑pixel row projection."""
+    x0, x1, y0, y1 = band
+    crop = gray[y0:y1, x0:x1]
+    _, ink = cv2.threshold(crop, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    rows = ink.sum(axis=1) > 0.05 * crop.shape[1]
+    lines, start = [], None
+    for i, on in enumerate(np.append(rows, False)):
+        if on and start is None:
+            start = i
+        elif not on and start is not None:
+            if i - start >= 4:
+                lines.append((start, i))
+            start = None
+    if not 2 <= len(lines) <= 3:
+        return [band]
+    pad = max(2, min(b - a for a, b in lines) // 4)
+    return [(x0, x1, max(y0, y0 + a - pad), min(y1, y0 + b + pad)) for a, b in lines]
+
+
+def read_mrz(gray: np.ndarray) -> Tuple[Optional[Region], Optional[MRZ]]:
+    """
+    (band, parsed MRZ) for a grayscale document image.  The band is None
+    when no MRZ‑shaped region exists; the MRZ is None when the band's text
+    does not have an MRZ layout.  Check `MRZ.valid` for the check digits.
+    """
+    band = locate_band(gray)
+    if band is None:
+        return None, None
+    lines = band_lines(gray, band)
+    text = models.get("easyocr").recognize(gray, horizontal_list=lines, free_list=[], detail=0,
+                                           allowlist=MRZ_ALLOWLIST)
+    if len(lines) == 1:
+        text = text[0].split() if text else []
+    return band, parse(text)
@@ -0,0 +1,177 @@
+"""
+ID‑document, liveness and face‑match checks used by registration.
+
+Every check accepts an `ImageContext` (or, for older callers, an image
+path) so one request decodes each image once and runs dlib detection and
+encoding at most once per image, whichever stages consume them.
+"""
+
+import re
+
+import cv2
+import face_recognition
+import numpy as np
+
+from .context import as_context
+from .id_cascade import CascadeTrace, cascade_text
+from .keywords import KeywordMatcher, matcher_for
+from .liveness import LivenessChecker
+from .mrz import parse as parse_mrz_lines
+
+# Words whose presence in the OCR text marks an ID document
+ID_KEYWORDS = [
+    'passport', 'passpoort', 'passaporto', 'reisepass', 'passeport',
+    'united kingdom', 'britain', 'british', 'citizen', 'surname', 'given', 'name',
+    'date', 'birth', 'expiry', 'issue', 'authority', 'hmpo', 'number', 'code',
+    'type', 'nationality', 'sex', 'male', 'female', 'm', 'f', 'p', 'gbr', 'uk',
+    'driving', 'license', 'licence', 'id', 'identification', 'identity', 'card', 'dvla'
+]
+ID_KEYWORD_MATCHER = KeywordMatcher(ID_KEYWORDS)
+LIVENESS_CHECKER = LivenessChecker()
+
+
+def preprocess_for_ocr(img_path):
+    """Preprocess image for better OCR: grayscale, contrast, threshold."""
+    try:
+        img = cv2.imread(img_path)
+        if img is None:
+            print("[preprocess_for_ocr] Could not read image:", img_path)
+            return img_path
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = cv2.equalizeHist(gray)
+        # Adaptive thresholding for better text extraction
+        thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                       cv2.THRESH_BINARY, 21, 10)
+        temp_path = img_path + "_ocr_tmp.jpg"
+        cv2.imwrite(temp_path, thresh)
+        return temp_path
+    except Exception as e:
+        print("[preprocess_for_ocr] error:", e)
+        return img_path
+
+def fuzzy_keyword_match(text, keywords, threshold=0.7):
+    """Fuzzy match keywords in OCR text (lower threshold for more tolerance)."""
+    return matcher_for(tuple(keywords), threshold).fuzzy_count(text, limit=1) >= 1
+
+def extract_mrz(text):
+    """Extract MRZ lines from OCR text (for UK passports, etc)."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    # MRZ lines are 2 lines of 44 chars (passports), 2 of 36 or 3 of 30 chars (ID cards)
+    mrz_lines = [line for line in lines if len(line) in (44, 36, 30)]
+    if len(mrz_lines) >= 3 and all(len(line) == 30 for line in mrz_lines[-3:]):
+        return "\n".join(mrz_lines[-3:])
+    if len(mrz_lines) >= 2:
+        return "\n".join(mrz_lines[-2:])
+    return None
+
+def parse_mrz(mrz_text):
+    """Parse MRZ lines (TD1 / TD2 / TD3) and verify every ICAO 9303 check digit."""
+    if not mrz_text:
+        return None
+    lines = mrz_text.splitlines()
+    if not all(re.match(r'^[A-Z0-9<]+$', line) for line in lines):
+        return None
+    mrz = parse_mrz_lines(lines)
+    if mrz is None or not mrz.valid:
+        return None
+    return {"raw": mrz_text, "format": mrz.format, **mrz.fields}
+
+def is_valid_id_document(id_image, trace=None):
+    """Require MRZ (if present), at least one strong keyword, and a face in the ID region."""
+    # Face / text-line presence gate the OCR (see id_cascade); pass a
+    # CascadeTrace to see which stage rejected and how long each took
+    trace = trace if trace is not None else CascadeTrace()
+    try:
+        ctx = as_context(id_image)
+        text = cascade_text(ctx, trace, reject_bad_mrz=True)
+        if text is None:
+            print(f"[is_valid_id_document] rejected at {trace.rejected}")
+            return False
+        print(f"[is_valid_id_document] EasyOCR text: {repr(text)}")
+        # Try to extract and parse MRZ
+        mrz_text = extract_mrz(text)
+        mrz_info = parse_mrz(mrz_text) if mrz_text else None
+        has_mrz = bool(mrz_info)
+        # Require an exact keyword, or two fuzzy (ratio > 0.7) keyword/token pairs
+        has_keyword = ID_KEYWORD_MATCHER.has_keyword(text)
+        print(f"[is_valid_id_document] has_mrz={has_mrz}, has_keyword={has_keyword}, has_face=True")
+        # If MRZ present, it must be valid; must have keyword (the face stage already passed)
+        return trace.decide("ocr", (not mrz_text or has_mrz) and has_keyword)
+    except Exception as e:
+        print("is_valid_id_document error:", e)
+        return False
+
+def is_real_face(face_image):
+    """Check for a real, live face using ONNX anti-spoofing model (Silent-Face-Anti-Spoofing)."""
+    try:
+        result = LIVENESS_CHECKER.check([as_context(face_image)])
+        if result.faces == 0:
+            print("[is_real_face] No face detected.")
+            return False
+        print(f"[is_real_face] Liveness score: {result.score}")
+        if not result.live:
+            print("[is_real_face] Liveness score below threshold.")
+        return result.live
+    except FileNotFoundError as e:
+        print(f"[is_real_face] {e}")
+        return False
+    except Exception as e:
+        print("is_real_face error:", e)
+        return False
+
+def faces_match(face_image, id_image, tolerance=0.6):
+    try:
+        face_enc = as_context(face_image).encodings()
+        id_enc = as_context(id_image).encodings()
+        if not face_enc or not id_enc:
+            return False
+        return face_recognition.compare_faces([id_enc[0]], face_enc[0], tolerance=tolerance)[0]
+    except Exception as e:
+        print("faces_match error:", e)
+        return False
+
+def facenet_embedding(face_image):
+    # Return the 128-d FaceNet embedding as bytes
+    try:
+        encodings = as_context(face_image).encodings()
+        if not encodings:
+            return None
+        arr = np.array(encodings[0], dtype=np.float32)
+        return arr.tobytes()
+    except Exception as e:
+        print("facenet_embedding error:", e)
+        return None
+
+def compareFaces(uploaded_face, id_face, tolerance=0.6):
+    # Reuse encodings already computed for this request
+    uploaded_encodings = as_context(uploaded_face).encodings()
+    id_encodings = as_context(id_face).encodings()
+    if not uploaded_encodings or not id_encodings:
+        # Could not detect a face in one or both images
+        return False
+    # Compare the first detected face
+    results = face_recognition.compare_faces([id_encodings[0]], uploaded_encodings[0], tolerance=tolerance)
+    return results[0]
+
+def validateIDDocument(document, trace=None):
+    trace = trace if trace is not None else CascadeTrace()
+    try:
+        ctx = as_context(document)
+        text = cascade_text(ctx, trace)
+        if text is None:
+            print(f"[validateIDDocument] rejected at {trace.rejected}")
+            return False
+        print(f"[validateIDDocument] EasyOCR text: {repr(text)}")
+        mrz_text = extract_mrz(text)
+        mrz_info = parse_mrz(mrz_text) if mrz_text else None
+        if mrz_info:
+            print(f"[validateIDDocument] MRZ info: {mrz_info}")
+            has_mrz = True
+        else:
+            has_mrz = False
+    except Exception as e:
+        print("[validateIDDocument] error:", e)
+        return False
+    has_keyword = ID_KEYWORD_MATCHER.has_keyword(text)
+    print(f"[validateIDDocument] has_mrz={has_mrz}, has_keyword={has_keyword}, has_face=True")
+    return trace.decide("ocr", has_mrz or has_keyword)
@@ -0,0 +1,128 @@
+"""
+Image ingestion for the upload and identity endpoints.
+
+Images arrive either as base64 / data‑URL JSON fields or as multipart file
+parts (no 33 % base64 inflation).  Either way the encoded bytes stay in
+memory: the payload size is checked before base64 decoding, the format and
+dimensions are read from the header (PIL, no pixel decode) before
+`cv2.imdecode` runs on a zero‑copy view of the buffer.
+"""
+
+from __future__ import annotations
+from typing import IO, List, Mapping, Tuple
+import binascii
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from watermarking import decode_bytes
+
+MAX_IMAGE_BYTES = int(os.environ.get("MYMARK_MAX_IMAGE_BYTES", 15 * 1024 * 1024))
+MAX_IMAGE_SIDE = int(os.environ.get("MYMARK_MAX_IMAGE_SIDE", 8192))
+MAX_IMAGE_PIXELS = int(os.environ.get("MYMARK_MAX_IMAGE_PIXELS", 40_000_000))
+# Two base64 images plus form/JSON overhead per request
+MAX_REQUEST_BYTES = 2 * (MAX_IMAGE_BYTES * 4 // 3) + 1024 * 1024
+FORMATS = {"JPEG", "PNG", "WEBP", "BMP", "TIFF"}
+
+
+class IngestError(ValueError):
+    """Rejected image; `status` is the HTTP code to answer with (400 or 413)."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def b64_payload(value: str) -> bytes:
+    """Decode a base64 string or data URL, refusing oversized payloads before decoding."""
+    comma = value.find(",", 0, 256)
+    if comma >= 0:
+        value = value[comma + 1:]
+    if len(value) * 3 // 4 > MAX_IMAGE_BYTES:
+        raise IngestError(f"Image larger than {MAX_IMAGE_BYTES} bytes", 413)
+    try:
+        return binascii.a2b_base64(value)
+    except (binascii.Error, ValueError) as e:
+        raise IngestError(f"Invalid base64 image data: {e}") from e
+
+
+def read_upload(stream: IO[bytes]) -> bytearray:
+    """Read a multipart file part into one buffer, stopping past the size limit."""
+    buf = bytearray(stream.read(MAX_IMAGE_BYTES + 1))
+    if len(buf) > MAX_IMAGE_BYTES:
+        raise IngestError(f"Image larger than {MAX_IMAGE_BYTES} bytes", 413)
+    return buf
+
+
+def check_header(buf: bytes | bytearray | memoryview) -> Tuple[int, int]:
+    """(width, height) from the image header; raises IngestError on bad format or size."""
+    if not buf:
+        raise IngestError("Image data is empty")
+    try:
+        with Image.open(io.BytesIO(buf)) as im:
+            fmt, (w, h) = im.format, im.size
+    except Exception as e:
+        raise IngestError("Unrecognised image data") from e
+    if fmt not in FORMATS:
+        raise IngestError(f"Unsupported image format {fmt}")
+    if max(w, h) > MAX_IMAGE_SIDE or w * h > MAX_IMAGE_PIXELS:
+        raise IngestError(f"Image dimensions {w}x{h} exceed the limit", 413)
+    return w, h
+
+
+def decode(buf: bytes | bytearray | memoryview, check: bool = True) -> np.ndarray:
+    """Checked, in‑memory decode to a BGR array."""
+    if check:
+        check_header(buf)
+    img = decode_bytes(memoryview(buf))
+    if img is None:
+        raise IngestError("Could not decode image data")
+    return img
+
+
+def from_request(request, data: Mapping, field: str) -> bytes | bytearray:
+    """
+    Encoded image bytes for `field`: a multipart file part if present, else a
+    base64 / data‑URL value in `data`.  Header‑checked, not yet decoded.
+    """
+    part = request.files.get(field)
+    if part is not None:
+        buf = read_upload(part.stream)
+    else:
+        value = data.get(field) if data else None
+        if not value or not isinstance(value, str):
+            raise IngestError(f"Missing {field}")
+        buf = b64_payload(value)
+    check_header(buf)
+    return buf
+
+
+def frames_from_request(request, data: Mapping, field: str, limit: int) -> List[bytes | bytearray]:
+    """
+    Encoded images for a repeated `field`: every multipart part of that name,
+    else a JSON list of base64 / data‑URL strings.  More than `limit` is a 413.
+    """
+    parts = request.files.getlist(field)
+    values = parts or (data.get(field) if data else None)
+    if not values or not isinstance(values, list):
+        raise IngestError(f"Missing {field}")
+    if len(values) > limit:
+        raise IngestError(f"At most {limit} {field} per request", 413)
+    bufs = []
+    for value in values:
+        if parts:
+            buf = read_upload(value.stream)
+        elif isinstance(value, str) and value:
+            buf = b64_payload(value)
+        else:
+            raise IngestError(f"Invalid entry in {field}")
+        check_header(buf)
+        bufs.append(buf)
+    return bufs
+
+
+def request_data(request) -> dict:
+    """JSON body, or the plain form fields of a multipart request."""
+    return request.get_json(silent=True) or request.form.to_dict()
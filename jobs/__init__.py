@@ -0,0 +1,314 @@
+"""
+In‑process job broker with a pool of model‑holding worker processes.
+
+Heavy endpoints `submit` a task and answer with a job id straight away.
+Tasks are plain module‑level functions (see `jobs.tasks`) run by long‑lived
+worker processes, so every worker loads EasyOCR / dlib / ONNX / TF once and
+keeps them.  An optional `finish(job, value)` hook then runs back in the
+web process for anything that must touch its state (users DB, detection
+index, blockchain nonces).  `stage(name)` blocks record per‑stage timings.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import atexit
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+import traceback
+import uuid
+
+_local = threading.local()
+
+
+class QueueFull(RuntimeError):
+    """Raised by `JobQueue.submit` when `max_depth` jobs are already waiting or running."""
+
+
+@contextmanager
+def stage(name: str):
+    """Add the block's wall time to the current job's timings (no‑op outside a job)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0.0) + time.perf_counter() - start, 4)
+
+
+class Job:
+    """One unit of queued work; resolves to done or failed."""
+
+    def __init__(self, kind: str, fn: Callable, args: tuple,
+                 finish: Optional[Callable[["Job", Any], Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn, self.args, self.finish = fn, args, finish
+        self.status = "queued"           # queued → running → done | failed
+        self.result: Any = None
+        self.http_status = 200
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.private: Dict[str, Any] = {}   # web‑process only (files, cookies); never serialised
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.pid: Optional[int] = None
+        self._done = threading.Event()
+
+    def _started(self, pid: int, started_at: float) -> None:
+        self.status, self.pid, self.started_at = "running", pid, started_at
+        self.timings["queue_wait"] = round(max(0.0, started_at - self.submitted_at), 4)
+
+    def _resolve(self, value: Any, timings: Dict[str, float]) -> None:
+        self.timings.update(timings)
+        _local.timings = self.timings
+        try:
+            with stage("finish"):
+                self.result = self.finish(self, value) if self.finish else value
+            self.status = "done"
+        except Exception as e:
+            traceback.print_exc()
+            self.status, self.error, self.http_status = "failed", str(e), 500
+        finally:
+            _local.timings = None
+        self._close()
+
+    def _fail(self, error: str, timings: Dict[str, float] | None = None) -> None:
+        self.timings.update(timings or {})
+        self.status, self.error, self.http_status = "failed", error, 500
+        self._close()
+
+    def _close(self) -> None:
+        self.finished_at = time.time()
+        self.timings["total"] = round(self.finished_at - self.submitted_at, 4)
+        self.fn = self.args = self.finish = None
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> "Job":
+        self._done.wait(timeout)
+        return self
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "timings": self.timings,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# ---------------------------------------------------------------------------#
+# Worker process
+# ---------------------------------------------------------------------------#
+def _worker_main(tasks, results, warmup: List[str]) -> None:
+    # `results` is this worker's own pipe: sends are synchronous, so a crash
+    # can't swallow the "started" message that lets the broker fail the job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)      # Ctrl‑C belongs to the web process
+    pid = os.getpid()
+    if warmup:
+        from model_registry import models
+        results.send((None, "warmup", pid, models.warmup(warmup)))
+    while True:
+        item = tasks.get()
+        if item is None:
+            return
+        job_id, fn, args = item
+        results.send((job_id, "started", pid, time.time()))
+        _local.timings = timings = {}
+        try:
+            with stage("run"):
+                value = fn(*args)
+            results.send((job_id, "done", value, timings))
+        except Exception as e:
+            traceback.print_exc()
+            results.send((job_id, "failed", f"{type(e).__name__}: {e}", timings))
+        finally:
+            _local.timings = None
+
+
+# ---------------------------------------------------------------------------#
+# Broker (web process)
+# ---------------------------------------------------------------------------#
+class JobQueue:
+    """Bounded queue feeding `workers` forked processes; `workers=0` runs inline."""
+
+    def __init__(self, workers: int = 2, max_depth: int = 32, keep: int = 1000,
+                 warmup: Iterable[str] = ()):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.keep = keep
+        self.warmup = list(warmup)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._procs: Dict[int, Tuple[mp.Process, mp.connection.Connection]] = {}
+        self._warm: Dict[int, Dict[str, dict]] = {}     # worker pid ➜ its models' health
+        self._ctx = mp.get_context("fork")
+        self._tasks = None
+        self._collector: Optional[threading.Thread] = None
+        self._closing = False
+
+    def start(self) -> "JobQueue":
+        """Fork the workers.  Call early, before the web process starts threads."""
+        if self._collector is not None:
+            return self
+        if self.workers <= 0:
+            if self.warmup:                 # inline jobs use the web process's models
+                from model_registry import models
+                models.warmup_async(self.warmup)
+            return self
+        self._tasks = self._ctx.Queue()
+        for _ in range(self.workers):
+            self._spawn()
+        self._collector = threading.Thread(target=self._collect, name="job-collector", daemon=True)
+        self._collector.start()
+        atexit.register(self.close)     # runs before multiprocessing reaps the workers
+        return self
+
+    def close(self) -> None:
+        """Stop the workers once they finish their current task."""
+        self._closing = True
+        for _ in self._procs:
+            self._tasks.put(None)
+
+    def _spawn(self) -> None:
+        reader, writer = self._ctx.Pipe(duplex=False)
+        p = self._ctx.Process(target=_worker_main, args=(self._tasks, writer, self.warmup),
+                              name="mymark-job-worker", daemon=True)
+        p.start()
+        writer.close()
+        self._procs[p.sentinel] = (p, reader)
+
+    def submit(self, kind: str, fn: Callable, *args,
+               finish: Optional[Callable[[Job, Any], Any]] = None) -> Job:
+        job = Job(kind, fn, args, finish)
+        with self._lock:
+            if self._active >= self.max_depth:
+                raise QueueFull(f"{self._active} jobs in progress (max {self.max_depth})")
+            self._active += 1
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                self._jobs.popitem(last=False)
+        if self._collector is None:
+            self._run_inline(job)
+        else:
+            self._tasks.put((job.id, fn, args))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": sum(p.is_alive() for p, _ in self._procs.values()),
+            "depth": self._active,
+            "max_depth": self.max_depth,
+            "jobs": counts,
+        }
+
+    def worker_health(self) -> Dict[str, Any]:
+        """
+        Model health each worker reported after its warmup, by pid;
+        "pending" until it reports.  `failed` lists every "pid:model" that
+        did not load.  Inline jobs share the web process's `models.health()`.
+        """
+        if not self.warmup or self._collector is None:
+            return {"workers": {}, "failed": []}
+        health = {str(p.pid): self._warm.get(p.pid, "pending")
+                  for p, _ in self._procs.values() if p.is_alive()}
+        failed = [f"{pid}:{name}" for pid, report in health.items() if report != "pending"
+                  for name, status in report.items() if status["error"]]
+        return {"workers": health, "failed": failed}
+
+    # ── internals ────────────────────────────────────────────────────────
+    def _release(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _run_inline(self, job: Job) -> None:
+        job._started(os.getpid(), time.time())
+        _local.timings = timings = {}
+        try:
+            with stage("run"):
+                value = job.fn(*job.args)
+        except Exception as e:
+            traceback.print_exc()
+            job._fail(f"{type(e).__name__}: {e}", timings)
+            return
+        finally:
+            _local.timings = None
+            self._release()
+        job._resolve(value, timings)
+
+    def _collect(self) -> None:
+        while True:
+            readers = {r: p for p, r in self._procs.values()}
+            for ready in mp.connection.wait([*readers, *self._procs], timeout=1.0):
+                if ready in readers:
+                    try:
+                        self._handle(ready.recv())
+                    except (EOFError, OSError):
+                        pass                      # worker exiting; its sentinel follows
+                else:
+                    self._reap(ready)
+
+    def _handle(self, msg: tuple) -> None:
+        if msg[1] == "warmup":
+            self._warm[msg[2]] = msg[3]
+            for name, status in msg[3].items():
+                if status["error"]:
+                    print(f"[jobs] worker {msg[2]} failed to load {name}: {status['error']}")
+            return
+        job = self.get(msg[0])
+        if job is None or job.done:
+            return
+        if msg[1] == "started":
+            job._started(msg[2], msg[3])
+            return
+        self._release()
+        if msg[1] == "done":
+            job._resolve(msg[2], msg[3])
+        else:
+            job._fail(msg[2], msg[3])
+
+    def _reap(self, sentinel: int) -> None:
+        """Fail the job a dead worker was running and replace the worker."""
+        p, reader = self._procs.pop(sentinel)
+        while reader.poll():
+            try:
+                self._handle(reader.recv())
+            except (EOFError, OSError):
+                break
+        reader.close()
+        p.join()
+        self._warm.pop(p.pid, None)
+        with self._lock:
+            lost = [j for j in self._jobs.values() if j.status == "running" and j.pid == p.pid]
+        for job in lost:
+            self._release()
+            job._fail("Worker process exited")
+        if not self._closing:
+            print(f"[jobs] worker {p.pid} exited with {p.exitcode}; restarting")
+            self._spawn()
@@ -0,0 +1,120 @@
+"""
+Tasks run inside `JobQueue` worker processes.
+
+Arguments are raw image bytes / strings and results are plain dicts so
+they cross the process boundary cheaply; the web process turns a result
+into its HTTP response (and does any DB / index / chain writes) in the
+job's `finish` hook.  A failed check returns {"ok": False, "message"}.
+Tasks that validate an ID document also return its cascade trace under
+"cascade" for the web process's `CascadeStats`.
+"""
+
+from __future__ import annotations
+from typing import Optional
+
+from identity import (
+    CascadeTrace, ImageContext, compareFaces, facenet_embedding, faces_match, is_real_face,
+    is_valid_id_document, validateIDDocument,
+)
+from ingest import IngestError, decode
+from watermarking import embed_watermark_array, encode_image, hash_set
+
+from . import stage
+
+
+def _fail(message: str, http_status: int = 400) -> dict:
+    return {"ok": False, "message": message, "http_status": http_status}
+
+
+def _traced(result: dict, trace: CascadeTrace) -> dict:
+    result["cascade"] = trace.as_dict()
+    return result
+
+
+def _context(data: bytes, name: str) -> Optional[ImageContext]:
+    # The web process already checked size, format and dimensions
+    try:
+        return ImageContext.from_bgr(decode(data, check=False), name)
+    except IngestError:
+        return None
+
+
+def verify_registration(id_data: bytes, face_data: bytes) -> dict:
+    """/api/register checks: ID document, liveness, face match, embedding."""
+    with stage("decode"):
+        id_ctx, face_ctx = _context(id_data, "id_image"), _context(face_data, "face_image")
+    if id_ctx is None or face_ctx is None:
+        return _fail("Could not decode image data.")
+    trace = CascadeTrace()
+    with stage("id_document"):
+        if not is_valid_id_document(id_ctx, trace):
+            return _traced(_fail("ID document must be a valid passport, driver's license, or university ID containing a face."), trace)
+    with stage("liveness"):
+        if not is_real_face(face_ctx):
+            return _traced(_fail("No real face detected in face image. Please use a live photo."), trace)
+    with stage("face_match"):
+        if not faces_match(face_ctx, id_ctx):
+            return _traced(_fail("Face does not match ID document."), trace)
+    with stage("embedding"):
+        embedding = facenet_embedding(face_ctx)
+    if embedding is None:
+        return _traced(_fail("Could not generate FaceNet embedding."), trace)
+    return _traced({"ok": True, "embedding": embedding}, trace)
+
+
+def verify_face_registration(id_data: bytes, face_data: bytes) -> dict:
+    """/api/face_register checks: ID document, face match, embedding."""
+    with stage("decode"):
+        id_ctx, face_ctx = _context(id_data, "id_image"), _context(face_data, "face_image")
+    if id_ctx is None or face_ctx is None:
+        return _fail("Could not decode image data.")
+    trace = CascadeTrace()
+    with stage("id_document"):
+        is_valid = validateIDDocument(id_ctx, trace)
+    print("face_register: validateIDDocument result:", is_valid)
+    if not is_valid:
+        return _traced(_fail("No ID card detected in first image."), trace)
+    with stage("face_match"):
+        try:
+            match = compareFaces(face_ctx, id_ctx)
+        except Exception as e:
+            print("compareFaces error:", e)
+            return _traced(_fail(f"Face comparison error: {str(e)}"), trace)
+    print("face_register: compareFaces result:", match)
+    if not match:
+        return _traced(_fail("Face images do not match."), trace)
+    with stage("embedding"):
+        embedding = facenet_embedding(face_ctx)
+    if embedding is None:
+        return _traced(_fail("Could not generate FaceNet embedding."), trace)
+    return _traced({"ok": True, "embedding": embedding}, trace)
+
+
+def validate_id(id_data: bytes) -> dict:
+    with stage("decode"):
+        ctx = _context(id_data, "id_image")
+    if ctx is None:
+        return _fail("Could not decode image data.")
+    trace = CascadeTrace()
+    with stage("id_document"):
+        is_valid = validateIDDocument(ctx, trace)
+    print(f"[validate_id] validateIDDocument result: {is_valid}")
+    return _traced({"ok": True} if is_valid else _fail("No ID card detected. Please try again."), trace)
+
+
+def watermark_upload(data: bytes, owner: str, ext: str) -> dict:
+    """Decode once, hash once (full detection hash set), embed, encode once (see /api/upload)."""
+    with stage("decode"):
+        try:
+            img = decode(data, check=False)
+        except IngestError:
+            return _fail("Could not decode image")
+    with stage("phash"):
+        hashes = hash_set(img)
+        phash_hex = f"{hashes['phash']:016x}"
+    with stage("watermark"):
+        wm_img, fingerprint_hex = embed_watermark_array(img, owner, phash_hex=phash_hex, copy=False)
+    with stage("encode"):
+        wm_bytes = encode_image(wm_img, ext)
+    return {"ok": True, "phash": phash_hex, "hashes": hashes,
+            "fingerprint": fingerprint_hex, "image": wm_bytes}
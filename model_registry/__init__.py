@@ -0,0 +1,106 @@
+"""
+Process‑wide registry of ML models for MyMark.
+
+Each model is registered once with a loader; the first `models.get(name)`
+runs it and the result is cached for the lifetime of the process, so no
+request pays for loading (and no import pays for models it never uses).
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Optional
+import os
+import threading
+import time
+
+LIVENESS_MODEL_PATH = os.path.join(
+    os.getcwd(), "liveness_model", "onnx_models", "2.7_80x80_MiniFASNetV2.onnx"
+)
+
+
+class ModelRegistry:
+    """Lazy, thread‑safe name ➜ loaded model cache."""
+
+    def __init__(self) -> None:
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._status: Dict[str, dict] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        self._loaders[name] = loader
+        self._locks.setdefault(name, threading.Lock())
+        self._status.setdefault(name, {"loaded": False, "load_seconds": None, "error": None})
+
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model {name!r}")
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                try:
+                    model = self._loaders[name]()
+                except Exception as e:
+                    self._status[name]["error"] = str(e)
+                    raise
+                self._models[name] = model
+                self._status[name] = {
+                    "loaded": True,
+                    "load_seconds": round(time.perf_counter() - start, 3),
+                    "error": None,
+                }
+        return model
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """Load `names` (default: every registered model); errors are recorded, not raised."""
+        for name in names or list(self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"[models] warmup of {name} failed: {e}")
+        return self.health()
+
+    def warmup_async(self, names: Optional[Iterable[str]] = None) -> threading.Thread:
+        names = list(names) if names else None
+        t = threading.Thread(target=self.warmup, args=(names,), name="model-warmup", daemon=True)
+        t.start()
+        return t
+
+    def health(self) -> Dict[str, dict]:
+        return {name: dict(status) for name, status in self._status.items()}
+
+    def failures(self) -> Dict[str, str]:
+        """name ➜ error of every model whose last load failed."""
+        return {name: s["error"] for name, s in self._status.items() if s["error"]}
+
+
+models = ModelRegistry()
+
+
+# ---------------------------------------------------------------------------#
+# Built‑in loaders (imports stay inside so an unused model costs nothing)
+# ---------------------------------------------------------------------------#
+def _load_liveness():
+    """Silent‑Face‑Anti‑Spoofing MiniFASNetV2 ONNX session."""
+    import onnxruntime as ort
+    if not os.path.exists(LIVENESS_MODEL_PATH):
+        raise FileNotFoundError(f"Liveness model not found at {LIVENESS_MODEL_PATH}")
+    return ort.InferenceSession(LIVENESS_MODEL_PATH, providers=["CPUExecutionProvider"])
+
+
+def _load_easyocr():
+    import easyocr
+    return easyocr.Reader(['en'], gpu=False)
+
+
+def _load_voice_encoder():
+    from resemblyzer import VoiceEncoder
+    return VoiceEncoder()
+
+
+models.register("liveness", _load_liveness)
+models.register("easyocr", _load_easyocr)
+models.register("voice_encoder", _load_voice_encoder)
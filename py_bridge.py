@@ -1,6 +1,8 @@
-import base64, json, sys, os, hashlib
-import numpy as np, cv2
-from face_auth import face_embedding
+import json, sys, os, hashlib, time
+import numpy as np
+from face_auth import face_embeddings
+from identity import FaceIndex
+import ingest
 from pymongo import MongoClient
 from argon2 import PasswordHasher
 from datetime import datetime
@@ -8,31 +10,83 @@ from datetime import datetime
 ph = PasswordHasher()
 users = MongoClient("mongodb://localhost:27017").mymark_users_db.users
 
+INDEX_TTL = 300.0       # full rebuild after this long; new users are topped up before
+
+# Face index over users.face_embedding, kept for the life of the process
+# (see --serve): (index, newest _id in it, built at)
+_index = None
+
+
 def b64_to_bgr(b64):
-    data = base64.b64decode(b64.split(",")[-1])
-    arr = np.frombuffer(data, np.uint8)
-    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+    return ingest.decode(ingest.b64_payload(b64))
 
-def main():
-    msg = json.loads(sys.stdin.read())
-    emb_id  = face_embedding(b64_to_bgr(msg["idFrameBase64"]))
-    emb_live = face_embedding(b64_to_bgr(msg["liveFrameBase64"]))
+def _face_rows(after=None):
+    """(_id, embedding blob) of users with a well-formed face embedding, oldest first."""
+    query = {"face_embedding": {"$exists": True}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    for doc in users.find(query, {"_id": 1, "face_embedding": 1}).sort("_id", 1):
+        blob = doc.get("face_embedding")
+        if isinstance(blob, bytes):
+            yield doc["_id"], blob
+
+def face_index():
+    """
+    The cached index, rebuilt after INDEX_TTL and otherwise topped up with
+    the users inserted since (ObjectIds increase with insertion time).
+    """
+    global _index
+    now = time.monotonic()
+    if _index is None or now - _index[2] > INDEX_TTL:
+        rows = list(_face_rows())
+        index = FaceIndex.from_rows((str(i), blob) for i, blob in rows)
+        _index = (index, rows[-1][0] if rows else None, now)
+        return index
+    index, last_id, built = _index
+    rows = list(_face_rows(last_id))
+    for doc_id, blob in rows:
+        if len(blob) == index.dim * 4:
+            index.add(str(doc_id), blob)
+    if rows:
+        _index = (index, rows[-1][0], built)
+    return index
+
+def register(msg):
+    """"ok", or why the user was not created: no-face, kyc-mismatch, already-exists."""
+    # Both frames go through MTCNN and then one batched FaceNet run
+    emb_id, emb_live = face_embeddings([b64_to_bgr(msg["idFrameBase64"]),
+                                        b64_to_bgr(msg["liveFrameBase64"])])
     if emb_id is None or emb_live is None:
-        sys.exit("no-face")
+        return "no-face"
     sim = np.dot(emb_id, emb_live) / (np.linalg.norm(emb_id)*np.linalg.norm(emb_live))
     if sim < 0.88:
-        sys.exit("kyc-mismatch")
-    if users.count_documents({"face_embedding": {"$near": {"$vector": emb_live.tolist(), "$distance": 0.12}}}):
-        sys.exit("already-exists")
+        return "kyc-mismatch"
+    # Mongo has no vector operator; top-k cosine over the cached face index instead
+    index = face_index()
+    if index.find_duplicate(emb_live, 0.88):
+        return "already-exists"
     salt = os.urandom(16).hex()
-    users.insert_one({
+    inserted = users.insert_one({
         "face_embedding": emb_live.tobytes(),
         "pass_salt": salt,
         "pass_hash": ph.hash(msg["passphrase"] + salt),
         "kyc_id_hash": hashlib.sha256(emb_id.tobytes()).hexdigest(),
         "created_at": datetime.utcnow()
     })
-    print("ok")
+    index.add(str(inserted.inserted_id), emb_live.astype(np.float32))
+    return "ok"
+
+def main():
+    if "--serve" in sys.argv[1:]:
+        # One JSON request per line, one result per line; the index stays warm
+        for line in sys.stdin:
+            if line.strip():
+                print(register(json.loads(line)), flush=True)
+        return
+    result = register(json.loads(sys.stdin.read()))
+    if result != "ok":
+        sys.exit(result)
+    print(result)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,144 @@
+"""
+Crawl‑and‑match over the social.db `posts` table.
+
+A scan walks posts past the high‑water mark in `scan_state` in id order,
+CHUNK_SIZE rows at a time.  Posts without a `phash64` have their media
+hashed on a spawned process pool (scan/worker.py; the full
+`watermarking.query_hash_set`, so the multi‑hash verification in
+`detection` applies), and every chunk is matched against the registered
+fingerprints in one `detection.match_hash_sets` call.  The backfilled hashes, the matches and the new high‑water mark are
+committed together, so a scan that stops part way resumes where it left off
+and later scans only see new posts.  With a `PostFaceMatrix` attached each
+scan also migrates new posts' face embeddings into it (see scan/faces.py).
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional
+import multiprocessing.pool
+import os
+import threading
+import time
+
+from detection import HAMMING_THRESHOLD, match_hash_sets
+from storage import SocialDB
+
+from .faces import PostFaceMatrix, migrate
+
+CHUNK_SIZE = int(os.environ.get("MYMARK_SCAN_CHUNK", "512"))
+SCAN_WORKERS = int(os.environ.get("MYMARK_SCAN_WORKERS", str(os.cpu_count() or 2)))
+
+
+def _parse_phash(value: str | None) -> Optional[int]:
+    try:
+        return int(value, 16) if value else None
+    except ValueError:
+        return None
+
+
+class Scanner:
+    """Incremental scans of one social.db; at most one runs at a time."""
+
+    def __init__(self, db: SocialDB, media_root: str | Path | None = None,
+                 workers: int = SCAN_WORKERS, chunk_size: int = CHUNK_SIZE,
+                 threshold: int = HAMMING_THRESHOLD, faces: PostFaceMatrix | None = None):
+        """Relative `media_path`s resolve against `media_root` (default: the db's directory)."""
+        self.db = db
+        self.faces = faces
+        self.media_root = Path(media_root) if media_root is not None else db.path.parent
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.threshold = threshold
+        self.last_run: dict | None = None
+        self.progress: dict | None = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """Run a scan on a background thread; False if one is already running."""
+        with self._lock:
+            if self.running():
+                return False
+            self._thread = threading.Thread(target=self._run_logged, name="social-scan", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run_logged(self) -> None:
+        try:
+            self.run()
+        except Exception as e:
+            print(f"Scan failed: {e}")
+            self.last_run = {"status": "failed", "error": str(e)}
+
+    def _resolve(self, media_path: str) -> str:
+        path = Path(media_path)
+        return str(path if path.is_absolute() else self.media_root / path)
+
+    def run(self) -> dict:
+        """Scan every post past the high‑water mark; returns the run's counters."""
+        if not self.db.table_exists("posts"):
+            raise RuntimeError(f"No posts table in {self.db.path}")
+        self.db.init_schema()
+        stats = {"posts": 0, "hashed": 0, "unreadable": 0, "matches": 0}
+        self.progress = stats
+        t0 = time.perf_counter()
+        pool: multiprocessing.pool.Pool | None = None
+        try:
+            last_id = self.db.scan_state()[0]
+            while True:
+                rows = self.db.posts_after(last_id, self.chunk_size)
+                if not rows:
+                    break
+                queries: List[Optional[Dict[str, int]]] = [
+                    {"phash": v} if (v := _parse_phash(phash)) is not None else None
+                    for _, _, phash in rows
+                ]
+                missing = [i for i, q in enumerate(queries) if q is None and rows[i][1]]
+                backfill = []
+                if missing:
+                    if pool is None:
+                        # Not imported with the package: the workers run it as __main__
+                        from . import worker
+                        pool = worker.pool(self.workers)
+                    paths = [self._resolve(rows[i][1]) for i in missing]
+                    chunksize = max(1, len(paths) // (4 * self.workers))
+                    for i, hashes in zip(missing, pool.imap(worker.hash_media, paths, chunksize)):
+                        if hashes is None:
+                            continue
+                        queries[i] = hashes
+                        backfill.append((f"{hashes['phash']:016x}", rows[i][0]))
+                known = [i for i, q in enumerate(queries) if q is not None]
+                results = match_hash_sets([queries[i] for i in known], self.threshold)
+                found = [(rows[i][0], image_id, dist)
+                         for i, hits in zip(known, results) for image_id, dist in hits]
+                last_id = rows[-1][0]
+                self.db.record_chunk(last_id, len(rows), backfill, found)
+                stats["posts"] += len(rows)
+                stats["hashed"] += len(backfill)
+                stats["unreadable"] += len(rows) - len(known)
+                stats["matches"] += len(found)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if self.faces is not None:
+            stats["faces"] = migrate(self.db, self.faces)
+        self.db.mark_scanned()
+        stats["seconds"] = round(time.perf_counter() - t0, 3)
+        stats["status"] = "done"
+        self.last_run = stats
+        return stats
+
+    def status(self) -> dict:
+        last_post_id, posts_scanned, last_scan = self.db.scan_state()
+        return {
+            "running": self.running(),
+            "last_post_id": last_post_id,
+            "posts_scanned": posts_scanned,
+            "last_scan": last_scan,
+            "progress": self.progress if self.running() else None,
+            "last_run": self.last_run,
+        }
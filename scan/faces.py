@@ -0,0 +1,188 @@
+"""
+Face embeddings of social posts as one searchable float32 matrix.
+
+`posts.face_embeds` holds a JSON list of hex‑encoded float32 blobs per post,
+which has to be parsed row by row and cannot be searched.  `migrate` moves
+them, incrementally, into a sidecar next to social.db:
+
+    embeds.f32   L2‑normalised float32 rows, EMBEDDING_DIM wide
+    posts.i64    int64 little‑endian post id of each row
+    mark.i64     last post id migration has read (faces or not)
+
+The two column files are append‑only and memory‑mapped by readers, so finding every
+post that shows a user is one blocked (rows × queries) matrix product over
+the mapped rows, thresholded on cosine similarity.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+import fcntl
+import json
+import os
+
+import numpy as np
+
+from storage import SocialDB
+
+EMBEDDING_DIM = 128
+BLOCK_ROWS = 262_144        # rows scored per matrix product in `search`
+
+EMBEDS = np.dtype("<f4")
+POSTS = np.dtype("<i8")
+
+
+class PostFaceMatrix:
+    """Append‑only, memory‑mapped (post id, unit face embedding) rows."""
+
+    def __init__(self, root: str | Path, dim: int = EMBEDDING_DIM):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self._embeds_path = self.root / "embeds.f32"
+        self._posts_path = self.root / "posts.i64"
+        self._mark_path = self.root / "mark.i64"
+        for path in (self._embeds_path, self._posts_path):
+            path.touch(exist_ok=True)
+        self._lock_fd = os.open(self.root / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._rows = -1
+        with self._locked():
+            self._repair()
+        self.refresh()
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _disk_rows(self) -> int:
+        return min(self._embeds_path.stat().st_size // (self.dim * EMBEDS.itemsize),
+                   self._posts_path.stat().st_size // POSTS.itemsize)
+
+    def _repair(self) -> None:
+        """Drop a torn tail left by a crash between the two appends."""
+        rows = self._disk_rows()
+        os.truncate(self._embeds_path, rows * self.dim * EMBEDS.itemsize)
+        os.truncate(self._posts_path, rows * POSTS.itemsize)
+
+    def refresh(self) -> bool:
+        """Remap if rows were appended since the last call; True if it grew."""
+        rows = self._disk_rows()
+        if rows == self._rows:
+            return False
+        if rows == 0:
+            self.embeds = np.zeros((0, self.dim), dtype=EMBEDS)
+            self.posts = np.zeros(0, dtype=POSTS)
+        else:
+            self.embeds = np.memmap(self._embeds_path, dtype=EMBEDS, mode="r", shape=(rows, self.dim))
+            self.posts = np.memmap(self._posts_path, dtype=POSTS, mode="r", shape=(rows,))
+        self._rows = rows
+        return True
+
+    def __len__(self) -> int:
+        self.refresh()
+        return self._rows
+
+    def last_post_id(self) -> int:
+        """Migration high‑water mark: the saved mark, or the last row's post if later."""
+        self.refresh()
+        last = int(self.posts[-1]) if self._rows else 0
+        try:
+            mark = int(np.fromfile(self._mark_path, dtype=POSTS, count=1)[0])
+        except (FileNotFoundError, IndexError):
+            mark = 0
+        return max(last, mark)
+
+    def save_mark(self, post_id: int) -> None:
+        """Record that every post up to `post_id` has been migrated (atomic rename)."""
+        tmp = self._mark_path.with_suffix(".tmp")
+        with self._locked():
+            with tmp.open("wb") as f:
+                f.write(np.array([post_id], dtype=POSTS).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._mark_path)
+
+    def append(self, post_ids: Sequence[int], embeddings: np.ndarray) -> None:
+        """Durable append of one row per (post id, embedding); embeddings are normalised here."""
+        vecs = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        vecs = vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+        columns = ((self._embeds_path, vecs.astype(EMBEDS)),
+                   (self._posts_path, np.asarray(post_ids, dtype=POSTS)))
+        with self._locked():
+            self._repair()
+            for path, column in columns:
+                with path.open("ab") as f:
+                    f.write(column.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+        self.refresh()
+
+    def search(self, queries: np.ndarray, threshold: float) -> List[List[Tuple[int, float]]]:
+        """
+        Every post with a face at or above `threshold` cosine similarity to
+        each query, as (post id, best cosine) sorted best first.
+        """
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        self.refresh()
+        embeds, posts = self.embeds, self.posts
+        best: List[Dict[int, float]] = [{} for _ in range(len(q))]
+        for start in range(0, self._rows, BLOCK_ROWS):
+            scores = embeds[start:start + BLOCK_ROWS] @ q.T
+            rows, cols = np.nonzero(scores >= threshold)
+            for r, c in zip(rows.tolist(), cols.tolist()):
+                post_id, score = int(posts[start + r]), float(scores[r, c])
+                if score > best[c].get(post_id, -1.0):
+                    best[c][post_id] = score
+        return [sorted(hits.items(), key=lambda t: -t[1]) for hits in best]
+
+    def close(self) -> None:
+        os.close(self._lock_fd)
+
+
+def _decode(face_embeds: str, dim: int) -> List[np.ndarray]:
+    """The well‑formed embeddings in one `posts.face_embeds` value."""
+    try:
+        blobs = json.loads(face_embeds)
+    except ValueError:
+        return []
+    out = []
+    for blob in blobs if isinstance(blobs, list) else ():
+        try:
+            raw = bytes.fromhex(blob)
+        except (TypeError, ValueError):
+            continue
+        if len(raw) == dim * EMBEDS.itemsize:
+            vec = np.frombuffer(raw, dtype=EMBEDS)
+            if np.isfinite(vec).all():
+                out.append(vec)
+    return out
+
+
+def migrate(db: SocialDB, matrix: PostFaceMatrix, chunk_size: int = 4096) -> int:
+    """
+    Append the face embeddings of every post past the matrix's high‑water
+    mark, saving the mark after each chunk so posts without a usable face
+    are not read again.  Returns the number of faces added.  Safe to re‑run
+    at any time.
+    """
+    last_id, added = matrix.last_post_id(), 0
+    while True:
+        rows = db.face_embeds_after(last_id, chunk_size)
+        if not rows:
+            return added
+        post_ids, vecs = [], []
+        for post_id, face_embeds in rows:
+            for vec in _decode(face_embeds, matrix.dim):
+                post_ids.append(post_id)
+                vecs.append(vec)
+        if vecs:
+            matrix.append(post_ids, np.stack(vecs))
+            added += len(vecs)
+        last_id = rows[-1][0]
+        matrix.save_mark(last_id)
@@ -0,0 +1,56 @@
+"""
+The scanner's media‑hashing pool.
+
+Workers are spawned, not forked: the web process already runs threads
+(the job collector, the write batcher, the chain mirror) by the time a scan
+starts.  A spawned child re‑runs the parent's `__main__` before its first
+task, and when the web app is started as `python app.py` that is the whole
+app: stores, job queue, chain client.  `pool` points `__main__` at this
+module while the workers start, so each one imports only this module, and
+`init` loads the hash helpers once per worker.
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+import multiprocessing as mp
+import multiprocessing.pool
+import sys
+import threading
+
+_query_hash_set: Optional[Callable] = None
+_main_lock = threading.Lock()
+
+
+def init() -> None:
+    """Pool initializer: import the hashing code before the first task."""
+    global _query_hash_set
+    from watermarking import query_hash_set
+    _query_hash_set = query_hash_set
+
+
+def hash_media(path: str) -> Optional[Dict[str, int]]:
+    """Pool task: query hashes of one media file, None if it cannot be read."""
+    try:
+        return _query_hash_set(path)
+    except Exception:
+        return None
+
+
+@contextmanager
+def _main_module():
+    """This module as `__main__`, for spawned children to import instead."""
+    with _main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[__name__]
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+def pool(workers: int) -> multiprocessing.pool.Pool:
+    """A started pool of `workers` spawned hashing processes."""
+    with _main_module():
+        # Pool starts every worker here; it only starts more if one dies
+        return mp.get_context("spawn").Pool(workers, initializer=init)
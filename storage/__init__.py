@@ -0,0 +1,293 @@
+"""
+SQLite access layer for users.db and social.db.
+
+`Database` keeps one connection per thread (WAL journal, busy timeout,
+statement cache) instead of a connect/close per request, and `WriteBatcher`
+group‑commits writes from many request threads in one transaction each
+drain.  `UsersDB` holds the queries the web app runs against `users`;
+`SocialDB` those the scanner and the match endpoints run against social.db.
+"""
+
+from __future__ import annotations
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import queue
+import sqlite3
+import threading
+
+STATEMENT_CACHE = 256
+
+
+class Database:
+    """Thread‑local WAL connections to one SQLite file."""
+
+    def __init__(self, path: str | Path, busy_timeout: float = 5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.batcher = WriteBatcher(self)
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Statements are compiled once per connection and reused from its cache
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                   cached_statements=STATEMENT_CACHE, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE … COMMIT (ROLLBACK on error) on this thread's connection."""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self.conn().execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.conn().execute(sql, params).fetchall()
+
+    def write(self, sql: str, params: Sequence[Any] = (), timeout: float | None = 30.0) -> int:
+        """Run one write through the group‑commit batcher; returns rowcount, re‑raises errors."""
+        return self.batcher.submit(sql, params).result(timeout)
+
+    def executescript(self, script: str) -> None:
+        self.conn().executescript(script)
+
+    def table_exists(self, name: str) -> bool:
+        return self.query_one(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (name,)
+        ) is not None
+
+
+class WriteBatcher:
+    """
+    Single writer thread: drain every queued write, run them in one
+    transaction (a SAVEPOINT each, so one failure — say a UNIQUE violation —
+    only fails its own caller) and commit once.
+    """
+
+    def __init__(self, db: Database, max_batch: int = 256):
+        self.db = db
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue: "queue.Queue[Tuple[str, Sequence[Any], Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, sql: str, params: Sequence[Any] = ()) -> "Future[int]":
+        fut: "Future[int]" = Future()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="sqlite-writer",
+                                                    daemon=True)
+                    self._thread.start()
+        self._queue.put((sql, params, fut))
+        return fut
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[str, Sequence[Any], Future]]) -> None:
+        done: List[Tuple[Future, Any]] = []
+        try:
+            with self.db.transaction() as conn:
+                for sql, params, fut in batch:
+                    conn.execute("SAVEPOINT w")
+                    try:
+                        done.append((fut, conn.execute(sql, params).rowcount))
+                        conn.execute("RELEASE w")
+                    except sqlite3.Error as e:
+                        conn.execute("ROLLBACK TO w")
+                        conn.execute("RELEASE w")
+                        done.append((fut, e))
+        except Exception as e:
+            for _, _, fut in batch:
+                fut.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for fut, outcome in done:
+            if isinstance(outcome, BaseException):
+                fut.set_exception(outcome)
+            else:
+                fut.set_result(outcome)
+
+
+# ---------------------------------------------------------------------------#
+# users.db
+# ---------------------------------------------------------------------------#
+USERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE,
+    face_embedding BLOB,
+    catchphrase_embedding BLOB,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class UsersDB(Database):
+    """Queries the web app runs against `users` (username lookups use its UNIQUE index)."""
+
+    def init_schema(self) -> None:
+        self.executescript(USERS_SCHEMA)
+
+    def create_user(self, username: str, face_embedding: bytes | None,
+                    catchphrase_embedding: bytes | None = None) -> None:
+        """Raises sqlite3.IntegrityError if the username is taken."""
+        self.write(
+            "INSERT INTO users (username, face_embedding, catchphrase_embedding) VALUES (?, ?, ?)",
+            (username, face_embedding, catchphrase_embedding),
+        )
+
+    def set_catchphrase(self, username: str, embedding: bytes) -> int:
+        return self.write("UPDATE users SET catchphrase_embedding=? WHERE username=?",
+                          (embedding, username))
+
+    def embeddings(self, username: str) -> Optional[Tuple[bytes | None, bytes | None]]:
+        """(face_embedding, catchphrase_embedding) or None for an unknown user."""
+        return self.query_one(
+            "SELECT face_embedding, catchphrase_embedding FROM users WHERE username=?", (username,)
+        )
+
+    def face_embeddings(self) -> Iterable[Tuple[str, bytes]]:
+        return self.conn().execute(
+            "SELECT username, face_embedding FROM users WHERE face_embedding IS NOT NULL"
+        )
+
+
+# ---------------------------------------------------------------------------#
+# social.db
+# ---------------------------------------------------------------------------#
+# Added next to generate_db's platforms / accounts / posts tables
+SCAN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    image_id TEXT NOT NULL,
+    distance INTEGER NOT NULL,
+    matched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (post_id, image_id),
+    FOREIGN KEY (post_id) REFERENCES posts(id)
+);
+CREATE INDEX IF NOT EXISTS idx_matches_image ON matches(image_id);
+CREATE TABLE IF NOT EXISTS scan_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_post_id INTEGER NOT NULL DEFAULT 0,
+    posts_scanned INTEGER NOT NULL DEFAULT 0,
+    last_scan DATETIME
+);
+INSERT OR IGNORE INTO scan_state (id) VALUES (1);
+"""
+
+
+class SocialDB(Database):
+    """Scan bookkeeping over `posts`: the high‑water mark, hashes and matches."""
+
+    def init_schema(self) -> None:
+        self.executescript(SCAN_SCHEMA)
+
+    def scan_state(self) -> Tuple[int, int, Optional[str]]:
+        """(last_post_id, posts_scanned, last_scan)."""
+        row = self.query_one("SELECT last_post_id, posts_scanned, last_scan FROM scan_state WHERE id=1")
+        return row if row is not None else (0, 0, None)
+
+    def posts_after(self, post_id: int, limit: int) -> List[Tuple[int, str | None, str | None]]:
+        """Next `limit` posts past the high‑water mark: (id, media_path, phash64)."""
+        return self.query_all(
+            "SELECT id, media_path, phash64 FROM posts WHERE id > ? ORDER BY id LIMIT ?",
+            (post_id, limit),
+        )
+
+    def face_embeds_after(self, post_id: int, limit: int) -> List[Tuple[int, str]]:
+        """Next `limit` posts past `post_id` that carry face embeddings: (id, face_embeds)."""
+        return self.query_all(
+            "SELECT id, face_embeds FROM posts WHERE id > ? AND face_embeds IS NOT NULL "
+            "ORDER BY id LIMIT ?",
+            (post_id, limit),
+        )
+
+    def record_chunk(self, last_post_id: int, scanned: int,
+                     phashes: Sequence[Tuple[str, int]],
+                     matches: Sequence[Tuple[int, str, int]]) -> None:
+        """
+        One transaction per scanned chunk: backfilled (phash64, post_id)s,
+        (post_id, image_id, distance) matches and the new high‑water mark,
+        so an interrupted scan resumes after the last committed chunk.
+        """
+        with self.transaction() as conn:
+            conn.executemany("UPDATE posts SET phash64=? WHERE id=?", phashes)
+            conn.executemany(
+                "INSERT OR REPLACE INTO matches (post_id, image_id, distance) VALUES (?, ?, ?)",
+                matches,
+            )
+            conn.execute(
+                "UPDATE scan_state SET last_post_id=?, posts_scanned=posts_scanned+? WHERE id=1",
+                (last_post_id, scanned),
+            )
+
+    def mark_scanned(self) -> None:
+        self.conn().execute("UPDATE scan_state SET last_scan=CURRENT_TIMESTAMP WHERE id=1")
+
+    def match_count(self) -> int:
+        return self.query_one("SELECT COUNT(*) FROM matches")[0]
+
+    def matches(self, limit: int = 100, offset: int = 0) -> List[dict]:
+        """Newest matches first, with the post's platform / account context."""
+        rows = self.query_all(
+            """
+            SELECT m.image_id, m.distance, m.matched_at, p.id, p.media_path, p.ts,
+                   a.handle, pl.name
+            FROM matches m
+            JOIN posts p ON p.id = m.post_id
+            LEFT JOIN accounts a ON a.id = p.account_id
+            LEFT JOIN platforms pl ON pl.id = a.platform_id
+            ORDER BY m.id DESC LIMIT ? OFFSET ?
+            """,
+            (limit, offset),
+        )
+        keys = ("image_id", "distance", "matched_at", "post_id", "media_path", "ts",
+                "handle", "platform")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def posts(self, post_ids: Sequence[int]) -> Dict[int, dict]:
+        """post id ➜ media_path / ts / handle / platform for the given posts."""
+        out: Dict[int, dict] = {}
+        keys = ("post_id", "media_path", "ts", "handle", "platform")
+        for start in range(0, len(post_ids), 500):
+            chunk = list(post_ids[start:start + 500])
+            rows = self.query_all(
+                f"""
+                SELECT p.id, p.media_path, p.ts, a.handle, pl.name
+                FROM posts p
+                LEFT JOIN accounts a ON a.id = p.account_id
+                LEFT JOIN platforms pl ON pl.id = a.platform_id
+                WHERE p.id IN ({",".join("?" * len(chunk))})
+                """,
+                chunk,
+            )
+            out.update((row[0], dict(zip(keys, row))) for row in rows)
+        return out
@@ -0,0 +1,132 @@
+"""
+BlockchainRegistry's send path against an in‑process eth‑tester chain:
+local nonce sequencing, duplicate and in‑flight refusal, and receipt
+resolution (blocking, batched and through the background submitter).
+
+    python -m pytest -q tests
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+eth_tester = pytest.importorskip("eth_tester")
+
+from eth_account import Account
+from web3 import EthereumTesterProvider, Web3
+from web3.exceptions import TransactionNotFound
+
+from blockchain import ABI_PATH, BlockchainRegistry
+from blockchain.submitter import PendingTx, _check_receipt, wait_all
+
+FP = "ab" * 32
+
+
+@pytest.fixture
+def chain():
+    """(registry, tester): a fresh chain with MyMarkRegistry deployed and a funded key."""
+    tester = eth_tester.EthereumTester()
+    w3 = Web3(EthereumTesterProvider(tester))
+    abi = json.loads(Path(ABI_PATH).read_text())
+    bytecode = Path(ABI_PATH).with_suffix(".bin").read_text().strip()
+    deploy = w3.eth.contract(abi=abi, bytecode=bytecode).constructor().transact(
+        {"from": w3.eth.accounts[0]})
+    address = w3.eth.wait_for_transaction_receipt(deploy)["contractAddress"]
+    account = Account.create()
+    w3.eth.send_transaction({"from": w3.eth.accounts[0], "to": account.address, "value": 10**20})
+
+    registry = BlockchainRegistry(contract_address=address, connect=False)
+    registry.web3, registry.account, registry._enabled = w3, account, True
+    registry.contract = w3.eth.contract(address=address, abi=abi)
+    return registry, tester
+
+
+def _nonce(registry, tx_hash):
+    return registry.web3.eth.get_transaction(tx_hash)["nonce"]
+
+
+def _unmined(monkeypatch, registry, error):
+    """Make receipt lookups raise `error`; returns a callable that undoes it."""
+    lookup = registry.web3.eth.get_transaction_receipt
+
+    def fail(tx_hash):
+        raise error
+
+    monkeypatch.setattr(registry.web3.eth, "get_transaction_receipt", fail)
+    return lambda: monkeypatch.setattr(registry.web3.eth, "get_transaction_receipt", lookup)
+
+
+def test_back_to_back_sends_use_consecutive_nonces(chain):
+    registry, _ = chain
+    txs = [PendingTx(f"img{i}", FP) for i in range(5)]
+    for tx in txs:
+        tx._sent(registry.send_register(tx.image_id, tx.fingerprint_hex))
+    wait_all(txs, registry, timeout=5)
+    assert [tx.status for tx in txs] == ["mined"] * 5
+    assert [_nonce(registry, tx.tx_hash) for tx in txs] == list(range(5))
+    assert registry._in_flight == set()
+    assert registry.get("img3") is not None
+
+
+def test_duplicate_refused_without_using_a_nonce(chain):
+    registry, _ = chain
+    registry.register("img", FP)
+    sent = registry.web3.eth.get_transaction_count(registry.account.address)
+    # The gas estimate reverts (ContractLogicError on a node, TransactionFailed here)
+    with pytest.raises(Exception, match="already registered"):
+        registry.send_register("img", FP)
+    assert registry.web3.eth.get_transaction_count(registry.account.address) == sent
+    assert registry._in_flight == set()
+
+
+def test_in_flight_refused_until_receipt(chain, monkeypatch):
+    registry, _ = chain
+    restore = _unmined(monkeypatch, registry, TransactionNotFound("not mined"))
+    tx = PendingTx("img", FP)
+    tx._sent(registry.send_register("img", FP))
+    with pytest.raises(RuntimeError, match="already pending"):
+        registry.send_register("img", FP)
+    assert not _check_receipt(registry, tx)
+    restore()
+    assert _check_receipt(registry, tx)
+    assert tx.status == "mined" and registry._in_flight == set()
+
+
+def test_failed_sign_leaves_no_nonce_gap(chain, monkeypatch):
+    registry, _ = chain
+    registry.register("first", FP)
+    sign = registry.account.sign_transaction
+
+    def broken(tx_dict):
+        raise ValueError("signer unavailable")
+
+    monkeypatch.setattr(registry.account, "sign_transaction", broken)
+    with pytest.raises(ValueError):
+        registry.send_register("img", FP)
+    assert registry._in_flight == set()
+    monkeypatch.setattr(registry.account, "sign_transaction", sign)
+    tx_hash = registry.register("img", FP)
+    assert _nonce(registry, tx_hash) == 1
+
+
+def test_transient_receipt_error_keeps_polling(chain, monkeypatch):
+    registry, _ = chain
+    tx = PendingTx("img", FP)
+    tx._sent(registry.send_register("img", FP))
+    restore = _unmined(monkeypatch, registry, ConnectionError("connection reset"))
+    assert not _check_receipt(registry, tx)
+    assert not tx.done and len(registry._in_flight) == 1
+    restore()
+    assert _check_receipt(registry, tx)
+    assert tx.status == "mined" and registry._in_flight == set()
+
+
+def test_submitter_resolves_handles(chain):
+    registry, _ = chain
+    ok = registry.submit("img", FP)
+    assert ok.wait(10).status == "mined"
+    dup = registry.submit("img", FP).wait(10)
+    assert dup.status == "failed" and dup.tx_hash is None
+    assert registry.pending(ok.handle) is ok
+    assert registry._in_flight == set()
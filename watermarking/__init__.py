@@ -4,7 +4,9 @@ Simple invisible‑watermark & perceptual‑hash helpers for MyMark
 """
 
 from pathlib import Path
+from typing import Dict, Tuple
 import hashlib
+import math
 import random
 import cv2
 import numpy as np
@@ -19,6 +21,86 @@ def phash(img_path: Path) -> str:
     return str(imagehash.phash(Image.open(img_path)))
 
 
+def phash_array(img: np.ndarray) -> str:
+    """`phash` for an already decoded BGR (or grayscale) array."""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return str(imagehash.phash(Image.fromarray(img)))
+
+
+# Share of each side kept by the "center" hash (strips borders / frames)
+CENTER_CROP = 0.8
+
+
+def _gray(img: str | Path | np.ndarray) -> Image.Image:
+    """Grayscale PIL image exactly as `phash` / `phash_array` see it."""
+    if isinstance(img, np.ndarray):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(img).convert("L")
+    with Image.open(img) as im:
+        return im.convert("L")
+
+
+def _center(gray: Image.Image) -> Image.Image:
+    w, h = gray.size
+    dx, dy = int(w * (1 - CENTER_CROP) / 2), int(h * (1 - CENTER_CROP) / 2)
+    return gray.crop((dx, dy, w - dx, h - dy))
+
+
+def _h(h: imagehash.ImageHash) -> int:
+    return int(str(h), 16)
+
+
+def hash_set(img: str | Path | np.ndarray) -> Dict[str, int]:
+    """
+    Every 64‑bit hash stored for an image, as ints:
+    phash (== `phash`), dhash, ahash, flip (mirrored phash), center (phash
+    of the central CENTER_CROP) and tile0‑3 (phash of each quadrant, row‑major).
+    """
+    gray = _gray(img)
+    w, h = gray.size
+    hashes = {
+        "phash": _h(imagehash.phash(gray)),
+        "dhash": _h(imagehash.dhash(gray)),
+        "ahash": _h(imagehash.average_hash(gray)),
+        "flip": _h(imagehash.phash(gray.transpose(Image.Transpose.FLIP_LEFT_RIGHT))),
+        "center": _h(imagehash.phash(_center(gray))),
+    }
+    boxes = ((0, 0, w // 2, h // 2), (w // 2, 0, w, h // 2),
+             (0, h // 2, w // 2, h), (w // 2, h // 2, w, h))
+    for i, box in enumerate(boxes):
+        hashes[f"tile{i}"] = _h(imagehash.phash(gray.crop(box)))
+    return hashes
+
+
+def query_hash_set(img: str | Path | np.ndarray) -> Dict[str, int]:
+    """The subset of `hash_set` a detection query needs: phash, dhash, ahash, center."""
+    gray = _gray(img)
+    return {
+        "phash": _h(imagehash.phash(gray)),
+        "dhash": _h(imagehash.dhash(gray)),
+        "ahash": _h(imagehash.average_hash(gray)),
+        "center": _h(imagehash.phash(_center(gray))),
+    }
+
+
+# ---------------------------------------------------------------------------#
+# 1b. Decode / encode helpers for the in‑memory pipeline
+# ---------------------------------------------------------------------------#
+def decode_bytes(data: bytes | memoryview) -> np.ndarray | None:
+    """Decode an encoded image (JPEG/PNG/…) straight from memory to BGR."""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def encode_image(img: np.ndarray, ext: str = ".jpg", quality: int = 90) -> bytes:
+    """Encode a BGR array with the same settings `embed_watermark` writes."""
+    ok, buf = cv2.imencode(ext, img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not ok:
+        raise RuntimeError(f"Cannot encode image as {ext}")
+    return buf.tobytes()
+
+
 # ---------------------------------------------------------------------------#
 # 2.  Invisible watermark ‑ LSB on blue channel (quick & dirty)
 # ---------------------------------------------------------------------------#
@@ -27,6 +109,82 @@ def _owner_key(owner_id: str) -> bytes:
     return hashlib.sha256(owner_id.encode("utf‑8")).digest()
 
 
+# Only the first 256 sampled positions ever carry a bit (sha256 width)
+WATERMARK_BITS = 256
+
+
+def _n_bits(h: int, w: int, density: float) -> int:
+    return min(WATERMARK_BITS, int(h * w * density))
+
+
+def _keyed_coords(owner_id: str, n_pixels: int, n_bits: int) -> np.ndarray:
+    """
+    Flat pixel indices for `n_bits` watermark bits, drawn without replacement
+    from a NumPy Generator seeded with the owner key.  Only `n_bits` indices
+    are ever materialised, whatever the image size.
+    """
+    seed = np.frombuffer(_owner_key(owner_id), dtype=np.uint32)
+    return np.random.default_rng(seed).choice(n_pixels, size=n_bits, replace=False)
+
+
+def _legacy_coords(owner_id: str, n_pixels: int, n_sample: int, n_bits: int) -> np.ndarray:
+    """
+    The first `n_bits` values of the original
+    `random.Random(key).sample(range(n_pixels), n_sample)`, reproduced without
+    building the whole sample (CPython picks its algorithm from n and k, and
+    both branches emit results in draw order).
+    """
+    rng = random.Random(_owner_key(owner_id))
+    randbelow = rng._randbelow
+    setsize = 21
+    if n_sample > 5:
+        setsize += 4 ** math.ceil(math.log(n_sample * 3, 4))
+    out = []
+    if n_pixels <= setsize:
+        pool: dict[int, int] = {}            # sparse Fisher–Yates over range(n)
+        for i in range(n_bits):
+            j = randbelow(n_pixels - i)
+            out.append(pool.get(j, j))
+            last = n_pixels - i - 1
+            pool[j] = pool.get(last, last)
+    else:
+        selected = set()
+        for _ in range(n_bits):
+            j = randbelow(n_pixels)
+            while j in selected:
+                j = randbelow(n_pixels)
+            selected.add(j)
+            out.append(j)
+    return np.array(out, dtype=np.int64)
+
+
+def embed_watermark_array(img: np.ndarray,
+                          owner_id: str,
+                          density: float = 0.02,
+                          phash_hex: str | None = None,
+                          copy: bool = True) -> Tuple[np.ndarray, str]:
+    """
+    Array‑in/array‑out core of `embed_watermark`.  Returns the marked BGR
+    image and the 256‑bit hex string written.  Pass `phash_hex` if the
+    caller already hashed `img`, and `copy=False` to mark `img` in place.
+    """
+    if copy:
+        img = img.copy()
+    h, w = img.shape[:2]
+    n_bits = _n_bits(h, w, density)
+    ys, xs = np.divmod(_keyed_coords(owner_id, h * w, n_bits), w)
+
+    # The watermark bits are the sha256 of (image_phash + owner_id)
+    if phash_hex is None:
+        phash_hex = phash_array(img)
+    bits_hex = hashlib.sha256((phash_hex + owner_id).encode()).hexdigest()
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(bits_hex), dtype=np.uint8))[:n_bits]
+
+    # Write every bit into the LSB of the selected pixels’ blue channel at once
+    img[ys, xs, 0] = (img[ys, xs, 0] & 0xFE) | bits
+    return img, bits_hex
+
+
 def embed_watermark(src: str | Path,
                     dst: str | Path,
                     owner_id: str,
@@ -40,34 +198,19 @@ def embed_watermark(src: str | Path,
     if img is None:
         raise RuntimeError(f"Cannot read image: {src}")
 
-    h, w = img.shape[:2]
-    n_pixels = int(h * w * density)
-    rng = random.Random(_owner_key(owner_id))       # deterministic RNG
-    coords = rng.sample(range(h * w), n_pixels)
-
-    # The watermark bits are the sha256 of (image_phash + owner_id)
-    bits_hex = hashlib.sha256((phash(src) + owner_id).encode()).hexdigest()
-    bits = bin(int(bits_hex, 16))[2:].zfill(256)
-
-    # Write each bit into the LSB of selected pixels’ blue channel
-    idx = 0
-    for coord in coords:
-        if idx >= len(bits):
-            break
-        y, x = divmod(coord, w)
-        img[y, x, 0] = (img[y, x, 0] & ~1) | int(bits[idx])
-        idx += 1
-
+    img, bits_hex = embed_watermark_array(img, owner_id, density, phash(src), copy=False)
     cv2.imwrite(str(dst), img, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
     return bits_hex  # fingerprint we’ll also store on‑chain
 
 
 def extract_watermark(img_path: str | Path,
                       owner_id: str,
-                      density: float = 0.02) -> str:
+                      density: float = 0.02,
+                      legacy: bool = False) -> str:
     """
     Extract 256‑bit hex watermark using the same pixel positions.
     Returns the hex string; caller can compare to expected.
+    Pass `legacy=True` for images marked by the old `random.sample` scheme.
     """
     img_path = Path(img_path)
     img = cv2.imread(str(img_path))
@@ -75,12 +218,13 @@ def extract_watermark(img_path: str | Path,
         raise RuntimeError(f"Cannot read image: {img_path}")
 
     h, w = img.shape[:2]
-    n_pixels = int(h * w * density)
-    rng = random.Random(_owner_key(owner_id))
-    coords = rng.sample(range(h * w), n_pixels)
+    n_bits = _n_bits(h, w, density)
+    if legacy:
+        coords = _legacy_coords(owner_id, h * w, int(h * w * density), n_bits)
+    else:
+        coords = _keyed_coords(owner_id, h * w, n_bits)
+    ys, xs = np.divmod(coords, w)
 
-    bits = []
-    for coord in coords[:256]:      # read first 256 bits
-        y, x = divmod(coord, w)
-        bits.append(str(img[y, x, 0] & 1))
-    return hex(int("".join(bits), 2))[2:].zfill(64)
\ No newline at end of file
+    bits = img[ys, xs, 0] & 1
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big") >> (-n_bits % 8)
+    return f"{value:064x}"